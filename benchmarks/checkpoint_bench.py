@@ -0,0 +1,78 @@
+"""
+strategy_demo3 式的未完成K线更新：每根 1 分钟K线都带上未走完的 5 分钟K线算一次再撤销
+对比 checkpoint/rollback 与 deepcopy 整个 Chan 的每次耗时随已加载K线数的变化，前者应该基本持平
+
+    python -m benchmarks.checkpoint_bench --history 5000 20000 60000 --updates 200 --deepcopy
+"""
+import argparse
+import copy
+import sys
+import time
+
+from common.const import LvType
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
+
+from .combine_bench import make_klu_lst
+
+
+def combine(klu_lst):
+    return Kline_Unit.from_fields(
+        klu_lst[-1].time, klu_lst[0].open, max(klu.high for klu in klu_lst), min(klu.low for klu in klu_lst), klu_lst[-1].close, TradeInfo({})
+    )
+
+
+def copy_klu(klu):
+    return Kline_Unit.from_fields(klu.time, klu.open, klu.high, klu.low, klu.close, TradeInfo({}))
+
+
+def provisional_inputs(klu_lst, begin, cnt):
+    """从 begin 开始的 cnt 次更新，每次是当前未走完的 5 分钟K线和其中已有的 1 分钟K线"""
+    res = []
+    for idx in range(begin, begin + cnt):
+        group = klu_lst[idx - idx % 5:idx + 1]
+        res.append({LvType.K_5M: [combine(group)], LvType.K_1M: [copy_klu(klu) for klu in group]})
+    return res
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="未完成K线更新的耗时：checkpoint/rollback 与 deepcopy")
+    parser.add_argument("--history", type=int, nargs="+", default=[5000, 20000, 60000], help="已加载的 1 分钟K线数")
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--deepcopy", action="store_true", help="同时测 deepcopy（很慢，只测 5 次）")
+    args = parser.parse_args(argv)
+    sys.setrecursionlimit(20000)
+
+    history = sorted(args.history)
+    klu_lst = [copy_klu(klu) for klu in make_klu_lst(history[-1] + args.updates + 5)]
+    chan = Chan("bench", data_src=None, lv_list=[LvType.K_5M, LvType.K_1M], config=ChanConfig({"triger_step": True, "kl_data_check": False}))
+    loaded = 0
+    for target in history:
+        for idx in range(loaded, target - target % 5, 5):
+            chan.trigger_load({LvType.K_5M: [combine(klu_lst[idx:idx+5])], LvType.K_1M: klu_lst[idx:idx+5]})
+        loaded = target - target % 5
+
+        inputs = provisional_inputs(klu_lst, loaded, args.updates)
+        begin = time.perf_counter()
+        for inp in inputs:
+            with chan.provisional():
+                chan.trigger_load(inp)
+        rollback_cost = (time.perf_counter() - begin) / len(inputs)
+        line = f"history={loaded:<8} checkpoint/rollback {rollback_cost * 1e6:8.0f} us/update"
+
+        if args.deepcopy:
+            inputs = provisional_inputs(klu_lst, loaded, 5)
+            begin = time.perf_counter()
+            try:
+                for inp in inputs:
+                    copy.deepcopy(chan).trigger_load(inp)
+                line += f"  deepcopy {(time.perf_counter() - begin) / len(inputs) * 1e6:10.0f} us/update"
+            except RecursionError:  # 对象之间的引用链太长
+                line += "  deepcopy RecursionError"
+        print(f"{line}  bi={len(chan[1].bi_list)} seg={len(chan[1].seg_list)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+K线包含合并阶段的吞吐：只跑 Kline_List.add_single_klu 中的 try_add/新建 Kline 部分，不算指标、分型和笔
+
+    python -m benchmarks.combine_bench --bars 200000
+"""
+import argparse
+import time
+
+from common.const import DataField
+from data_fetch.kl_columns import KlColumns
+from data_process.common.cenum import KlineDir
+from data_process.kline.kline import Kline
+from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
+
+from .memory_bench import random_walk_1m
+
+
+def make_klu_lst(n: int):
+    arrays = random_walk_1m(n)
+    fields = [DataField.FIELD_OPEN, DataField.FIELD_HIGH, DataField.FIELD_LOW, DataField.FIELD_CLOSE]
+    kl_columns = KlColumns.from_arrays(arrays[DataField.FIELD_TIME], *(arrays[field] for field in fields))
+    klu_lst = []
+    for idx, (time, _open, high, low, close) in enumerate(zip(kl_columns.iter_time(), *(kl_columns.columns[field].tolist() for field in fields))):
+        klu = Kline_Unit.from_fields(time, _open, high, low, close, TradeInfo({}))
+        klu.set_idx(idx)
+        klu_lst.append(klu)
+    return klu_lst
+
+
+def combine(klu_lst):
+    lst = [Kline(klu_lst[0], idx=0)]
+    for klu in klu_lst[1:]:
+        _dir = lst[-1].try_add(klu)
+        if _dir != KlineDir.COMBINE:
+            lst.append(Kline(klu, idx=len(lst), _dir=_dir))
+    return lst
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量K线包含合并的吞吐")
+    parser.add_argument("--bars", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    klu_lst = make_klu_lst(args.bars)
+    best = float("inf")
+    klc_cnt = 0
+    for _ in range(args.repeat):
+        begin = time.perf_counter()
+        klc_cnt = len(combine(klu_lst))
+        best = min(best, time.perf_counter() - begin)
+    print(f"bars={args.bars} klc={klc_cnt} best={best:.3f}s {args.bars / best:,.0f} bars/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+逐根指标模型（triger_step=True 时使用）的单根耗时，按区间统计，看耗时是否随K线数量增长
+
+    python -m benchmarks.indicator_bench --bars 1000000 --chunk 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from data_process.calculate.boll import BollModel
+from data_process.calculate.kdj import Kdj
+from data_process.calculate.macd import Macd
+from data_process.calculate.rsi import Rsi
+from data_process.calculate.trend_model import TrendModel
+from data_process.common.cenum import TrendType
+
+
+def make_models():
+    return {
+        "macd": Macd(),
+        "boll": BollModel(20),
+        "mean60": TrendModel(TrendType.MEAN, 60),
+        "max60": TrendModel(TrendType.MAX, 60),
+        "min60": TrendModel(TrendType.MIN, 60),
+        "rsi": Rsi(14),
+        "kdj": Kdj(9),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量逐根指标计算的耗时是否随历史长度增长")
+    parser.add_argument("--bars", type=int, default=1000000)
+    parser.add_argument("--chunk", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    close = (100 + np.cumsum(rng.normal(0, 0.1, args.bars))).tolist()
+    high = [c + 0.05 for c in close]
+    low = [c - 0.05 for c in close]
+
+    models = make_models()
+    names = list(models)
+    print("bars".rjust(10) + "".join(name.rjust(9) for name in names) + "   (ns/bar)")
+    for begin in range(0, args.bars, args.chunk):
+        end = min(begin + args.chunk, args.bars)
+        row = []
+        for name in names:
+            model = models[name]
+            t = time.perf_counter()
+            if name == "kdj":
+                for i in range(begin, end):
+                    model.add(high[i], low[i], close[i])
+            else:
+                for value in close[begin:end]:
+                    model.add(value)
+            row.append((time.perf_counter() - t) / (end - begin) * 1e9)
+        print(f"{end:>10}" + "".join(f"{ns:9.0f}" for ns in row))
+
+    # 滑动 Welford 的累计误差：和最后一个窗口直接两遍法计算的结果比较
+    boll = models["boll"]
+    window = close[-boll.N:]
+    mean = sum(window) / len(window)
+    std = (sum((x - mean) ** 2 for x in window) / len(window)) ** 0.5
+    print(f"boll drift after {args.bars} bars: mean {abs(boll.window.mean - mean):.3g}, std {abs(boll.window.var ** 0.5 - std):.3g}")
+
+
+if __name__ == "__main__":
+    main()
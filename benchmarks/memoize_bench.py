@@ -0,0 +1,63 @@
+"""
+逐步模式（triger_step=True）回放时缓存方法的开销：用 cProfile 统计 memoize 包装函数本身的耗时，并输出各方法的命中/未命中次数
+
+    python -m benchmarks.memoize_bench --bars 100000
+"""
+import argparse
+import cProfile
+import pstats
+import sys
+import time
+
+from common.const import LvType
+from data_process.chan_config import ChanConfig
+from data_process.common import cache
+from data_process.kline.kline_list import Kline_List
+
+from .combine_bench import make_klu_lst
+
+
+def replay(klu_lst, profile: bool):
+    kl_list = Kline_List(LvType.K_1M, ChanConfig({"triger_step": True}))
+    profiler = cProfile.Profile() if profile else None
+    begin = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    for klu in klu_lst:
+        kl_list.add_single_klu(klu)
+    if profiler:
+        profiler.disable()
+    return kl_list, time.perf_counter() - begin, profiler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="逐步回放时缓存方法的开销和命中率")
+    parser.add_argument("--bars", type=int, default=100000)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+    sys.setrecursionlimit(20000)
+
+    klu_lst = make_klu_lst(args.bars)
+    kl_list, elapsed, _ = replay(klu_lst, profile=False)
+    print(f"bars={args.bars} bi={len(kl_list.bi_list)} seg={len(kl_list.seg_list)} elapsed={elapsed:.1f}s")
+
+    cache.enable_stats()
+    _, elapsed, profiler = replay(make_klu_lst(args.bars), profile=True)
+    stats = cache.get_stats()
+    cache.disable_stats()
+
+    # memoize 的包装函数名都是 wrapper，tottime 即缓存查找本身的开销（不含被缓存函数的计算）
+    profile_stats = pstats.Stats(profiler).stats
+    wrapper_calls, wrapper_time = 0, 0.0
+    for (filename, _, func_name), (_, ncalls, tottime, _, _) in profile_stats.items():
+        if filename == cache.__file__ and func_name in ("wrapper", "__get__", "__call__", "clean_memoize"):
+            wrapper_calls += ncalls
+            wrapper_time += tottime
+    print(f"profiled elapsed={elapsed:.1f}s cache calls={wrapper_calls} cache self time={wrapper_time:.2f}s")
+    print("method".ljust(40) + "hit".rjust(12) + "miss".rjust(12))
+    for key, (hit, miss) in sorted(stats.items(), key=lambda item: -sum(item[1]))[:args.top]:
+        print(f"{key:<40}{hit:>12}{miss:>12}")
+
+
+if __name__ == "__main__":
+    main()
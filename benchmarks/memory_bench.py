@@ -0,0 +1,74 @@
+"""
+每根K线的内存占用：用随机游走的1分钟K线（默认约5年A股）构造 Chan，tracemalloc 统计加载后仍存活的内存
+
+    python -m benchmarks.memory_bench --bars 292800 --top 10
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from common.const import DataField, LvType
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+
+A_SHARE_1M_BARS_PER_YEAR = 240 * 244
+
+
+def random_walk_1m(n: int, seed=0):
+    """A股交易时段 9:31-11:30、13:01-15:00 的1分钟K线，不考虑节假日"""
+    rng = np.random.default_rng(seed)
+    session = np.concatenate([np.arange(9 * 60 + 31, 11 * 60 + 31), np.arange(13 * 60 + 1, 15 * 60 + 1)])
+    day = np.arange(n) // len(session)
+    minute = session[np.arange(n) % len(session)]
+    # 叠加日内和多日周期，避免纯随机游走出现极长的无线段区间
+    close = 10 + np.cumsum(rng.normal(0, 0.01, n)) + 0.3 * np.sin(np.arange(n) * 2 * np.pi / 240) + np.sin(np.arange(n) * 2 * np.pi / 4800)
+    _open = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.005, n))
+    return {
+        DataField.FIELD_TIME: np.datetime64("2018-01-02T00:00") + (day * 1440 + minute).astype("timedelta64[m]"),
+        DataField.FIELD_OPEN: _open,
+        DataField.FIELD_HIGH: np.maximum(_open, close) + spread,
+        DataField.FIELD_LOW: np.minimum(_open, close) - spread,
+        DataField.FIELD_CLOSE: close,
+        DataField.FIELD_VOLUME: rng.integers(100, 10000, n).astype(np.float64),
+    }
+
+
+def measure(n: int, config: dict, top: int = 0):
+    arrays = random_walk_1m(n)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    begin = time.time()
+    chan = Chan.from_arrays("bench", {LvType.K_1M: arrays}, config=ChanConfig(dict(config)))
+    elapsed = time.time() - begin
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - base
+    snapshot = tracemalloc.take_snapshot() if top else None
+    tracemalloc.stop()
+    kl_list = chan[0]
+    print(f"bars={n} klc={len(kl_list)} bi={len(kl_list.bi_list)} seg={len(kl_list.seg_list)} elapsed={elapsed:.1f}s(tracemalloc on)")
+    print(f"memory={used / 2**20:.1f}MiB per_bar={used / n:.0f}B")
+    if snapshot is not None:
+        for stat in snapshot.statistics("lineno")[:top]:
+            print(f"  {stat.size / n:8.0f}B/bar {stat.traceback}")
+    return used / n
+
+
+def main(argv=None):
+    # 非逐步计算时 SegListChan.cal_seg_sure 每个线段递归一层，长历史需放宽递归深度
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+    parser = argparse.ArgumentParser(description="测量每根K线的内存占用")
+    parser.add_argument("--bars", type=int, default=5 * A_SHARE_1M_BARS_PER_YEAR)
+    parser.add_argument("--top", type=int, default=0, help="按代码行输出占用最多的分配")
+    parser.add_argument("--demark", action="store_true", help="同时计算 demark 指标")
+    args = parser.parse_args(argv)
+    measure(args.bars, {"print_warning": False, "cal_demark": args.demark}, args.top)
+
+
+if __name__ == "__main__":
+    main()
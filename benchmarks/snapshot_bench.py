@@ -0,0 +1,63 @@
+"""
+快照的保存/恢复耗时与大小：日线 + 30 分钟线（由随机游走的 1 分钟K线合成），对比 Chan.save_snapshot/load_snapshot 与 pickle
+
+    python -m benchmarks.snapshot_bench --years 10 --compress zlib
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+from common.const import DataField, LvType
+from data_fetch.kl_columns import KlColumns
+from data_fetch.resampler import resample
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+
+from .memory_bench import random_walk_1m
+
+
+def make_chan(years: int, step: bool) -> Chan:
+    arrays = random_walk_1m(years * 244 * 240)
+    fields = [DataField.FIELD_OPEN, DataField.FIELD_HIGH, DataField.FIELD_LOW, DataField.FIELD_CLOSE]
+    columns_1m = KlColumns.from_arrays(arrays[DataField.FIELD_TIME], *(arrays[field] for field in fields), volume=arrays[DataField.FIELD_VOLUME])
+    kl_columns = {lv: resample(columns_1m, LvType.K_1M, lv) for lv in (LvType.K_DAY, LvType.K_30M)}
+    config = ChanConfig({"triger_step": step, "kl_data_check": False})
+    chan = Chan.from_kl_columns("bench", kl_columns, config=config)
+    if step:
+        for _ in chan.step_load():
+            ...
+    return chan
+
+
+def timeit(func):
+    begin = time.perf_counter()
+    res = func()
+    return res, time.perf_counter() - begin
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="快照保存/恢复的耗时与大小")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--compress", choices=["zlib", "lzma"], default=None)
+    parser.add_argument("--step", action="store_true", help="逐步模式加载（回放之后继续 trigger_load 的场景）")
+    args = parser.parse_args(argv)
+
+    chan = make_chan(args.years, args.step)
+    print(f"day={chan[0].klu_cnt} 30m={chan[1].klu_cnt} bi={len(chan[1].bi_list)} seg={len(chan[1].seg_list)}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "chan.snap")
+        _, save_cost = timeit(lambda: chan.save_snapshot(path, args.compress))
+        _, load_cost = timeit(lambda: Chan.load_snapshot(path))
+        print(f"snapshot save {save_cost:6.2f}s  load {load_cost:6.2f}s  size {os.path.getsize(path) / 2**20:6.1f}MiB")
+    try:
+        data, save_cost = timeit(lambda: pickle.dumps(chan, protocol=pickle.HIGHEST_PROTOCOL))
+        _, load_cost = timeit(lambda: pickle.loads(data))
+        print(f"pickle   save {save_cost:6.2f}s  load {load_cost:6.2f}s  size {len(data) / 2**20:6.1f}MiB")
+    except RecursionError:  # 对象之间的引用链太长
+        print("pickle   RecursionError")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+逐步模式（triger_step=True）每根K线的耗时随历史长度的变化：把回放分成若干段，输出每段平均每根K线的耗时
+增量计算正常时各段应该基本持平，而不是随已加载的K线数增长
+
+    python -m benchmarks.step_bench --bars 40000 --blocks 8
+"""
+import argparse
+import sys
+import time
+
+from common.const import LvType
+from data_process.chan_config import ChanConfig
+from data_process.kline.kline_list import Kline_List
+
+from .combine_bench import make_klu_lst
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="逐步回放时每根K线的耗时")
+    parser.add_argument("--bars", type=int, default=40000)
+    parser.add_argument("--blocks", type=int, default=8)
+    args = parser.parse_args(argv)
+    sys.setrecursionlimit(20000)
+
+    klu_lst = make_klu_lst(args.bars)
+    kl_list = Kline_List(LvType.K_1M, ChanConfig({"triger_step": True}))
+    block = max(args.bars // args.blocks, 1)
+    begin = last = time.perf_counter()
+    for idx, klu in enumerate(klu_lst, start=1):
+        kl_list.add_single_klu(klu)
+        if idx % block == 0:
+            now = time.perf_counter()
+            print(f"bars={idx:<8} {(now - last) / block * 1e6:8.0f} us/bar  bi={len(kl_list.bi_list)} seg={len(kl_list.seg_list)} zs={len(kl_list.zs_list)}")
+            last = now
+    print(f"total {time.perf_counter() - begin:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
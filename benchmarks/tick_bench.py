@@ -0,0 +1,56 @@
+"""
+逐笔行情下 update_last_bar 的耗时：每根 1 分钟K线走完之前更新若干次，输出不同历史长度下每次更新的平均耗时
+只重算末尾，各历史长度下应该基本持平
+
+    python -m benchmarks.tick_bench --history 5000 20000 60000 --bars 300 --ticks 5
+"""
+import argparse
+import random
+import sys
+import time
+
+from common.const import LvType
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
+
+from .combine_bench import make_klu_lst
+
+
+def forming_klu_lst(klu, cnt, rng):
+    """klu 走完之前的 cnt 个中间状态，最后一个与 klu 相同"""
+    res = []
+    for _ in range(cnt - 1):
+        close = rng.uniform(klu.low, klu.high)
+        res.append(Kline_Unit.from_fields(klu.time, klu.open, max(klu.open, close), min(klu.open, close), close, TradeInfo({})))
+    return res + [Kline_Unit.from_fields(klu.time, klu.open, klu.high, klu.low, klu.close, TradeInfo({}))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="update_last_bar 每次更新的耗时")
+    parser.add_argument("--history", type=int, nargs="+", default=[5000, 20000, 60000], help="已加载的 1 分钟K线数")
+    parser.add_argument("--bars", type=int, default=300, help="每个历史长度下逐笔更新的K线数")
+    parser.add_argument("--ticks", type=int, default=5, help="每根K线更新的次数")
+    args = parser.parse_args(argv)
+    sys.setrecursionlimit(20000)
+
+    history = sorted(args.history)
+    klu_lst = make_klu_lst(history[-1] + args.bars * len(history))
+    rng = random.Random(0)
+    chan = Chan("bench", data_src=None, lv_list=[LvType.K_1M], config=ChanConfig({"triger_step": True, "kl_data_check": False}))
+    loaded = 0
+    for target in history:
+        for klu in klu_lst[loaded:target]:
+            chan.trigger_load({LvType.K_1M: [Kline_Unit.from_fields(klu.time, klu.open, klu.high, klu.low, klu.close, TradeInfo({}))]})
+        ticks = [tick for klu in klu_lst[target:target + args.bars] for tick in forming_klu_lst(klu, args.ticks, rng)]
+        begin = time.perf_counter()
+        for tick in ticks:
+            chan.update_last_bar(LvType.K_1M, tick)
+        cost = (time.perf_counter() - begin) / len(ticks)
+        loaded = target + args.bars
+        print(f"history={target:<8} {cost * 1e6:8.0f} us/tick  bi={len(chan[0].bi_list)} seg={len(chan[0].seg_list)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+全市场批量计算：多进程按代码分块计算 Chan，结果按完成顺序流式返回
+
+    python -m biz.batch --codes sz.000001,sh.600000 --lv K_DAY --begin 2020-01-01 --workers 8 --output res.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from multiprocessing import util as mp_util
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import data_fetch.manager as fetchManager
+from common.const import AuType, LvType
+from data_fetch.abs_stock_api import read_kl_columns
+from data_fetch.manager import DataSrc
+from data_fetch.shared_bars import SharedBars, SharedBarsHandle
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+
+from .chan_state import ChanStateStore, load_chan_incremental
+
+
+@dataclass
+class BatchResult:
+    code: str
+    ok: bool
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    data: Dict[str, Any] = field(default_factory=dict)  # summarize 的返回值，默认见 summarize_chan
+
+
+@dataclass
+class BatchTask:
+    """每个 worker 进程共享的计算参数，需可 pickle"""
+    lv_list: List[LvType]
+    config: Dict[str, Any]
+    data_src: Union[DataSrc, str] = DataSrc.BAOSTOCK
+    begin_time: Optional[str] = None
+    end_time: Optional[str] = None
+    autype: AuType = AuType.QFQ
+    summarize: Optional[Callable[[Chan], Dict[str, Any]]] = None  # 需为模块级函数
+    fetcher_attrs: Dict[str, Any] = field(default_factory=dict)  # 设置到数据源类上的属性，如 LocalFetcher.data_path
+    shared_bars: Optional[SharedBarsHandle] = None  # 不为 None 时从共享内存读取K线，不再访问数据源，见 share_bars
+    state_dir: Optional[str] = None  # 不为 None 时在上一次的状态上只计算新增的K线，见 chan_state；与 shared_bars 同时设置时不生效
+
+
+def summarize_chan(chan: Chan) -> Dict[str, Any]:
+    """默认结果：各级别的买卖点、最后一个线段和中枢"""
+    res = {}
+    for lv in chan.lv_list:
+        kl_list = chan[lv]
+        last_seg = kl_list.seg_list[-1] if len(kl_list.seg_list) else None
+        last_zs = kl_list.zs_list[-1] if len(kl_list.zs_list) else None
+        res[lv.name] = {
+            "bsp": [
+                {"time": bsp.klu.time.to_str(), "is_buy": bsp.is_buy, "type": bsp.type2str(), "price": bsp.klu.close}
+                for bsp in sorted(kl_list.bs_point_lst.lst, key=lambda x: x.klu.idx)
+            ],
+            "last_seg": None if last_seg is None else {
+                "begin": last_seg.get_begin_klu().time.to_str(),
+                "end": last_seg.get_end_klu().time.to_str(),
+                "dir": last_seg.dir.name,
+                "is_sure": last_seg.is_sure,
+            },
+            "last_zs": None if last_zs is None else {
+                "begin": last_zs.begin.time.to_str(),
+                "end": last_zs.end.time.to_str(),
+                "low": last_zs.low,
+                "high": last_zs.high,
+            },
+        }
+    return res
+
+
+_worker_task: Optional[BatchTask] = None
+_worker_bars: Optional[SharedBars] = None
+
+
+_UNSET = object()
+
+
+def open_fetcher(task: BatchTask) -> Dict[str, Any]:
+    """设置 fetcher_attrs 并初始化数据源，返回被覆盖的类属性，由 close_fetcher 还原"""
+    stockapi_cls = fetchManager.get_stock_api(task.data_src)
+    old_attrs = {k: vars(stockapi_cls).get(k, _UNSET) for k in task.fetcher_attrs}
+    for k, v in task.fetcher_attrs.items():
+        setattr(stockapi_cls, k, v)
+    try:
+        fetchManager.open_session(task.data_src)
+    except BaseException:
+        restore_fetcher_attrs(task, old_attrs)
+        raise
+    return old_attrs
+
+
+def close_fetcher(task: BatchTask, old_attrs: Dict[str, Any]):
+    try:
+        fetchManager.close_session(task.data_src)
+    finally:
+        restore_fetcher_attrs(task, old_attrs)
+
+
+def restore_fetcher_attrs(task: BatchTask, old_attrs: Dict[str, Any]):
+    stockapi_cls = fetchManager.get_stock_api(task.data_src)
+    for k, v in old_attrs.items():
+        if v is _UNSET:
+            delattr(stockapi_cls, k)
+        else:
+            setattr(stockapi_cls, k, v)
+
+
+def init_worker(task: BatchTask):
+    """每个进程只初始化一次数据源（如 baostock 登录），进程退出时关闭"""
+    global _worker_task
+    _worker_task = task
+    if task.shared_bars is None:
+        open_fetcher(task)
+        mp_util.Finalize(None, fetchManager.close_session, args=(task.data_src,), exitpriority=10)
+
+
+def get_worker_bars(handle: SharedBarsHandle) -> SharedBars:
+    global _worker_bars
+    if _worker_bars is None or _worker_bars.handle.shm_names != handle.shm_names:
+        _worker_bars = SharedBars.attach(handle)
+    return _worker_bars
+
+
+def share_bars(codes: Iterable[str], task: BatchTask) -> SharedBars:
+    """
+    在父进程中一次性获取所有代码的K线并放入共享内存，用法：
+        with share_bars(codes, task) as bars:
+            task.shared_bars = bars.handle
+            for res in run_batch(codes, task): ...
+    配置了 resample_lv 时只获取最小级别
+    获取失败的代码不放入共享内存，计算时会报 SRC_DATA_NOT_FOUND
+    """
+    lv_list = task.lv_list[-1:] if task.config.get("resample_lv") else task.lv_list
+    bars = SharedBars.create()
+    old_attrs = open_fetcher(task)
+    stockapi_cls = fetchManager.get_stock_api(task.data_src)
+    try:
+        for code in codes:
+            for lv in lv_list:
+                try:
+                    stockapi = stockapi_cls(code=code, k_type=lv, begin_date=task.begin_time, end_date=task.end_time, autype=task.autype)
+                    kl_columns = read_kl_columns(stockapi)
+                except Exception as e:
+                    print(f"[WARNING-{code}]{lv}级别获取数据失败：{e}", file=sys.stderr)
+                    continue
+                bars.add(code, lv, kl_columns)  # 拷进共享内存后即释放，父进程里同时只有一个代码的K线
+    except BaseException:
+        bars.close()
+        raise
+    finally:
+        close_fetcher(task, old_attrs)
+    return bars
+
+
+def run_code(task: BatchTask, code: str) -> BatchResult:
+    begin = time.time()
+    try:
+        if task.shared_bars is not None:
+            bars = get_worker_bars(task.shared_bars)
+            kl_columns = {lv: bars.get(code, lv) for lv in task.lv_list}
+            chan = Chan.from_kl_columns(
+                code,
+                {lv: kl for lv, kl in kl_columns.items() if kl is not None},
+                lv_list=list(task.lv_list),
+                config=ChanConfig(dict(task.config)),
+                autype=task.autype,
+            )
+        elif task.state_dir is not None:
+            chan = load_chan_incremental(
+                ChanStateStore(task.state_dir),
+                code,
+                list(task.lv_list),
+                task.config,
+                data_src=task.data_src,
+                begin_time=task.begin_time,
+                end_time=task.end_time,
+                autype=task.autype,
+            )
+        else:
+            chan = Chan(
+                code=code,
+                begin_time=task.begin_time,
+                end_time=task.end_time,
+                data_src=task.data_src,
+                lv_list=list(task.lv_list),
+                config=ChanConfig(dict(task.config)),  # ChanConfig 会消耗传入的 dict
+                autype=task.autype,
+            )
+        summarize = task.summarize or summarize_chan
+        return BatchResult(code=code, ok=True, elapsed=time.time() - begin, data=summarize(chan))
+    except Exception as e:
+        return BatchResult(code=code, ok=False, error=f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=3)}", elapsed=time.time() - begin)
+
+
+def run_chunk(codes: List[str]) -> List[BatchResult]:
+    assert _worker_task is not None
+    return [run_code(_worker_task, code) for code in codes]
+
+
+def run_batch(
+    codes: Iterable[str],
+    task: BatchTask,
+    max_workers: Optional[int] = None,
+    chunk_size: int = 8,
+    on_progress: Optional[Callable[[int, int, BatchResult], None]] = None,
+) -> Iterator[BatchResult]:
+    """
+    按完成顺序逐个返回每个代码的结果，单个代码失败不影响其它代码（ok=False, error 记录异常）
+    max_workers=1 时在当前进程中计算，便于调试
+    on_progress(已完成数, 总数, 当前结果)
+    """
+    codes = list(codes)
+    total = len(codes)
+    done = 0
+    if max_workers == 1:
+        old_attrs = open_fetcher(task) if task.shared_bars is None else None
+        try:
+            for code in codes:
+                res = run_code(task, code)
+                done += 1
+                if on_progress:
+                    on_progress(done, total, res)
+                yield res
+        finally:
+            if old_attrs is not None:
+                close_fetcher(task, old_attrs)
+        return
+
+    chunks = [codes[i:i+chunk_size] for i in range(0, total, chunk_size)]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(task,)) as executor:
+        futures = {executor.submit(run_chunk, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                chunk_res = future.result()
+            except Exception as e:  # worker 进程异常退出等，整块记为失败
+                chunk_res = [BatchResult(code=code, ok=False, error=f"{type(e).__name__}: {e}") for code in futures[future]]
+            for res in chunk_res:
+                done += 1
+                if on_progress:
+                    on_progress(done, total, res)
+                yield res
+
+
+def parse_data_src(src: str) -> Union[DataSrc, str]:
+    if src.startswith("custom:"):
+        return src
+    return DataSrc[src.upper()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量计算缠论结果，每行输出一个代码的 JSON")
+    parser.add_argument("--codes", help="逗号分隔的代码列表")
+    parser.add_argument("--code-file", help="代码文件，每行一个")
+    parser.add_argument("--lv", default="K_DAY", help="逗号分隔的级别，从大到小，如 K_DAY,K_30M")
+    parser.add_argument("--src", default="BAOSTOCK", help="数据源，DataSrc 名称或 custom:pkg.Cls")
+    parser.add_argument("--begin", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--autype", default="QFQ", choices=[x.name for x in AuType])
+    parser.add_argument("--config", default="{}", help="ChanConfig 的 JSON 字符串")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=8)
+    parser.add_argument("--output", default=None, help="输出文件，默认 stdout")
+    parser.add_argument("--share-bars", action="store_true", help="父进程先获取全部K线放入共享内存，子进程零拷贝读取")
+    parser.add_argument("--state-dir", default=None, help="保存每个代码的计算状态，下次只计算新增的K线")
+    args = parser.parse_args(argv)
+
+    codes: List[str] = []
+    if args.codes:
+        codes.extend(x.strip() for x in args.codes.split(",") if x.strip())
+    if args.code_file:
+        with open(args.code_file, encoding="utf-8") as f:
+            codes.extend(line.strip() for line in f if line.strip())
+    if not codes:
+        parser.error("需要 --codes 或 --code-file")
+
+    task = BatchTask(
+        lv_list=[LvType[lv.strip()] for lv in args.lv.split(",")],
+        config=json.loads(args.config),
+        data_src=parse_data_src(args.src),
+        begin_time=args.begin,
+        end_time=args.end,
+        autype=AuType[args.autype],
+        state_dir=args.state_dir,
+    )
+
+    def report(done, total, res: BatchResult):
+        status = "ok" if res.ok else f"FAILED {res.error.splitlines()[0] if res.error else ''}"
+        print(f"[{done}/{total}] {res.code} {status} {res.elapsed:.2f}s", file=sys.stderr)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    bars: Optional[SharedBars] = None
+    fail_cnt = 0
+    try:
+        if args.share_bars:
+            bars = share_bars(codes, task)
+            task.shared_bars = bars.handle
+        for res in run_batch(codes, task, max_workers=args.workers, chunk_size=args.chunk, on_progress=report):
+            fail_cnt += not res.ok
+            out.write(json.dumps(asdict(res), ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if bars is not None:
+            bars.close()
+        if out is not sys.stdout:
+            out.close()
+    return 1 if fail_cnt else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
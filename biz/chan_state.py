@@ -0,0 +1,171 @@
+"""
+按代码保存 Chan 的计算状态，每天只拉取、计算新增的K线
+
+    store = ChanStateStore("chan_state")
+    chan = load_chan_incremental(store, "sz.000001", [LvType.K_DAY], {"triger_step": True}, begin_time="2015-01-01")
+
+- 每个 (数据源, 代码, 级别, 复权, 开始日期, 配置) 一个快照文件（见 Chan.save_snapshot），文件名带配置的哈希，配置变了不会用到旧状态
+- 状态只保存到最高级别倒数第二根K线：最后一根可能是盘中还没走完的，下次从它所在的日期开始重新拉取
+- 重新拉取到的状态最后一根K线与保存时价格不一致，说明复权变了（前复权会改写历史），整个重新计算
+- 先写临时文件再 os.replace，中断不会留下写了一半的快照；快照读取失败、格式版本不一致时同样整个重新计算
+非逐步模式下结果与从头计算相同，只是买卖点列表的顺序可能不同（之前已经确定的在前）
+"""
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+import data_fetch.manager as fetchManager
+from common.const import AuType, LvType
+from common.func_util import kl_type_lt_day, safe_name, time2epoch
+from data_fetch.abs_stock_api import read_kl_columns
+from data_fetch.bar_cache import BarCache
+from data_fetch.kl_columns import DAY_SECONDS, PRICE_FIELDS, KlColumns, epoch2date
+from data_fetch.manager import DataSrc
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.common.chan_exception import ChanException
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class ChanStateStore:
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+
+    def state_path(self, data_src, code, lv_list: List[LvType], autype: AuType, begin_time, config: Dict[str, Any]) -> str:
+        lv_name = "_".join(lv.name for lv in lv_list)
+        begin = "all" if begin_time is None else safe_name(str(begin_time))
+        return os.path.join(self.state_dir, safe_name(fetchManager.src_name(data_src)), safe_name(str(code)), f"{lv_name}_{autype.name}_{begin}_{config_hash(config)}.snap")
+
+    def load(self, path) -> Optional[Chan]:
+        try:
+            return Chan.load_snapshot(path)
+        except (OSError, ChanException):
+            return None
+
+    def save(self, chan: Chan, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            chan.save_snapshot(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def load_chan_incremental(
+    store: ChanStateStore,
+    code,
+    lv_list: List[LvType],
+    config: Dict[str, Any],
+    data_src: Union[DataSrc, str] = DataSrc.BAOSTOCK,
+    begin_time=None,
+    end_time=None,
+    autype: AuType = AuType.QFQ,
+) -> Chan:
+    """
+    读取 store 里上一次的状态，只拉取之后的K线并 trigger_load；没有可用的状态时从头计算，算完写回状态
+    config: ChanConfig 的参数字典（不会被修改），同时用于区分状态
+    """
+    path = store.state_path(data_src, code, lv_list, autype, begin_time, config)
+    chan = store.load(path)
+    cache_dir = config.get("cache_dir")
+
+    def process(stockapi_cls):
+        def fetch(lv: LvType, begin_date) -> KlColumns:
+            return read_kl_columns(stockapi_cls(code=code, k_type=lv, begin_date=begin_date, end_date=end_time, autype=autype))
+
+        new_columns = None if chan is None else fetch_new_columns(chan, fetch)
+        if new_columns is None:
+            kl_columns = {lv: fetch(lv, begin_time) for lv in lv_list}
+            return extend_chan(store, path, None, lv_list[0], kl_columns, lambda columns: build_chan(code, lv_list, config, autype, columns))
+        return extend_chan(store, path, chan, lv_list[0], new_columns, None)
+
+    return fetchManager.fetch_data(data_src, process, cache=None if cache_dir is None else BarCache(cache_dir))
+
+
+def fetch_new_columns(chan: Chan, fetch: Callable[[LvType, Any], KlColumns]) -> Optional[Dict[LvType, KlColumns]]:
+    """
+    状态之后的新K线；从状态里最高级别最后一根K线所在日期开始拉取，
+    各级别最后一根K线与重新拉取的不一致（复权变了或者数据被修正）时返回 None
+    """
+    if any(klu is not None for klu in getattr(chan, "klu_cache", [])):
+        return None  # 还有等待父级别K线的次级别K线，不会出现在 extend_chan 保存的状态里
+    top_list = chan[0]
+    begin_date = epoch2date(time2epoch(top_list.lst[-1].lst[-1].time))
+    res = {}
+    for lv in chan.lv_list:
+        kl_columns = fetch(lv, begin_date)
+        kl_list = chan[lv]
+        if kl_list.klu_cnt == 0:
+            res[lv] = kl_columns
+            continue
+        last_klu = kl_list.lst[-1].lst[-1]
+        last_ts = time2epoch(last_klu.time)  # Time.ts 是本地时间且天级别在23:59，与列式存储的编码不同
+        pos = int(np.searchsorted(kl_columns.time, last_ts))
+        if pos == len(kl_columns) or kl_columns.time[pos] != last_ts:
+            return None
+        if not all(np.isclose(kl_columns.columns[field][pos], getattr(last_klu, field), rtol=1e-9, atol=0) for field in PRICE_FIELDS):
+            return None
+        res[lv] = kl_columns.slice(pos + 1, len(kl_columns))
+    return res
+
+
+def build_chan(code, lv_list: List[LvType], config: Dict[str, Any], autype: AuType, kl_columns: Dict[LvType, KlColumns]) -> Chan:
+    """从头计算"""
+    chan = Chan.from_kl_columns(code, kl_columns, lv_list=list(lv_list), config=ChanConfig(dict(config)), autype=autype)  # ChanConfig 会消耗传入的 dict
+    if chan.conf.triger_step:
+        for _ in chan.step_load():
+            ...
+    chan.kl_columns = None
+    return chan
+
+
+def feed_chan(chan: Chan, kl_columns: Dict[LvType, KlColumns]):
+    """把新K线接在后面"""
+    top_lv = chan.lv_list[0]
+    if len(kl_columns.get(top_lv, ())) == 0:
+        return  # 次级别K线需要挂在新的最高级别K线上，等它出现之后再一起加入
+    chan.trigger_load({lv: list(chan.load_stock_columns(columns, lv, chan[lv].klu_cnt)) for lv, columns in kl_columns.items() if len(columns)})
+    if not chan.conf.triger_step:
+        for lv in chan.lv_list:
+            chan[lv].cal_seg_and_zs()
+
+
+def extend_chan(
+    store: ChanStateStore,
+    path,
+    chan: Optional[Chan],
+    top_lv: LvType,
+    kl_columns: Dict[LvType, KlColumns],
+    build: Optional[Callable[[Dict[LvType, KlColumns]], Chan]],
+) -> Chan:
+    """
+    chan 为 None 时用 build 从头计算，否则把 kl_columns 接在 chan 后面
+    最高级别的最后一根K线之前的部分算完就写回状态，再加入最后一根
+    """
+    top = kl_columns[top_lv]
+    if len(top) < 2:
+        if chan is None:
+            return build(kl_columns)
+        feed_chan(chan, kl_columns)
+        return chan
+    cut = int(top.time[-2])
+    # 天级别及以上的K线时间只有日期，当天的次级别K线都挂在它下面
+    sub_cut = cut if kl_type_lt_day(top_lv) else cut + DAY_SECONDS - 1
+    cuts = {lv: cut if lv == top_lv else sub_cut for lv in kl_columns}
+    head = {lv: columns.between(None, cuts[lv]) for lv, columns in kl_columns.items()}
+    tail = {lv: columns.between(cuts[lv] + 1, None) for lv, columns in kl_columns.items()}
+    if chan is None:
+        chan = build(head)
+    else:
+        feed_chan(chan, head)
+    store.save(chan, path)
+    feed_chan(chan, tail)
+    return chan
@@ -39,14 +39,15 @@ def get_json_data(chan_data):
     meta = ChanChartMeta(chan_data)
     datetick = meta.datetick
 
+    store = chan_data.store
     kline_units_data = [{
-        'timestamp': item.time.to_str(),
-        'open': item.open,
-        'high': item.high,
-        'low': item.low,
-        'close': item.close,
-        'volume': item.trade_info.metric['volume']
-    } for item in meta.klu_iter()]
+        'timestamp': timestamp,
+        'open': _open,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': None if volume != volume else volume,  # NaN 还原成 None
+    } for timestamp, _open, high, low, close, volume in zip(datetick, store.open, store.high, store.low, store.close, store.volume)]
 
     merge_kline_data = [{
         'begin': {'timestamp': datetick[item.begin_idx], 'value': item.low},
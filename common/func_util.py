@@ -1,3 +1,6 @@
+import calendar
+import re
+
 from common.const import LvType
 from common.time import Time
 
@@ -43,3 +46,13 @@ def create_item_dict(data, column_name):
     for i in range(len(data)):
         data[i] = parse_normal_date_str(data[i]) if i == 0 else str2float(data[i])
     return dict(zip(column_name, data))
+
+
+def time2epoch(t: Time) -> int:
+    # 把墙上时间按UTC编码成秒数，与时区无关，便于列式存储
+    return calendar.timegm((t.year, t.month, t.day, t.hour, t.minute, t.second))
+
+
+def safe_name(s: str) -> str:
+    # 用作文件名时替换掉路径分隔符等特殊字符
+    return re.sub(r"[^\w.\-]", "_", s)
@@ -2,6 +2,8 @@ from datetime import datetime
 
 
 class Time:
+    __slots__ = ("year", "month", "day", "hour", "minute", "second", "auto", "ts")
+
     def __init__(self, year, month, day, hour, minute, second=0, auto=True):
         self.year = year
         self.month = month
@@ -1,7 +1,11 @@
 import abc
-from typing import Iterable
+from typing import Iterable, Optional
+
+from data_fetch.kl_columns import KlColumns
 
 class AbsStockApi:
+    thread_safe = False  # 能否在多个线程中同时获取数据（parallel_fetch 用）
+
     def __init__(self, code, k_type, begin_date, end_date, autype):
         self.code = code
         self.name = None
@@ -16,6 +20,13 @@ class AbsStockApi:
     def get_kl_data(self) -> Iterable:
         pass
 
+    def get_kl_columns(self) -> Optional[KlColumns]:
+        """
+        按列一次性返回全部K线，Chan 会优先使用，省去逐根构造字典
+        返回 None 表示不支持，走 get_kl_data
+        """
+        return None
+
     @classmethod
     def set_base_info(self):
         pass
@@ -27,3 +38,11 @@ class AbsStockApi:
     @classmethod
     def do_close(cls):
         pass
+
+
+def read_kl_columns(api: AbsStockApi) -> KlColumns:
+    """按列读取全部K线，数据源不支持列式时由 get_kl_data 转换"""
+    kl_columns = api.get_kl_columns()
+    if kl_columns is None:
+        kl_columns = KlColumns.from_kl_data(api.get_kl_data())
+    return kl_columns
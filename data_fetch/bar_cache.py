@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import threading
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from common.func_util import safe_name
+import data_fetch.manager as fetchManager
+from data_fetch.abs_stock_api import AbsStockApi, read_kl_columns
+from data_fetch.kl_columns import PRICE_FIELDS, KlColumns, date2epoch, epoch2date
+
+CACHE_VERSION = 1
+_api_init_lock = threading.Lock()
+META_FILE = "meta.json"
+
+
+def _norm_date(date_str) -> Optional[str]:
+    """统一成 YYYY-MM-DD，None 表示不限"""
+    if date_str is None:
+        return None
+    digits = re.sub(r"\D", "", str(date_str))[:8]
+    return f"{digits[:4]}-{digits[4:6]}-{digits[6:8]}"
+
+
+def same_bars(kl1: KlColumns, kl2: KlColumns) -> bool:
+    """两段K线时间和价格是否一致"""
+    if len(kl1) != len(kl2) or not np.array_equal(kl1.time, kl2.time):
+        return False
+    return all(np.allclose(kl1.columns[field], kl2.columns[field], rtol=1e-9, atol=0, equal_nan=True) for field in PRICE_FIELDS)
+
+
+class BarCache:
+    """
+    K线本地列式缓存
+    - 每个 (data_src, code, LvType, AuType) 一个目录，每列一个 .npy 文件，读取时内存映射
+    - meta.json 记录列信息以及缓存覆盖的日期区间，最后写入，缺失即视为缓存无效
+    - 缓存结束日期之后的数据通过增量拉取补齐，见 CachedStockApi.fetch_delta
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def key_dir(self, data_src, code, k_type, autype) -> str:
+        return os.path.join(self.cache_dir, safe_name(fetchManager.src_name(data_src)), safe_name(str(code)), f"{k_type.name}_{autype.name}")
+
+    def load_meta(self, key_dir) -> Optional[dict]:
+        try:
+            with open(os.path.join(key_dir, META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != CACHE_VERSION:
+            return None
+        return meta
+
+    def load(self, key_dir, meta) -> Optional[KlColumns]:
+        try:
+            time = np.load(os.path.join(key_dir, "time.npy"), mmap_mode="r")
+            autofix = np.load(os.path.join(key_dir, "autofix.npy"), mmap_mode="r")
+            columns = {field: np.load(os.path.join(key_dir, f"{field}.npy"), mmap_mode="r") for field in meta["fields"]}
+        except (OSError, ValueError):
+            return None
+        if any(len(arr) != meta["rows"] for arr in [time, autofix, *columns.values()]):
+            return None
+        return KlColumns(time, columns, autofix)
+
+    def save(self, key_dir, kl_columns: KlColumns, begin_date, end_date):
+        """
+        每个文件先写到临时文件再 os.replace，不改写旧文件的内容：旧缓存可能正被 load 内存映射着（如 fetch_delta 中的 self.cached），
+        原地截断重写会让映射读到被截掉的部分（SIGBUS）；替换后旧映射仍指向原来的文件
+        """
+        os.makedirs(key_dir, exist_ok=True)
+        meta_path = os.path.join(key_dir, META_FILE)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)  # 先让旧缓存失效，避免写一半时读到新旧混合的列
+        arrays = {
+            "time": np.ascontiguousarray(kl_columns.time, dtype=np.int64),
+            "autofix": np.ascontiguousarray(kl_columns.autofix, dtype=bool),
+        }
+        for field, arr in kl_columns.columns.items():
+            arrays[field] = np.ascontiguousarray(arr, dtype=np.float64)
+        for name, arr in arrays.items():
+            path = os.path.join(key_dir, f"{name}.npy")
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, arr)
+            os.replace(path + ".tmp", path)
+        meta = {
+            "version": CACHE_VERSION,
+            "rows": len(kl_columns),
+            "fields": list(kl_columns.columns.keys()),
+            "begin_date": begin_date,
+            "end_date": end_date,
+            "fetch_date": str(date.today()),
+        }
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @staticmethod
+    def covers_begin(meta, begin_date) -> bool:
+        return meta["begin_date"] is None or (begin_date is not None and begin_date >= meta["begin_date"])
+
+    @staticmethod
+    def covers_end(meta, end_date) -> bool:
+        """未指定结束日期时视为截止到今天"""
+        cached_end = meta["end_date"] or meta["fetch_date"]
+        return cached_end >= (end_date or str(date.today()))
+
+    def wrap(self, data_src, stockapi_cls):
+        return type(f"Cached{stockapi_cls.__name__}", (CachedStockApi,), {
+            "cache": self,
+            "data_src": data_src,
+            "api_cls": stockapi_cls,
+            "api_ready": False,
+            "thread_safe": stockapi_cls.thread_safe,
+        })
+
+
+class CachedStockApi(AbsStockApi):
+    """
+    包在真实数据源外面的缓存层，由 BarCache.wrap 生成子类
+    命中缓存时不会初始化真实数据源（如 baostock 登录）；数据源已由 open_session 统一初始化时直接使用，不再初始化和关闭
+    """
+    cache: BarCache
+    data_src = None
+    api_cls = AbsStockApi
+    api_ready = False
+
+    def __init__(self, code, k_type, begin_date, end_date, autype):
+        super(CachedStockApi, self).__init__(code, k_type, begin_date, end_date, autype)
+        self.begin = _norm_date(begin_date)
+        self.end = _norm_date(end_date)
+        self.key_dir = self.cache.key_dir(self.data_src, code, k_type, autype)
+        self.meta = self.cache.load_meta(self.key_dir)
+        self.cached: Optional[KlColumns] = None  # 本地已有的数据
+        self.delta_begin: Optional[str] = None  # 不为 None 时只需要从该日期开始补齐尾部
+        if self.meta is not None and self.cache.covers_begin(self.meta, self.begin):
+            self.cached = self.cache.load(self.key_dir, self.meta)
+            if self.cached is not None and not self.cache.covers_end(self.meta, self.end):
+                if len(self.cached) >= 2:
+                    # 从倒数第二根所在日期开始拉取：倒数第二根用于校验复权是否变化，最后一根可能是盘中未走完的K线，需要覆盖
+                    self.delta_begin = epoch2date(self.cached.time[-2])
+                else:
+                    self.cached = None
+        # 需要访问数据源时立即构造，保证其构造期异常（如 SRC_DATA_NOT_FOUND）行为不变
+        if self.cached is None:
+            self.api = self.new_api(begin_date, end_date)
+        elif self.delta_begin is not None:
+            self.api = self.new_api(self.delta_begin, end_date)
+        else:
+            self.api = None
+
+    def get_kl_data(self):
+        yield from self.get_kl_columns().iter_kl_data()
+
+    def get_kl_columns(self) -> KlColumns:
+        if self.cached is None:
+            kl_columns = self.fetch_all(self.api)
+        elif self.delta_begin is not None:
+            kl_columns = self.fetch_delta()
+        else:
+            kl_columns = self.cached
+        return kl_columns.between(
+            None if self.begin is None else date2epoch(self.begin),
+            None if self.end is None else date2epoch(self.end, end_of_day=True),
+        )
+
+    def fetch_all(self, api: AbsStockApi) -> KlColumns:
+        kl_columns = read_kl_columns(api)
+        if len(kl_columns) > 0:
+            self.cache.save(self.key_dir, kl_columns, self.begin, self.end)
+        return kl_columns
+
+    def fetch_delta(self) -> KlColumns:
+        """
+        只拉取缓存尾部之后的数据并追加到本地
+        重叠部分的价格和缓存不一致时说明复权因子变了（前复权会改写历史），整体重新拉取
+        """
+        assert self.cached is not None and self.meta is not None
+        cached = self.cached
+        delta = read_kl_columns(self.api)
+        last_ts = int(cached.time[-1])
+        overlap_begin = int(np.searchsorted(cached.time, date2epoch(self.delta_begin), side='left'))
+        overlap = cached.slice(overlap_begin, len(cached) - 1)
+        delta_overlap = delta.between(int(overlap.time[0]), int(overlap.time[-1]))
+        if not same_bars(overlap, delta_overlap):
+            return self.fetch_all(self.new_api(self.begin_date, self.end_date))
+        kl_columns = cached.slice(0, len(cached) - 1).concat(delta.between(last_ts, None))
+        self.cache.save(self.key_dir, kl_columns, self.meta["begin_date"], self.end)
+        return kl_columns
+
+    def new_api(self, begin_date, end_date) -> AbsStockApi:
+        cls = type(self)
+        with _api_init_lock:
+            if not cls.api_ready and not fetchManager.in_session(self.data_src):
+                cls.api_cls.do_init()
+                cls.api_ready = True
+        return cls.api_cls(code=self.code, k_type=self.k_type, begin_date=begin_date, end_date=end_date, autype=self.autype)
+
+    @classmethod
+    def do_init(cls):
+        pass  # 真实数据源延迟到缓存未命中时再初始化
+
+    @classmethod
+    def do_close(cls):
+        if cls.api_ready:
+            cls.api_cls.do_close()
+            cls.api_ready = False
@@ -9,6 +9,7 @@ from data_fetch.abs_stock_api import AbsStockApi
 
 class CcxtFetcher(AbsStockApi):
     is_connect = None
+    thread_safe = True
 
     def __init__(self, code, k_type=LvType.K_DAY, begin_date=None, end_date=None, autype=AuType.QFQ):
         super(CcxtFetcher, self).__init__(code, k_type, begin_date, end_date, autype)
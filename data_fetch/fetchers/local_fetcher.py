@@ -1,27 +1,59 @@
+import os
+from typing import Optional
+
+import numpy as np
 import pandas as pd
 
-from common.const import AuType, DataField, LvType
-from common.func_util import parse_normal_date_str, str2float
+from common.const import AuType, LvType
 from data_fetch.abs_stock_api import AbsStockApi
+from data_fetch.kl_columns import KlColumns, date2epoch
+from data_process.common.chan_exception import ChanException, ErrCode
+
+FILE_EXTS = [".csv", ".parquet", ".npy"]
 
 
 class LocalFetcher(AbsStockApi):
+    """
+    读取本地 CSV/Parquet/npy 文件
+    - data_path: 文件路径；如果是目录，则按 {code}_{级别}.ext 或 {code}.ext 查找
+    - max_rows: 只取最后多少根，None 表示全部
+    npy 文件需为带字段名的结构化数组，字段名同 CSV 列名
+    """
+    data_path = "data/_local.csv"
+    max_rows: Optional[int] = None
+    thread_safe = True
+
     def __init__(self, code, k_type=LvType.K_DAY, begin_date=None, end_date=None, autype=AuType.QFQ):
         super(LocalFetcher, self).__init__(code, k_type, begin_date, end_date, autype)
+        self.file_path = self.get_file_path()  # 构造时就检查，找不到时 auto_skip_illegal_sub_lv 可以跳过该级别
 
     def get_kl_data(self):
+        yield from self.get_kl_columns().iter_kl_data()
+
+    def get_kl_columns(self) -> KlColumns:
+        df = read_local_file(self.file_path)
+        if self.max_rows is not None:
+            df = df.tail(self.max_rows)
+        kl_columns = KlColumns.from_dataframe(df)
+        begin_ts = None if self.begin_date is None else date2epoch(self.begin_date)
+        end_ts = None if self.end_date is None else date2epoch(self.end_date, end_of_day=True)
+        return kl_columns.between(begin_ts, end_ts)
 
-        file_path = "data/_local.csv"
-        df = pd.read_csv(file_path)
+    def get_file_path(self) -> str:
+        if not os.path.isdir(self.data_path):
+            return self.data_path
+        for name in [f"{self.code}_{self.k_type.name}", str(self.code)]:
+            for ext in FILE_EXTS:
+                file_path = os.path.join(self.data_path, name + ext)
+                if os.path.exists(file_path):
+                    return file_path
+        raise ChanException(f"can not find local data of {self.code} {self.k_type} in {self.data_path}", ErrCode.SRC_DATA_NOT_FOUND)
 
-        for index, row in df.tail(10000).iterrows():
-            data_dict = {
-                DataField.FIELD_TIME: parse_normal_date_str(row["Date"]),
-                DataField.FIELD_OPEN: str2float(row["Open"]),
-                DataField.FIELD_HIGH: str2float(row["High"]),
-                DataField.FIELD_LOW: str2float(row["Low"]),
-                DataField.FIELD_CLOSE: str2float(row["Close"]),
-                DataField.FIELD_VOLUME: str2float(row["Volume"])
-            }
 
-            yield data_dict, False
\ No newline at end of file
+def read_local_file(file_path) -> pd.DataFrame:
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".parquet":
+        return pd.read_parquet(file_path)
+    elif ext == ".npy":
+        return pd.DataFrame(np.load(file_path))
+    return pd.read_csv(file_path)
@@ -6,6 +6,8 @@ from data_fetch.abs_stock_api import AbsStockApi
 
 
 class YFinanceFetcher(AbsStockApi):
+    thread_safe = True
+
     def __init__(self, code, k_type=LvType.K_DAY, begin_date=None, end_date=None, autype=AuType.QFQ):
         super(YFinanceFetcher, self).__init__(code, k_type, begin_date, end_date, autype)
 
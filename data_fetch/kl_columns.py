@@ -0,0 +1,197 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from common.const import DataField
+from common.func_util import time2epoch
+from common.time import Time
+
+# 除时间外可列式存储的字段，价格列必须存在，其余可缺失
+PRICE_FIELDS = [DataField.FIELD_OPEN, DataField.FIELD_HIGH, DataField.FIELD_LOW, DataField.FIELD_CLOSE]
+TRADE_FIELDS = [DataField.FIELD_VOLUME, DataField.FIELD_TURNOVER, DataField.FIELD_TURNRATE]
+KL_FIELDS = PRICE_FIELDS + TRADE_FIELDS
+DAY_SECONDS = 86400
+
+# 外部列名（小写） -> DataField
+COLUMN_NAME_MAP = {
+    "date": DataField.FIELD_TIME,
+    "time": DataField.FIELD_TIME,
+    "datetime": DataField.FIELD_TIME,
+    DataField.FIELD_TIME: DataField.FIELD_TIME,
+    "open": DataField.FIELD_OPEN,
+    "high": DataField.FIELD_HIGH,
+    "low": DataField.FIELD_LOW,
+    "close": DataField.FIELD_CLOSE,
+    "volume": DataField.FIELD_VOLUME,
+    "amount": DataField.FIELD_TURNOVER,
+    DataField.FIELD_TURNOVER: DataField.FIELD_TURNOVER,
+    "turn": DataField.FIELD_TURNRATE,
+    DataField.FIELD_TURNRATE: DataField.FIELD_TURNRATE,
+}
+
+
+class KlColumns:
+    """
+    按列存储的K线序列
+    - time: int64，墙上时间按UTC编码的秒数（见 time2epoch）
+    - columns: 字段 -> float64 数组，缺失值用 NaN 表示，取出时还原为 None
+    - autofix: bool 数组，对应 get_kl_data 返回的 autofix 标记
+    """
+    def __init__(self, time: np.ndarray, columns: Dict[str, np.ndarray], autofix: Optional[np.ndarray] = None):
+        self.time = time
+        self.columns = columns
+        if autofix is None:
+            autofix = np.zeros(len(time), dtype=bool)
+        self.autofix = autofix
+
+    def __len__(self):
+        return len(self.time)
+
+    @classmethod
+    def from_kl_data(cls, kl_data: Iterable[Tuple[Dict, bool]]) -> 'KlColumns':
+        """把 get_kl_data 协议的输出转成列式"""
+        time_lst: List[int] = []
+        autofix_lst: List[bool] = []
+        values: Dict[str, List[Optional[float]]] = {field: [] for field in KL_FIELDS}
+        for kl_dict, autofix in kl_data:
+            time_lst.append(time2epoch(kl_dict[DataField.FIELD_TIME]))
+            autofix_lst.append(autofix)
+            for field, lst in values.items():
+                lst.append(kl_dict.get(field))
+        columns = {}
+        for field, lst in values.items():
+            if field in PRICE_FIELDS or any(v is not None for v in lst):
+                columns[field] = np.array([np.nan if v is None else v for v in lst], dtype=np.float64)
+        return cls(np.array(time_lst, dtype=np.int64), columns, np.array(autofix_lst, dtype=bool))
+
+    @classmethod
+    def from_arrays(cls, time, _open, high, low, close, volume=None, turnover=None, turnover_rate=None) -> 'KlColumns':
+        """
+        time 支持 datetime64 数组、整数 epoch（同 time2epoch）、时间字符串或 Time 列表
+        """
+        columns = {}
+        for field, arr in zip(KL_FIELDS, [_open, high, low, close, volume, turnover, turnover_rate]):
+            if arr is not None:
+                columns[field] = np.asarray(arr, dtype=np.float64)
+        return cls(to_epoch_array(time), columns)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'KlColumns':
+        """整列转换，不逐行遍历；列名见 COLUMN_NAME_MAP，没有时间列时使用 DatetimeIndex"""
+        fields = {}
+        for col in df.columns:
+            field = COLUMN_NAME_MAP.get(str(col).lower())
+            if field is not None and field not in fields:
+                fields[field] = col
+        if DataField.FIELD_TIME in fields:
+            time = parse_time_column(df[fields[DataField.FIELD_TIME]])
+        else:
+            time = parse_time_column(df.index.to_series())
+        columns = {}
+        for field in KL_FIELDS:
+            if field in fields:
+                columns[field] = parse_float_column(df[fields[field]])
+        return cls(time, columns)
+
+    def slice(self, begin: int, end: int) -> 'KlColumns':
+        return KlColumns(self.time[begin:end], {field: arr[begin:end] for field, arr in self.columns.items()}, self.autofix[begin:end])
+
+    def between(self, begin_ts: Optional[int], end_ts: Optional[int]) -> 'KlColumns':
+        """按时间闭区间截取，None 表示不限"""
+        begin = 0 if begin_ts is None else int(np.searchsorted(self.time, begin_ts, side='left'))
+        end = len(self) if end_ts is None else int(np.searchsorted(self.time, end_ts, side='right'))
+        if begin == 0 and end == len(self):
+            return self
+        return self.slice(begin, end)
+
+    def concat(self, other: 'KlColumns') -> 'KlColumns':
+        columns = {}
+        for field in set(self.columns) | set(other.columns):
+            columns[field] = np.concatenate([self._column_or_nan(field), other._column_or_nan(field)])
+        return KlColumns(np.concatenate([self.time, other.time]), columns, np.concatenate([self.autofix, other.autofix]))
+
+    def _column_or_nan(self, field):
+        if field in self.columns:
+            return self.columns[field]
+        return np.full(len(self), np.nan)
+
+    def iter_time(self) -> Iterator[Time]:
+        """批量把 epoch 还原成 Time"""
+        dt = self.time.astype('datetime64[s]')
+        days = dt.astype('datetime64[D]')
+        months = days.astype('datetime64[M]')
+        # 年份超出小整数缓存，按取值复用同一个 int 对象，避免每根K线一个
+        year_values, year_idx = np.unique(months.astype(np.int64) // 12 + 1970, return_inverse=True)
+        year_values = year_values.tolist()
+        years = [year_values[i] for i in year_idx.tolist()]
+        month_lst = (months.astype(np.int64) % 12 + 1).tolist()
+        day_lst = ((days - months).astype(np.int64) + 1).tolist()
+        secs = (dt - days).astype(np.int64)
+        hours = (secs // 3600).tolist()
+        minutes = (secs % 3600 // 60).tolist()
+        seconds = (secs % 60).tolist()
+        for year, month, day, hour, minute, second in zip(years, month_lst, day_lst, hours, minutes, seconds):
+            yield Time(year, month, day, hour, minute, second)
+
+    def iter_kl_data(self) -> Iterator[Tuple[Dict, bool]]:
+        """按 get_kl_data 协议逐根返回 (kl_dict, autofix)"""
+        fields = list(self.columns.keys())
+        value_lsts = [self.columns[field].tolist() for field in fields]
+        nullable = [field not in PRICE_FIELDS for field in fields]
+        for row_idx, (time, autofix) in enumerate(zip(self.iter_time(), self.autofix.tolist())):
+            kl_dict = {DataField.FIELD_TIME: time}
+            for field, lst, can_null in zip(fields, value_lsts, nullable):
+                v = lst[row_idx]
+                kl_dict[field] = None if can_null and v != v else v
+            yield kl_dict, autofix
+
+
+def to_epoch_array(time) -> np.ndarray:
+    if isinstance(time, pd.Series):
+        return parse_time_column(time)
+    arr = np.asarray(time)
+    if np.issubdtype(arr.dtype, np.datetime64):
+        return arr.astype("datetime64[s]").astype(np.int64)
+    if np.issubdtype(arr.dtype, np.integer):
+        return arr.astype(np.int64)
+    if len(arr) and isinstance(arr[0], Time):
+        return np.array([time2epoch(t) for t in arr], dtype=np.int64)
+    return parse_time_column(pd.Series(arr))
+
+
+def date2epoch(date_str, end_of_day=False) -> int:
+    """日期字符串（2021-09-02 / 20210902 等）当天 00:00 的 epoch（同 time2epoch），end_of_day 时为当天最后一秒"""
+    ts = int(np.datetime64(pd.Timestamp(str(date_str)).date(), "s").astype(np.int64))
+    return ts + DAY_SECONDS - 1 if end_of_day else ts
+
+
+def epoch2date(ts) -> str:
+    """epoch 所在日期，YYYY-MM-DD"""
+    return str(np.datetime64(int(ts), "s").astype("datetime64[D]"))
+
+
+def parse_time_column(col: pd.Series) -> np.ndarray:
+    """整数列视为 20210902 / 20210902113000000 这种数字日期"""
+    if pd.api.types.is_numeric_dtype(col):
+        col = col.astype(np.int64).astype(str)
+    if pd.api.types.is_object_dtype(col) or pd.api.types.is_string_dtype(col):
+        sample = str(col.iloc[0]) if len(col) else ""
+        if len(sample) == 17:  # 20210902113000000
+            dt = pd.to_datetime(col, format="%Y%m%d%H%M%S%f")
+        elif len(sample) == 8:  # 20210902
+            dt = pd.to_datetime(col, format="%Y%m%d")
+        else:
+            dt = pd.to_datetime(col)
+    else:
+        dt = pd.to_datetime(col)
+    if getattr(dt.dt, "tz", None) is not None:
+        dt = dt.dt.tz_localize(None)
+    return dt.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+
+def parse_float_column(col: pd.Series) -> np.ndarray:
+    res = pd.to_numeric(col, errors="coerce")
+    # 和 str2float 一致：无法解析的字符串当作 0，原本为空的保持 NaN
+    res = res.mask(res.isna() & col.notna(), 0.0)
+    return res.to_numpy(dtype=np.float64)
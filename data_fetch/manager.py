@@ -1,3 +1,4 @@
+import inspect
 from enum import Enum, auto
 
 class DataSrc(Enum):
@@ -29,12 +30,55 @@ def get_stock_api(src):
 
     raise Exception("src type not found")
 
-def fetch_data(src, process):
+def src_name(src) -> str:
+    """数据源的名字，DataSrc 取小写的枚举名，自定义数据源为 custom:pkg.Cls 本身"""
+    return src.name.lower() if hasattr(src, "name") else str(src)
+
+
+# 已由调用方统一初始化的数据源，fetch_data 不再每次 do_init/do_close（如批量计算时每个进程只登录一次）
+_session_src = set()
+
+
+def open_session(src):
+    get_stock_api(src).do_init()
+    _session_src.add(src)
+
+
+def in_session(src) -> bool:
+    """数据源是否已由 open_session 统一初始化"""
+    return src in _session_src
+
+
+def close_session(src):
+    if src in _session_src:
+        _session_src.discard(src)
+        get_stock_api(src).do_close()
+
+
+def fetch_data(src, process, cache=None):
+    """
+    cache: BarCache 实例，传入时数据源外面会包一层本地列式缓存
+    process 返回生成器时（如 Chan.load）数据在迭代时才读取，迭代结束后才 do_close
+    """
     stockapi_cls = get_stock_api(src)
-    try:
-        stockapi_cls.do_init()
+    if cache is not None:
+        stockapi_cls = cache.wrap(src, stockapi_cls)
+    if in_session(src):
         return process(stockapi_cls)
-    except Exception:
+    stockapi_cls.do_init()
+    try:
+        res = process(stockapi_cls)
+    except BaseException:
+        stockapi_cls.do_close()
         raise
+    if inspect.isgenerator(res):
+        return _close_after(res, stockapi_cls)
+    stockapi_cls.do_close()
+    return res
+
+
+def _close_after(gen, stockapi_cls):
+    try:
+        yield from gen
     finally:
-        stockapi_cls.do_close()
\ No newline at end of file
+        stockapi_cls.do_close()
@@ -0,0 +1,102 @@
+"""
+由最小级别K线本地合成更高级别K线
+- 分钟级别之间：按交易时段分组，时段内从时段的开盘时间开始按目标周期切分（如A股 60M 为 10:30/11:30/14:00/15:00）
+  开盘时间由 session_open 给出（一天内各时段的开盘时间），与数据里第一根K线是哪根无关
+- 分钟 -> 日：按自然日分组
+- 日 -> 周/月：按自然周/自然月分组
+合成K线的时间取组内最后一根K线的时间（日线取当天日期），保证父级别时间不早于其所有子级别K线
+"""
+from typing import Sequence
+
+import numpy as np
+
+from common.const import DataField, LvType
+from data_fetch.kl_columns import DAY_SECONDS, TRADE_FIELDS, KlColumns
+from data_process.common.chan_exception import ChanException, ErrCode
+
+MINUTE_PERIOD = {
+    LvType.K_1M: 1,
+    LvType.K_3M: 3,
+    LvType.K_5M: 5,
+    LvType.K_15M: 15,
+    LvType.K_30M: 30,
+    LvType.K_60M: 60,
+}
+A_SHARE_SESSION_OPEN = ("09:30", "13:00")
+
+
+def session_open_seconds(session_open: Sequence[str]) -> np.ndarray:
+    """["HH:MM", ...] -> 当天的秒数，升序"""
+    try:
+        seconds = sorted(int(hh) * 3600 + int(mm) * 60 for hh, mm in (item.split(":") for item in session_open))
+    except ValueError as e:
+        raise ChanException(f"illegal session_open: {session_open}", ErrCode.PARA_ERROR) from e
+    if not seconds:
+        raise ChanException("session_open is empty", ErrCode.PARA_ERROR)
+    return np.array(seconds, dtype=np.int64)
+
+
+def resample(kl_columns: KlColumns, src_lv: LvType, dst_lv: LvType, session_open: Sequence[str] = A_SHARE_SESSION_OPEN) -> KlColumns:
+    """
+    session_open: 分钟级别之间合成时各交易时段的开盘时间，如 24 小时交易的数据为 ["00:00"]，有夜盘的期货加上 "21:00"
+    """
+    if src_lv == dst_lv:
+        return kl_columns
+    if src_lv in MINUTE_PERIOD and dst_lv in MINUTE_PERIOD:
+        if MINUTE_PERIOD[dst_lv] % MINUTE_PERIOD[src_lv] != 0:
+            raise ChanException(f"can not resample {src_lv} to {dst_lv}", ErrCode.PARA_ERROR)
+        return aggregate(kl_columns, minute_group(kl_columns.time, MINUTE_PERIOD[src_lv] * 60, MINUTE_PERIOD[dst_lv] * 60, session_open))
+    if src_lv in MINUTE_PERIOD and dst_lv == LvType.K_DAY:
+        # 分钟线时间为结束时间，00:00 的K线属于前一天
+        res = aggregate(kl_columns, (kl_columns.time - 1) // DAY_SECONDS)
+        res.time = (res.time - 1) // DAY_SECONDS * DAY_SECONDS
+        return res
+    if src_lv in MINUTE_PERIOD and dst_lv in [LvType.K_WEEK, LvType.K_MON]:
+        return resample(resample(kl_columns, src_lv, LvType.K_DAY), LvType.K_DAY, dst_lv)
+    if src_lv == LvType.K_DAY and dst_lv == LvType.K_WEEK:
+        # 1970-01-01 是周四，偏移3天后按周一切分
+        return aggregate(kl_columns, (kl_columns.time // DAY_SECONDS + 3) // 7)
+    if src_lv in [LvType.K_DAY, LvType.K_WEEK] and dst_lv == LvType.K_MON:
+        return aggregate(kl_columns, kl_columns.time.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64))
+    raise ChanException(f"can not resample {src_lv} to {dst_lv}", ErrCode.PARA_ERROR)
+
+
+def minute_group(time: np.ndarray, src_period: int, dst_period: int, session_open: Sequence[str] = A_SHARE_SESSION_OPEN) -> np.ndarray:
+    """
+    K线（开始时间 = time - src_period）归入开始时间之前最近的一个开盘时间所在的时段，开盘之前的归入前一天最后一个时段（跨午夜的夜盘）
+    时段内按 (开始时间 - 开盘时间) // dst_period 切分，缺失K线（包括开盘第一根）不影响切分
+    """
+    if len(time) == 0:
+        return np.zeros(0, dtype=np.int64)
+    open_seconds = session_open_seconds(session_open)
+    begin = np.asarray(time, dtype=np.int64) - src_period
+    day, second = np.divmod(begin, DAY_SECONDS)
+    session_idx = np.searchsorted(open_seconds, second, side="right") - 1
+    before_first = session_idx < 0
+    day[before_first] -= 1
+    session_idx[before_first] = len(open_seconds) - 1
+    session_begin = day * DAY_SECONDS + open_seconds[session_idx]
+    bucket = (begin - session_begin) // dst_period
+    # 组合成单调递增的分组编号
+    return np.cumsum(np.concatenate([[True], (np.diff(bucket) != 0) | (np.diff(session_begin) != 0)])) - 1
+
+
+def aggregate(kl_columns: KlColumns, group: np.ndarray) -> KlColumns:
+    """group 为单调不减的分组编号"""
+    n = len(kl_columns)
+    if n == 0:
+        return kl_columns
+    starts = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]]))
+    ends = np.append(starts[1:], n) - 1
+    cols = kl_columns.columns
+    columns = {
+        DataField.FIELD_OPEN: np.asarray(cols[DataField.FIELD_OPEN])[starts],
+        DataField.FIELD_HIGH: np.maximum.reduceat(cols[DataField.FIELD_HIGH], starts),
+        DataField.FIELD_LOW: np.minimum.reduceat(cols[DataField.FIELD_LOW], starts),
+        DataField.FIELD_CLOSE: np.asarray(cols[DataField.FIELD_CLOSE])[ends],
+    }
+    for field in TRADE_FIELDS:
+        if field in cols:
+            columns[field] = np.add.reduceat(cols[field], starts)
+    autofix = np.logical_or.reduceat(kl_columns.autofix, starts)
+    return KlColumns(np.asarray(kl_columns.time)[ends], columns, autofix)
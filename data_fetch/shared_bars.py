@@ -0,0 +1,108 @@
+"""
+多进程共享K线：父进程把所有代码的列式K线逐个写入共享内存，子进程只拿到 SharedBarsHandle（名字+索引），
+attach 后得到零拷贝的 numpy 视图，内存中只有一份数据
+"""
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.const import LvType
+from data_fetch.kl_columns import KL_FIELDS, KlColumns
+
+BAR_KEY = Tuple[str, str]  # (code, LvType.name)
+
+
+@dataclass
+class SharedBarsHandle:
+    """可 pickle，传给子进程用于 attach"""
+    shm_names: List[str]
+    index: Dict[BAR_KEY, Tuple[int, int, int, List[str]]] = field(default_factory=dict)  # key -> (段号, 字节偏移, 行数, 字段)
+
+
+def _block_layout(rows: int, fields: List[str]):
+    """一个 (code, lv) 的数据块：time(int64) | 各字段(float64) | autofix(bool)，返回各列相对块起始的字节偏移和按8字节对齐的块大小"""
+    offsets = {"time": 0}
+    pos = rows * 8
+    for name in fields:
+        offsets[name] = pos
+        pos += rows * 8
+    offsets["autofix"] = pos
+    return offsets, (pos + rows + 7) // 8 * 8
+
+
+class SharedBars:
+    """
+    父进程 create 之后逐个 add，每个代码的K线直接写进共享内存，不需要先把全部K线攒在进程内存里；
+    共享内存按段分配，当前段放不下时再开一段（未写入的部分不占物理内存）
+    """
+    SEGMENT_SIZE = 64 << 20
+
+    def __init__(self, shms: List[shared_memory.SharedMemory], handle: SharedBarsHandle, owner: bool, segment_size: int = SEGMENT_SIZE):
+        self.shms = shms
+        self.handle = handle
+        self.owner = owner
+        self.segment_size = segment_size
+        self.used = 0  # 最后一段已经写入的字节数，只在父进程中使用
+
+    @classmethod
+    def create(cls, segment_size: int = SEGMENT_SIZE) -> 'SharedBars':
+        """父进程调用，之后用 add 写入"""
+        return cls([], SharedBarsHandle([]), owner=True, segment_size=segment_size)
+
+    def add(self, code, lv: LvType, kl_columns: KlColumns):
+        """把一个代码一个级别的K线拷贝进共享内存，之后 kl_columns 可以直接释放"""
+        assert self.owner
+        fields = [name for name in KL_FIELDS if name in kl_columns.columns]
+        rows = len(kl_columns)
+        _, size = _block_layout(rows, fields)
+        if not self.shms or self.used + size > self.shms[-1].size:
+            shm = shared_memory.SharedMemory(create=True, size=max(size, self.segment_size, 1))
+            self.shms.append(shm)
+            self.handle.shm_names.append(shm.name)
+            self.used = 0
+        seg, begin = len(self.shms) - 1, self.used
+        self.used += size
+        self.handle.index[(code, lv.name)] = (seg, begin, rows, fields)
+        time, columns, autofix = self._views(seg, begin, rows, fields)
+        time[:] = kl_columns.time
+        autofix[:] = kl_columns.autofix
+        for name in fields:
+            columns[name][:] = kl_columns.columns[name]
+
+    def _views(self, seg: int, begin: int, rows: int, fields: List[str]):
+        offsets, _ = _block_layout(rows, fields)
+        buf = self.shms[seg].buf
+        time = np.ndarray((rows,), dtype=np.int64, buffer=buf, offset=begin + offsets["time"])
+        columns = {name: np.ndarray((rows,), dtype=np.float64, buffer=buf, offset=begin + offsets[name]) for name in fields}
+        autofix = np.ndarray((rows,), dtype=bool, buffer=buf, offset=begin + offsets["autofix"])
+        return time, columns, autofix
+
+    @classmethod
+    def attach(cls, handle: SharedBarsHandle) -> 'SharedBars':
+        """子进程调用"""
+        return cls([shared_memory.SharedMemory(name=name) for name in handle.shm_names], handle, owner=False)
+
+    def get(self, code, lv: LvType) -> Optional[KlColumns]:
+        """返回共享内存上的视图，不拷贝"""
+        key = (code, lv.name)
+        if key not in self.handle.index:
+            return None
+        seg, begin, rows, fields = self.handle.index[key]
+        time, columns, autofix = self._views(seg, begin, rows, fields)
+        return KlColumns(time, columns, autofix)
+
+    def close(self):
+        # 调用方需先释放 get 返回的 numpy 视图，否则 SharedMemory.close 会因 buffer 仍被引用而报错
+        for shm in self.shms:
+            shm.close()
+            if self.owner:
+                shm.unlink()
+        self.shms = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,19 +1,28 @@
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from common.const import DataField
-from data_process.common.cache import MakeCache
+from data_process.common.cache import clean_memoize, memoize
 from data_process.common.cenum import BiDir, BiType, FxType, MacdAlgo
 from data_process.common.chan_exception import ChanException, ErrCode
 from data_process.kline.kline import Kline
 from data_process.kline.kline_unit import Kline_Unit
 
+if TYPE_CHECKING:
+    from data_process.kline.klu_metric_index import KluMetricIndex
+
 class Bi:
+    __slots__ = (
+        "__dir", "__idx", "__type", "__begin_klc", "__end_klc", "__is_sure", "__sure_end", "__klc_lst", "__metric_index", "__seg_idx",
+        "parent_seg", "bsp", "next", "pre", "_memoize_cache",
+    )
+
     def __init__(self, begin_klc: Kline, end_klc: Kline, idx: int, is_sure: bool):
         # self.__begin_klc = begin_klc
         # self.__end_klc = end_klc
         self.__dir = None
         self.__idx = idx
         self.__type = BiType.STRICT
+        self._memoize_cache = None
 
         self.set(begin_klc, end_klc)
 
@@ -21,6 +30,7 @@ class Bi:
         self.__sure_end = None
 
         self.__klc_lst: List[Kline] = []
+        self.__metric_index: Optional[KluMetricIndex] = None  # 所在级别的指标区间查询，随 klc_lst 一起设置
         self.__seg_idx: Optional[int] = None
 
         # 解决循环引用问题
@@ -33,8 +43,9 @@ class Bi:
         self.next: Optional[Bi] = None
         self.pre: Optional[Bi] = None
 
-    def clean_cache(self):
-        self._memoize_cache = {}
+    def clean_cache(self, dep: Optional[str] = None):
+        """dep: "begin"/"end"，只清掉依赖笔起点/尾部的缓存，None 全部清掉"""
+        clean_memoize(self, dep)
 
     @property
     def begin_klc(self):
@@ -101,59 +112,59 @@ class Bi:
         self.check()
         self.clean_cache()
 
-    @MakeCache
+    @memoize("begin")
     def get_begin_val(self):
         return self.begin_klc.low if self.is_up() else self.begin_klc.high
 
-    @MakeCache
+    @memoize("end")
     def get_end_val(self):
         return self.end_klc.high if self.is_up() else self.end_klc.low
 
-    @MakeCache
+    @memoize("begin")
     def get_begin_klu(self) -> Kline_Unit:
         if self.is_up():
             return self.begin_klc.get_peak_klu(is_high=False)
         else:
             return self.begin_klc.get_peak_klu(is_high=True)
 
-    @MakeCache
+    @memoize("end")
     def get_end_klu(self) -> Kline_Unit:
         if self.is_up():
             return self.end_klc.get_peak_klu(is_high=True)
         else:
             return self.end_klc.get_peak_klu(is_high=False)
 
-    @MakeCache
+    @memoize("begin", "end")
     def amp(self):
         return abs(self.get_end_val() - self.get_begin_val())
 
-    @MakeCache
+    @memoize("begin", "end")
     def get_klu_cnt(self):
         return self.get_end_klu().idx - self.get_begin_klu().idx + 1
 
-    @MakeCache
+    @memoize("begin", "end")
     def get_klc_cnt(self):
         assert self.end_klc.idx == self.get_end_klu().klc.idx
         assert self.begin_klc.idx == self.get_begin_klu().klc.idx
         return self.end_klc.idx - self.begin_klc.idx + 1
 
-    @MakeCache
+    @memoize("begin", "end")
     def _high(self):
         return self.end_klc.high if self.is_up() else self.begin_klc.high
 
-    @MakeCache
+    @memoize("begin", "end")
     def _low(self):
         return self.begin_klc.low if self.is_up() else self.end_klc.low
 
-    @MakeCache
+    @memoize("begin", "end")
     def _mid(self):
         return (self._high() + self._low()) / 2  # 笔的中位价
 
-    @MakeCache
+    @memoize("begin")
     def is_down(self):
         return self.dir == BiDir.DOWN
 
-    @MakeCache
+    @memoize("begin")
     def is_up(self):
         return self.dir == BiDir.UP
 
@@ -161,14 +172,12 @@ class Bi:
         self.__sure_end = self.end_klc
         self.update_new_end(new_klc)
         self.__is_sure = False
-        self.clean_cache()
 
     def restore_from_virtual_end(self):
         self.__is_sure = True
         assert self.sure_end is not None
         self.update_new_end(new_klc=self.sure_end)
         self.__sure_end = None
-        self.clean_cache()
 
     def is_virtual_end(self):
         return self.sure_end is not None
@@ -176,7 +185,7 @@ class Bi:
     def update_new_end(self, new_klc: Kline):
         self.__end_klc = new_klc
         self.check()
-        self.clean_cache()
+        self.clean_cache("end")  # 起点相关的缓存不受影响
 
     def cal_macd_metric(self, macd_algo, is_reverse):
         if macd_algo == MacdAlgo.AREA:
@@ -208,32 +217,36 @@ class Bi:
                 f"unsupport macd_algo={macd_algo}, should be one of area/full_area/peak/diff/slope/amp",
                 ErrCode.PARA_ERROR)
 
-    @MakeCache
+    def klu_range(self) -> Tuple[int, int]:
+        """klc_lst 覆盖的 klu 区间 [begin, end)"""
+        if not self.klc_lst:
+            return 0, 0
+        return self.klc_lst[0].lst[0].idx, self.klc_lst[-1].lst[-1].idx + 1
+
+    @memoize("begin", "end")
     def cal_rsi(self):
-        rsi_lst: List[float] = []
-        for klc in self.klc_lst:
-            rsi_lst.extend(klu.rsi for klu in klc.lst)
-        return 10000.0 / (min(rsi_lst) + 1e-7) if self.is_down() else max(rsi_lst)
+        begin, end = self.klu_range()
+        if begin == end:
+            raise ValueError("no klu in bi to calculate rsi")
+        if self.is_down():
+            return 10000.0 / (self.__metric_index.rsi_range_min(begin, end) + 1e-7)
+        return self.__metric_index.rsi_range_max(begin, end)
 
-    @MakeCache
+    @memoize("begin", "end")
     def cal_macd_area(self):
-        _s = 1e-7
-        for klc in self.klc_lst:
-            for klu in klc.lst:
-                _s += abs(klu.macd.macd)
-        return _s
+        begin, end = self.klu_range()
+        if begin == end:
+            return 1e-7
+        return 1e-7 + self.__metric_index.macd_abs_sum(begin, end)
 
-    @MakeCache
+    @memoize("begin", "end")
     def cal_macd_peak(self):
-        peak = 1e-7
-        for klc in self.klc_lst:
-            for klu in klc.lst:
-                if abs(klu.macd.macd) > peak:
-                    if self.is_down() and klu.macd.macd < 0:
-                        peak = abs(klu.macd.macd)
-                    elif self.is_up() and klu.macd.macd > 0:
-                        peak = abs(klu.macd.macd)
-        return peak
+        begin, end = self.klu_range()
+        if begin == end:
+            return 1e-7
+        if self.is_down():
+            return max(1e-7, -self.__metric_index.macd_min(begin, end))
+        return max(1e-7, self.__metric_index.macd_max(begin, end))
 
     def cal_macd_half(self, is_reverse):
         if is_reverse:
@@ -241,58 +254,35 @@ class Bi:
         else:
             return self.cal_macd_half_obverse()
 
-    @MakeCache
+    @memoize("begin", "end")
     def cal_macd_half_obverse(self):
-        _s = 1e-7
+        """从起点 klu 往后，与起点 macd 同号的连续一段的面积"""
+        begin, end = self.klu_range()
+        if begin == end:
+            return 1e-7
         begin_klu = self.get_begin_klu()
-        peak_macd = begin_klu.macd.macd
-        for klc in self.klc_lst:
-            for klu in klc.lst:
-                if klu.idx < begin_klu.idx:
-                    continue
-                if klu.macd.macd * peak_macd > 0:
-                    _s += abs(klu.macd.macd)
-                else:
-                    break
-            else:  # 没有被break，继续找写一个KLC
-                continue
-            break
-        return _s
-
-    @MakeCache
+        return 1e-7 + self.__metric_index.macd_same_sign_sum(begin_klu.idx, begin, end, begin_klu.macd.macd, forward=True)
+
+    @memoize("begin", "end")
     def cal_macd_half_reverse(self):
-        _s = 1e-7
-        begin_klu = self.get_end_klu()
-        peak_macd = begin_klu.macd.macd
-        for klc in self.klc_lst[::-1]:
-            for klu in klc[::-1]:
-                if klu.idx > begin_klu.idx:
-                    continue
-                if klu.macd.macd * peak_macd > 0:
-                    _s += abs(klu.macd.macd)
-                else:
-                    break
-            else:  # 没有被break，继续找写一个KLC
-                continue
-            break
-        return _s
-
-    @MakeCache
+        """从终点 klu 往前，与终点 macd 同号的连续一段的面积"""
+        begin, end = self.klu_range()
+        if begin == end:
+            return 1e-7
+        end_klu = self.get_end_klu()
+        return 1e-7 + self.__metric_index.macd_same_sign_sum(end_klu.idx, begin, end, end_klu.macd.macd, forward=False)
+
+    @memoize("begin", "end")
     def cal_macd_diff(self):
         """
         macd红绿柱最大值最小值之差
         """
-        _max, _min = float("-inf"), float("inf")
-        for klc in self.klc_lst:
-            for klu in klc.lst:
-                macd = klu.macd.macd
-                if macd > _max:
-                    _max = macd
-                if macd < _min:
-                    _min = macd
-        return _max - _min
-
-    @MakeCache
+        begin, end = self.klu_range()
+        if begin == end:
+            return float("-inf")
+        return self.__metric_index.macd_max(begin, end) - self.__metric_index.macd_min(begin, end)
+
+    @memoize("begin", "end")
     def cal_macd_slope(self):
         begin_klu = self.get_begin_klu()
         end_klu = self.get_end_klu()
@@ -301,7 +291,7 @@ class Bi:
         else:
             return (begin_klu.high - end_klu.low) / begin_klu.high / (end_klu.idx - begin_klu.idx + 1)
 
-    @MakeCache
+    @memoize("begin", "end")
     def cal_macd_amp(self):
         begin_klu = self.get_begin_klu()
         end_klu = self.get_end_klu()
@@ -311,14 +301,14 @@ class Bi:
             return (end_klu.high - begin_klu.low) / begin_klu.low
 
     def cal_macd_trade_metric(self, metric: str, cal_avg=False) -> float:
-        _s = 0
-        for klc in self.klc_lst:
-            for klu in klc.lst:
-                metric_res = klu.trade_info.metric[metric]
-                if metric_res is None:
-                    return 0.0
-                _s += metric_res
+        begin, end = self.klu_range()
+        if begin == end:
+            return 0
+        _s = self.__metric_index.trade_metric_sum(metric, begin, end)
+        if _s is None:  # 有缺失值
+            return 0.0
         return _s / self.get_klu_cnt() if cal_avg else _s
 
-    def set_klc_lst(self, lst):
+    def set_klc_lst(self, lst, metric_index: 'KluMetricIndex'):
         self.__klc_lst = lst
+        self.__metric_index = metric_index
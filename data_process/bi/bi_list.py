@@ -1,17 +1,23 @@
-from typing import List, Optional, Union, overload
+from typing import TYPE_CHECKING, List, Optional, Union, overload
 
 from data_process.common.cenum import FxType, KlineDir
+from data_process.common.line_index import LineIndex
 from data_process.kline.kline import Kline
 
 from .bi import Bi
 from .bi_config import BiConfig
 
+if TYPE_CHECKING:
+    from data_process.kline.kline_store import KlineStore
+
 
 class BiList:
-    def __init__(self, bi_conf=BiConfig()):
+    def __init__(self, bi_conf=BiConfig(), store: Optional['KlineStore'] = None):
         self.bi_list: List[Bi] = []
         self.last_end = None  # 最后一笔的尾部
         self.config = bi_conf
+        self.store = store  # 所在级别的K线列式存储，有的话跨度、尾部极值用区间查询代替逐根遍历
+        self._line_index = LineIndex()
 
         self.free_klc_lst = []  # 仅仅用作第一笔未画出来之前的缓存，为了获得更精准的结果而已，不加这块逻辑其实对后续计算没太大影响
 
@@ -33,6 +39,11 @@ class BiList:
     def __len__(self):
         return len(self.bi_list)
 
+    def line_index(self) -> LineIndex:
+        """笔的区间查询（线段计算用），查询前先同步末尾的变化"""
+        self._line_index.sync(self.bi_list)
+        return self._line_index
+
     def try_create_first_bi(self, klc: Kline) -> bool:
         """
         尝试使用给定的K线`klc`创建第一笔
@@ -167,6 +178,9 @@ class BiList:
             return bi_span >= 4
 
         # 否则，跨度必须大于或等于3，并且K线单位数量也必须大于或等于3
+        if self.store is not None:
+            # 跨度至少为3时两者之间至少隔了一根klc，K线单位数量就是中间这些klc的klu数
+            return bi_span >= 3 and self.store.klc_begin[klc.idx] - self.store.klc_begin[last_end.idx+1] >= 3
         uint_kl_cnt = 0
         tmp_klc = last_end.next
         while tmp_klc:
@@ -206,7 +220,7 @@ class BiList:
         satisify_span = self.satisfy_bi_span(klc, last_end) if last_end.check_fx_valid(klc, self.config.bi_fx_check) else False
         # 如果满足条件并且配置要求笔的结束必须是峰值，检查是否满足峰值条件
         if satisify_span and self.config.bi_end_is_peak:
-            return end_is_peak(last_end, klc)
+            return end_is_peak(last_end, klc, self.store)
         else:
             return satisify_span
 
@@ -233,10 +247,17 @@ class BiList:
         return self.bi_list[-1].get_end_klu().idx if len(self) > 0 else None
 
 
-def end_is_peak(last_end: Kline, cur_end: Kline) -> bool:
+def end_is_peak(last_end: Kline, cur_end: Kline, store: Optional['KlineStore'] = None) -> bool:
     """
     检查当前结束的K线是否是一个峰值（对于上升趋势）或谷值（对于下降趋势）
+    传入 store 时用 klc 高低点的区间极值判断，不逐根遍历
     """
+    if store is not None:
+        if last_end.fx == FxType.BOTTOM:
+            return store.klc_max_high(last_end.idx+1, cur_end.idx) <= cur_end.high
+        elif last_end.fx == FxType.TOP:
+            return store.klc_min_low(last_end.idx+1, cur_end.idx) >= cur_end.low
+        return True
     if last_end.fx == FxType.BOTTOM:
         cmp_thred = cur_end.high  # 或者严格点选择get_klu_max_high()
         klc = last_end.get_next()
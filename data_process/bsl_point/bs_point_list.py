@@ -1,4 +1,4 @@
-from typing import Generic, List, Optional, TypeVar, Union, overload
+from typing import Dict, Generic, List, Optional, TypeVar, Union, overload
 
 from data_process.bi.bi import Bi
 from data_process.bi.bi_list import BiList
@@ -21,6 +21,10 @@ class BsPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
         self.bsp1_lst: List[BsPoint[LINE_TYPE]] = []
         self.config = bs_point_config
         self.last_sure_pos = -1
+        # 上一次 cal 保留下来的买卖点个数及当时的 last_sure_pos，last_sure_pos 没有后退时这些不用再检查
+        self.sure_cnt = 0
+        self.sure_cnt_pos = -1
+        self.klu_bsp_dict: Dict[int, BsPoint[LINE_TYPE]] = {}  # 这一次 cal 加入的买卖点 klu.idx -> 买卖点，同一根 klu 只有一个
 
     def __iter__(self):
         yield from self.lst
@@ -38,8 +42,7 @@ class BsPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
         return self.lst[index]
 
     def cal(self, bi_list: LINE_LIST_TYPE, seg_list: SegListComm[LINE_TYPE]):
-        self.lst = [bsp for bsp in self.lst if bsp.klu.idx <= self.last_sure_pos]
-        self.bsp1_lst = [bsp for bsp in self.bsp1_lst if bsp.klu.idx <= self.last_sure_pos]
+        self.remove_unsure_bsp()
 
         self.cal_seg_bs1point(seg_list, bi_list)
         self.cal_seg_bs2point(seg_list, bi_list)
@@ -47,9 +50,40 @@ class BsPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
 
         self.update_last_pos(seg_list)
 
+    def remove_unsure_bsp(self):
+        """去掉 last_sure_pos 之后的买卖点；last_sure_pos 没有后退时，之前保留的不用再检查"""
+        if self.last_sure_pos >= self.sure_cnt_pos:
+            keep = self.lst[:self.sure_cnt]
+            keep.extend(bsp for bsp in self.lst[self.sure_cnt:] if bsp.klu.idx <= self.last_sure_pos)
+            self.lst = keep
+        else:
+            self.lst = [bsp for bsp in self.lst if bsp.klu.idx <= self.last_sure_pos]
+        # 这一次只会在尾部位于 last_sure_pos 之后的笔上加买卖点，保留下来的不会再被找到；每次换新字典，不修改上一次的
+        self.klu_bsp_dict = {}
+        self.sure_cnt, self.sure_cnt_pos = len(self.lst), self.last_sure_pos
+        # 一类买卖点按线段顺序加入，klu 递增
+        bsp1_cnt = len(self.bsp1_lst)
+        while bsp1_cnt > 0 and self.bsp1_lst[bsp1_cnt-1].klu.idx > self.last_sure_pos:
+            bsp1_cnt -= 1
+        self.bsp1_lst = self.bsp1_lst[:bsp1_cnt]
+
+    def first_seg_need_cal(self, seg_list: SegListComm) -> int:
+        """第一个需要计算的线段，之后的都需要计算"""
+        idx = len(seg_list)
+        while idx > 0 and self.seg_need_cal(seg_list[idx-1]):
+            idx -= 1
+        return idx
+
+    def bsp1_bi_idx_dict(self) -> Dict[int, BsPoint[LINE_TYPE]]:
+        """需要计算的线段只会查 last_sure_pos 之后的一类买卖点"""
+        begin = len(self.bsp1_lst)
+        while begin > 0 and self.bsp1_lst[begin-1].klu.idx > self.last_sure_pos:
+            begin -= 1
+        return {bsp.bi.idx: bsp for bsp in self.bsp1_lst[begin:]}
+
     def update_last_pos(self, seg_list: SegListComm):
         self.last_sure_pos = -1
-        for seg in seg_list[::-1]:
+        for seg in reversed(seg_list):
             if seg.is_sure:
                 self.last_sure_pos = seg.end_bi.get_begin_klu().idx
                 return
@@ -66,11 +100,11 @@ class BsPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
         feature_dict=None,
     ):
         is_buy = bi.is_down()
-        for exist_bsp in self.lst:
-            if exist_bsp.klu.idx == bi.get_end_klu().idx:
-                assert exist_bsp.is_buy == is_buy
-                exist_bsp.add_another_bsp_prop(bs_type, relate_bsp1)
-                return
+        exist_bsp = self.klu_bsp_dict.get(bi.get_end_klu().idx)
+        if exist_bsp is not None:
+            assert exist_bsp.is_buy == is_buy
+            exist_bsp.add_another_bsp_prop(bs_type, relate_bsp1)
+            return
         if bs_type not in self.config.get_bs_config(is_buy).target_types:
             is_target_bsp = False
 
@@ -86,13 +120,12 @@ class BsPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
             return
         if is_target_bsp:
             self.lst.append(bsp)
+            self.klu_bsp_dict[bsp.klu.idx] = bsp
         if bs_type in [BspType.T1, BspType.T1P]:
             self.bsp1_lst.append(bsp)
 
     def cal_seg_bs1point(self, seg_list: SegListComm[LINE_TYPE], bi_list: LINE_LIST_TYPE):
-        for seg in seg_list:
-            if not self.seg_need_cal(seg):
-                continue
+        for seg in seg_list[self.first_seg_need_cal(seg_list):]:
             self.cal_single_bs1point(seg, bi_list)
 
     def cal_single_bs1point(self, seg: Seg[LINE_TYPE], bi_list: LINE_LIST_TYPE):
@@ -140,8 +173,8 @@ class BsPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
         self.add_bs(bs_type=BspType.T1P, bi=last_bi, relate_bsp1=None, is_target_bsp=is_target_bsp, feature_dict=feature_dict)
 
     def cal_seg_bs2point(self, seg_list: SegListComm[LINE_TYPE], bi_list: LINE_LIST_TYPE):
-        bsp1_bi_idx_dict = {bsp.bi.idx: bsp for bsp in self.bsp1_lst}
-        for seg in seg_list:
+        bsp1_bi_idx_dict = self.bsp1_bi_idx_dict()
+        for seg in seg_list[self.first_seg_need_cal(seg_list):]:
             self.treat_bsp2(seg, bsp1_bi_idx_dict, seg_list, bi_list)
 
     def treat_bsp2(self, seg: Seg, bsp1_bi_idx_dict, seg_list: SegListComm[LINE_TYPE], bi_list: LINE_LIST_TYPE):
@@ -210,10 +243,8 @@ class BsPointList(Generic[LINE_TYPE, LINE_LIST_TYPE]):
             bias += 2
 
     def cal_seg_bs3point(self, seg_list: SegListComm[LINE_TYPE], bi_list: LINE_LIST_TYPE):
-        bsp1_bi_idx_dict = {bsp.bi.idx: bsp for bsp in self.bsp1_lst}
-        for seg in seg_list:
-            if not self.seg_need_cal(seg):
-                continue
+        bsp1_bi_idx_dict = self.bsp1_bi_idx_dict()
+        for seg in seg_list[self.first_seg_need_cal(seg_list):]:
             if len(seg_list) > 1:
                 bsp1_bi = seg.end_bi
                 bsp1_bi_idx = bsp1_bi.idx
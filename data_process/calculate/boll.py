@@ -1,27 +1,60 @@
 from math import sqrt
+from typing import Dict, List
+
+import numpy as np
+
+from .vector import rolling
+from .window import MeanVarWindow
 
 def _truncate(x):
     return x if x != 0 else 1e-7
 
 
 class BollMetric:
+    # 只保存均值和标准差，上下轨按需计算
+    __slots__ = ("MID", "_theta")
+
     def __init__(self, ma, theta):
-        self.theta = _truncate(theta)
-        self.UP = ma + 2*theta
-        self.DOWN = _truncate(ma - 2*theta)
         self.MID = ma
+        self._theta = theta
+
+    @property
+    def theta(self):
+        return _truncate(self._theta)
+
+    @property
+    def UP(self):
+        return self.MID + 2*self._theta
+
+    @property
+    def DOWN(self):
+        return _truncate(self.MID - 2*self._theta)
 
 
 class BollModel:
     def __init__(self, N=20):
         assert N > 1
         self.N = N
-        self.arr = []
+        self.window = MeanVarWindow(N)
 
     def add(self, value) -> BollMetric:
-        self.arr.append(value)
-        if len(self.arr) > self.N:
-            self.arr = self.arr[-self.N:]
-        ma = sum(self.arr)/len(self.arr)
-        theta = sqrt(sum((x - ma) ** 2 for x in self.arr) / len(self.arr))
-        return BollMetric(ma, theta)
+        self.window.add(value)
+        return BollMetric(self.window.mean, sqrt(self.window.var))
+
+    def add_batch(self, values) -> List[BollMetric]:
+        """等价于对 values 逐个 add，结果在浮点误差范围内一致"""
+        return self.to_items(self.cal_batch(values))
+
+    @staticmethod
+    def to_items(arrays: Dict[str, np.ndarray]) -> List[BollMetric]:
+        return [BollMetric(*item) for item in zip(arrays["MID"].tolist(), arrays["_theta"].tolist())]
+
+    def cal_batch(self, values) -> Dict[str, np.ndarray]:
+        """同 add_batch，返回数组：MID/_theta（未截断的标准差）/UP/DOWN"""
+        prev = list(self.window.values)
+        ma = rolling(values, self.N, "mean", prev=prev)
+        theta = rolling(values, self.N, "std", prev=prev)
+        if len(values):
+            self.window.reset(prev + list(values[-self.N:]))
+        down = ma - 2 * theta
+        return {"MID": ma, "_theta": theta, "UP": ma + 2 * theta, "DOWN": np.where(down != 0, down, 1e-7)}
@@ -1,11 +1,10 @@
-import copy
 from dataclasses import dataclass
 from typing import List, Literal, Optional, TypedDict
 
 from data_process.common.cenum import BiDir
 
 
-@dataclass
+@dataclass(slots=True)
 class Kl:
     idx: int
     close: float
@@ -29,6 +28,8 @@ class TDemarkIndex(TypedDict):
 
 
 class DemarkIndex:
+    __slots__ = ("data",)
+
     def __init__(self):
         self.data: List[TDemarkIndex] = []
 
@@ -46,40 +47,58 @@ class DemarkIndex:
 
 
 class DemarkCountdown:
-    def __init__(self, _dir: BiDir, kl_list: List[Kl], TDST_peak: float):
+    """
+    kl_list 不再拷贝：countdown 覆盖的K线总是 engine.kl_lst 中从 begin 开始的连续一段，只记录区间
+    """
+    def __init__(self, engine: 'DemarkEngine', _dir: BiDir, begin: int, TDST_peak: float):
+        self.engine = engine
         self.dir = _dir
-        self.kl_list: List[Kl] = copy.deepcopy(kl_list)
+        self.begin = begin
+        self.end = begin  # engine.kl_lst[begin:end] 为已加入的K线
         self.idx = 0
         self.TDST_peak = TDST_peak
         self.finish = False
 
-    def update(self, kl: Kl) -> bool:
+    @property
+    def kl_list(self) -> List[Kl]:
+        return self.engine.kl_lst[self.begin:self.end]
+
+    def update(self, pos: int) -> bool:
+        """pos 为当前K线在 engine.kl_lst 中的位置"""
         if self.finish:
             return False
-        self.kl_list.append(kl)
-        if len(self.kl_list) <= DemarkEngine.COUNTDOWN_BIAS:
+        self.end = pos + 1
+        engine = self.engine
+        if self.end - self.begin <= engine.countdown_bias:
             return False
-        if self.idx == DemarkEngine.MAX_COUNTDOWN:
+        if self.idx == engine.max_countdown:
             self.finish = True
             return False
+        kl = engine.kl_lst[pos]
         if (self.dir == BiDir.DOWN and kl.high > self.TDST_peak) or (self.dir == BiDir.UP and kl.low < self.TDST_peak):
             self.finish = True
             return False
-        if self.dir == BiDir.DOWN and self.kl_list[-1].close < self.kl_list[-1 - DemarkEngine.COUNTDOWN_BIAS].v(DemarkEngine.COUNTDOWN_CMP2CLOSE, self.dir):
+        cmp_kl = engine.kl_lst[pos - engine.countdown_bias]
+        if self.dir == BiDir.DOWN and kl.close < cmp_kl.v(engine.countdown_cmp2close, self.dir):
             self.idx += 1
             return True
-        if self.dir == BiDir.UP and self.kl_list[-1].close > self.kl_list[-1 - DemarkEngine.COUNTDOWN_BIAS].v(DemarkEngine.COUNTDOWN_CMP2CLOSE, self.dir):
+        if self.dir == BiDir.UP and kl.close > cmp_kl.v(engine.countdown_cmp2close, self.dir):
             self.idx += 1
             return True
         return False
 
 
 class DemarkSetup:
-    def __init__(self, _dir: BiDir, kl_list: List[Kl], pre_kl: Kl):
+    """
+    setup 覆盖的K线是 engine.kl_lst[begin:end]：创建时为当前K线之前的 setup_bias 根，之后每根加入直到 setup 结束
+    """
+    def __init__(self, engine: 'DemarkEngine', _dir: BiDir, begin: int):
+        self.engine = engine
         self.dir = _dir
-        self.kl_list: List[Kl] = copy.deepcopy(kl_list)
-        self.pre_kl = pre_kl  # 跳空时用
-        assert len(self.kl_list) == DemarkEngine.SETUP_BIAS
+        self.begin = begin
+        self.end = begin + engine.setup_bias
+        assert self.end <= len(engine.kl_lst)
+        self.pre_kl = engine.kl_lst[begin - 1]  # 跳空时用
         self.countdown: Optional[DemarkCountdown] = None
         self.setup_finished = False
         self.idx = 0
@@ -87,22 +106,31 @@ class DemarkSetup:
 
         self.last_demark_index = DemarkIndex()  # 缓存用
 
-    def update(self, kl: Kl) -> DemarkIndex:
+    @property
+    def kl_list(self) -> List[Kl]:
+        return self.engine.kl_lst[self.begin:self.end]
+
+    def update(self, pos: int) -> DemarkIndex:
+        """pos 为当前K线在 engine.kl_lst 中的位置"""
+        engine = self.engine
         self.last_demark_index = DemarkIndex()
         if not self.setup_finished:
-            self.kl_list.append(kl)
+            self.end = pos + 1
+            close = engine.kl_lst[pos].close
+            cmp_value = engine.kl_lst[pos - engine.setup_bias].v(engine.setup_cmp2close, self.dir)
             if self.dir == BiDir.DOWN:
-                if self.kl_list[-1].close < self.kl_list[-1 - DemarkEngine.SETUP_BIAS].v(DemarkEngine.SETUP_CMP2CLOSE, self.dir):
+                if close < cmp_value:
                     self.add_setup()
                 else:
                     self.setup_finished = True
-            elif self.kl_list[-1].close > self.kl_list[-1 - DemarkEngine.SETUP_BIAS].v(DemarkEngine.SETUP_CMP2CLOSE, self.dir):
+            elif close > cmp_value:
                 self.add_setup()
             else:
                 self.setup_finished = True
-        if self.idx == DemarkEngine.DEMARK_LEN and not self.setup_finished and self.countdown is None:
-            self.countdown = DemarkCountdown(self.dir, self.kl_list[:-1], self.cal_tdst_peak())
-        if self.countdown is not None and self.countdown.update(kl):
+        if self.idx == engine.demark_len and not self.setup_finished and self.countdown is None:
+            # countdown 从 setup 的第一根开始，当前K线由下面的 update 加入
+            self.countdown = DemarkCountdown(engine, self.dir, self.begin, self.cal_tdst_peak())
+        if self.countdown is not None and self.countdown.update(pos):
             self.last_demark_index.add(self.dir, 'countdown', self.countdown.idx, self)
         return self.last_demark_index
 
@@ -111,71 +139,69 @@ class DemarkSetup:
         self.last_demark_index.add(self.dir, 'setup', self.idx, self)
 
     def cal_tdst_peak(self) -> float:
-        assert len(self.kl_list) == DemarkEngine.SETUP_BIAS + DemarkEngine.DEMARK_LEN
-        arr = self.kl_list[DemarkEngine.SETUP_BIAS:DemarkEngine.SETUP_BIAS + DemarkEngine.DEMARK_LEN]
-        assert len(arr) == DemarkEngine.DEMARK_LEN
+        engine = self.engine
+        assert self.end - self.begin == engine.setup_bias + engine.demark_len
+        arr = engine.kl_lst[self.begin + engine.setup_bias:self.end]
         if self.dir == BiDir.DOWN:
             res = max(kl.high for kl in arr)
-            if DemarkEngine.TIAOKONG_ST and arr[0].high < self.pre_kl.close:
+            if engine.tiaokong_st and arr[0].high < self.pre_kl.close:
                 res = max(res, self.pre_kl.close)
         else:
             res = min(kl.low for kl in arr)
-            if DemarkEngine.TIAOKONG_ST and arr[0].low > self.pre_kl.close:
+            if engine.tiaokong_st and arr[0].low > self.pre_kl.close:
                 res = min(res, self.pre_kl.close)
         self.TDST_peak = res
         return res
 
 
 class DemarkEngine:
-    DEMARK_LEN = 9
-    SETUP_BIAS = 4
-    COUNTDOWN_BIAS = 2
-    MAX_COUNTDOWN = 13
-    TIAOKONG_ST = True  # 第一根跳空时是否跟前一根的close比
-    SETUP_CMP2CLOSE = True
-    COUNTDOWN_CMP2CLOSE = True
-
+    """
+    参数都是实例属性，不同配置的 Chan 可以在同一进程/多线程中同时计算
+    所有 setup/countdown 共享 kl_lst，按位置区间引用，不拷贝K线
+    """
     def __init__(
         self,
         demark_len=9,
         setup_bias=4,
         countdown_bias=2,
         max_countdown=13,
-        tiaokong_st=True,
+        tiaokong_st=True,  # 第一根跳空时是否跟前一根的close比
         setup_cmp2close=True,
         countdown_cmp2close=True
     ):
-        DemarkEngine.DEMARK_LEN = demark_len
-        DemarkEngine.SETUP_BIAS = setup_bias
-        DemarkEngine.COUNTDOWN_BIAS = countdown_bias
-        DemarkEngine.MAX_COUNTDOWN = max_countdown
-        DemarkEngine.TIAOKONG_ST = tiaokong_st
-        DemarkEngine.SETUP_CMP2CLOSE = setup_cmp2close
-        DemarkEngine.COUNTDOWN_CMP2CLOSE = countdown_cmp2close
+        self.demark_len = demark_len
+        self.setup_bias = setup_bias
+        self.countdown_bias = countdown_bias
+        self.max_countdown = max_countdown
+        self.tiaokong_st = tiaokong_st
+        self.setup_cmp2close = setup_cmp2close
+        self.countdown_cmp2close = countdown_cmp2close
 
         self.kl_lst: List[Kl] = []
         self.series: List[DemarkSetup] = []
 
     def update(self, idx: int, close: float, high: float, low: float) -> DemarkIndex:
         self.kl_lst.append(Kl(idx, close, high, low))
-        if len(self.kl_lst) <= DemarkEngine.SETUP_BIAS+1:
+        pos = len(self.kl_lst) - 1
+        if pos <= self.setup_bias:
             return DemarkIndex()
 
-        if self.kl_lst[-1].close < self.kl_lst[-1-self.SETUP_BIAS].close:
+        # 新 setup 从当前K线之前的 setup_bias 根开始
+        if close < self.kl_lst[pos - self.setup_bias].close:
             if not any(series.dir == BiDir.DOWN and not series.setup_finished for series in self.series):
-                self.series.append(DemarkSetup(BiDir.DOWN, self.kl_lst[-DemarkEngine.SETUP_BIAS - 1:-1], self.kl_lst[-DemarkEngine.SETUP_BIAS - 2]))
+                self.series.append(DemarkSetup(self, BiDir.DOWN, pos - self.setup_bias))
             for series in self.series:
                 if series.dir == BiDir.UP and series.countdown is None and not series.setup_finished:
                     series.setup_finished = True
-        elif self.kl_lst[-1].close > self.kl_lst[-1-self.SETUP_BIAS].close:
+        elif close > self.kl_lst[pos - self.setup_bias].close:
             if not any(series.dir == BiDir.UP and not series.setup_finished for series in self.series):
-                self.series.append(DemarkSetup(BiDir.UP, self.kl_lst[-DemarkEngine.SETUP_BIAS - 1:-1], self.kl_lst[-DemarkEngine.SETUP_BIAS - 2]))
+                self.series.append(DemarkSetup(self, BiDir.UP, pos - self.setup_bias))
             for series in self.series:
                 if series.dir == BiDir.DOWN and series.countdown is None and not series.setup_finished:
                     series.setup_finished = True
 
         self.clear()
-        self.clean_series_from_setup_finish()
+        self.clean_series_from_setup_finish(pos)
 
         result = self.cal_result()
         self.clear()
@@ -195,12 +221,12 @@ class DemarkEngine:
         for s in invalid_series:
             self.series.remove(s)
 
-    def clean_series_from_setup_finish(self):
+    def clean_series_from_setup_finish(self, pos: int):
         finished_setup: Optional[int] = None
         for series in self.series:
-            demark_idx = series.update(self.kl_lst[-1])
+            demark_idx = series.update(pos)
             for setup_idx in demark_idx.get_setup():
-                if setup_idx['idx'] == DemarkEngine.DEMARK_LEN:
+                if setup_idx['idx'] == self.demark_len:
                     assert finished_setup is None
                     finished_setup = id(series)
         if finished_setup is not None:
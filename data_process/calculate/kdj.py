@@ -1,4 +1,14 @@
+from typing import Dict, List
+
+import numpy as np
+
+from .vector import ema, rolling
+from .window import MonotonicWindow
+
+
 class KdjItem:
+    __slots__ = ("k", "d", "j")
+
     def __init__(self, k, d, j):
         self.k = k
         self.d = d
@@ -8,20 +18,14 @@ class KdjItem:
 class Kdj:
     def __init__(self, period: int = 9):
         super(Kdj, self).__init__()
-        self.arr = []
         self.period = period
+        self.high_window = MonotonicWindow(period, is_max=True)
+        self.low_window = MonotonicWindow(period, is_max=False)
         self.pre_kdj = KdjItem(50, 50, 50)
 
     def add(self, high, low, close) -> KdjItem:
-        self.arr.append({
-            'high': high,
-            'low': low,
-        })
-        if len(self.arr) > self.period:
-            self.arr.pop(0)
-
-        hn = max([x['high'] for x in self.arr])
-        ln = min([x['low'] for x in self.arr])
+        hn = self.high_window.add(high)
+        ln = self.low_window.add(low)
         cn = close
         rsv = 100 * (cn - ln) / (hn - ln) if hn != ln else 0.0
 
@@ -32,3 +36,28 @@ class Kdj:
         self.pre_kdj = cur_kdj
 
         return cur_kdj
+
+    def add_batch(self, high, low, close) -> List[KdjItem]:
+        """等价于对 (high, low, close) 逐个 add，结果在浮点误差范围内一致"""
+        return self.to_items(self.cal_batch(high, low, close))
+
+    @staticmethod
+    def to_items(arrays: Dict[str, np.ndarray]) -> List[KdjItem]:
+        return [KdjItem(*item) for item in zip(arrays["k"].tolist(), arrays["d"].tolist(), arrays["j"].tolist())]
+
+    def cal_batch(self, high, low, close) -> Dict[str, np.ndarray]:
+        """同 add_batch，返回数组：k/d/j"""
+        if len(close) == 0:
+            return {name: np.zeros(0) for name in KdjItem.__slots__}
+        prev_high = list(self.high_window.values)
+        prev_low = list(self.low_window.values)
+        hn = rolling(high, self.period, "max", prev=prev_high)
+        ln = rolling(low, self.period, "min", prev=prev_low)
+        rsv = np.divide(100 * (np.asarray(close, dtype=float) - ln), hn - ln, out=np.zeros(len(close)), where=hn != ln)
+        k = ema(rsv, 1 / 3, self.pre_kdj.k)
+        d = ema(k, 1 / 3, self.pre_kdj.d)
+        j = 3 * k - 2 * d
+        self.high_window.reset(prev_high + list(high[-self.period:]))
+        self.low_window.reset(prev_low + list(low[-self.period:]))
+        self.pre_kdj = KdjItem(float(k[-1]), float(d[-1]), float(j[-1]))
+        return {"k": k, "d": d, "j": j}
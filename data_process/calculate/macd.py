@@ -1,29 +1,64 @@
-from typing import List
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .vector import ema
 
 
 class MacdItem:
+    __slots__ = ("fast_ema", "slow_ema", "DIF", "DEA")
+
     def __init__(self, fast_ema, slow_ema, DIF, DEA):
         self.fast_ema = fast_ema
         self.slow_ema = slow_ema
         self.DIF = DIF
         self.DEA = DEA
-        self.macd = 2 * (DIF - DEA)
+
+    @property
+    def macd(self):
+        return 2 * (self.DIF - self.DEA)
 
 
 class Macd:
     def __init__(self, fastperiod=12, slowperiod=26, signalperiod=9):
-        self.macd_info: List[MacdItem] = []
+        self.pre: Optional[MacdItem] = None  # 只需要上一根的结果
         self.fastperiod = fastperiod
         self.slowperiod = slowperiod
         self.signalperiod = signalperiod
 
     def add(self, value) -> MacdItem:
-        if not self.macd_info:
-            self.macd_info.append(MacdItem(fast_ema=value, slow_ema=value, DIF=0, DEA=0))
+        pre = self.pre
+        if pre is None:
+            self.pre = MacdItem(fast_ema=value, slow_ema=value, DIF=0, DEA=0)
         else:
-            _fast_ema = (2 * value + (self.fastperiod - 1) * self.macd_info[-1].fast_ema) / (self.fastperiod + 1)
-            _slow_ema = (2 * value + (self.slowperiod - 1) * self.macd_info[-1].slow_ema) / (self.slowperiod + 1)
+            _fast_ema = (2 * value + (self.fastperiod - 1) * pre.fast_ema) / (self.fastperiod + 1)
+            _slow_ema = (2 * value + (self.slowperiod - 1) * pre.slow_ema) / (self.slowperiod + 1)
             _dif = _fast_ema - _slow_ema
-            _dea = (2 * _dif + (self.signalperiod - 1) * self.macd_info[-1].DEA) / (self.signalperiod + 1)
-            self.macd_info.append(MacdItem(fast_ema=_fast_ema, slow_ema=_slow_ema, DIF=_dif, DEA=_dea))
-        return self.macd_info[-1]
+            _dea = (2 * _dif + (self.signalperiod - 1) * pre.DEA) / (self.signalperiod + 1)
+            self.pre = MacdItem(fast_ema=_fast_ema, slow_ema=_slow_ema, DIF=_dif, DEA=_dea)
+        return self.pre
+
+    def add_batch(self, values) -> List[MacdItem]:
+        """等价于对 values 逐个 add，结果在浮点误差范围内一致"""
+        return self.to_items(self.cal_batch(values))
+
+    @staticmethod
+    def to_items(arrays: Dict[str, np.ndarray]) -> List[MacdItem]:
+        return [MacdItem(*item) for item in zip(*(arrays[name].tolist() for name in MacdItem.__slots__))]
+
+    def cal_batch(self, values) -> Dict[str, np.ndarray]:
+        """同 add_batch，返回数组：fast_ema/slow_ema/DIF/DEA/macd"""
+        if len(values) == 0:
+            return {name: np.zeros(0) for name in MacdItem.__slots__ + ("macd",)}
+        pre = self.pre
+        if pre is not None:
+            fast_init, slow_init, dea_init = pre.fast_ema, pre.slow_ema, pre.DEA
+        else:
+            fast_init = slow_init = values[0]
+            dea_init = 0
+        fast_ema = ema(values, 2 / (self.fastperiod + 1), fast_init)
+        slow_ema = ema(values, 2 / (self.slowperiod + 1), slow_init)
+        dif = fast_ema - slow_ema
+        dea = ema(dif, 2 / (self.signalperiod + 1), dea_init)
+        self.pre = MacdItem(float(fast_ema[-1]), float(slow_ema[-1]), float(dif[-1]), float(dea[-1]))
+        return {"fast_ema": fast_ema, "slow_ema": slow_ema, "DIF": dif, "DEA": dea, "macd": 2 * (dif - dea)}
@@ -1,29 +1,78 @@
+from typing import List, Optional
+
+import numpy as np
+
+from .vector import ema
+
+
 class Rsi:
     def __init__(self, period: int = 14):
         super(Rsi, self).__init__()
-        self.close_arr = []
         self.period = period
-        self.diff = []
-        self.up = []
-        self.down = []
+        # 只保存递推需要的状态
+        self.pre_close: Optional[float] = None
+        self.diff_cnt = 0
+        self.up_sum = 0.0  # 前 period-1 个 diff 里上涨/下跌的累计和
+        self.down_sum = 0.0
+        self.up = 0.0
+        self.down = 0.0
 
     def add(self, close):
-        self.close_arr.append(close)
-        if len(self.close_arr) == 1:
+        if self.pre_close is None:
+            self.pre_close = close
             return 50.0
-        self.diff.append(self.close_arr[-1] - self.close_arr[-2])
-        if len(self.diff) < self.period:
-            self.up.append(sum(x for x in self.diff if x > 0)/self.period)
-            self.down.append(sum(-x for x in self.diff if x < 0)/self.period)
+        diff = close - self.pre_close
+        self.pre_close = close
+        self.diff_cnt += 1
+        if diff > 0:
+            upval = diff
+            downval = 0.0
         else:
-            if self.diff[-1] > 0:
-                upval = self.diff[-1]
-                downval = 0.0
-            else:
-                upval = 0.0
-                downval = -self.diff[-1]
-            self.up.append((self.up[-1] * (self.period - 1) + upval) / self.period)
-            self.down.append((self.down[-1] * (self.period - 1) + downval) / self.period)
-        rs = self.up[-1] / self.down[-1] if self.down[-1] != 0 else 0
+            upval = 0.0
+            downval = -diff
+        if self.diff_cnt < self.period:
+            self.up_sum += upval
+            self.down_sum += downval
+            self.up = self.up_sum / self.period
+            self.down = self.down_sum / self.period
+        else:
+            self.up = (self.up * (self.period - 1) + upval) / self.period
+            self.down = (self.down * (self.period - 1) + downval) / self.period
+        rs = self.up / self.down if self.down != 0 else 0
         rsi = 100.0 - 100.0 / (1.0 + rs)
         return rsi
+
+    def add_batch(self, values) -> List[float]:
+        """等价于对 values 逐个 add，结果在浮点误差范围内一致"""
+        return self.cal_batch(values).tolist()
+
+    def cal_batch(self, values) -> np.ndarray:
+        """同 add_batch，返回数组"""
+        values = list(values)
+        res = []
+        if self.pre_close is None and values:
+            res.append(self.add(values.pop(0)))
+        if not values:
+            return np.array(res, dtype=float)
+        diff = np.diff(np.asarray([self.pre_close] + values, dtype=float))
+        up_val = np.where(diff > 0, diff, 0.0)
+        down_val = np.where(diff > 0, 0.0, -diff)
+        # 前 period-1 个 diff 用累计和，之后是 Wilder 平滑
+        warm = max(min(self.period - 1 - self.diff_cnt, len(diff)), 0)
+        up = np.empty(len(diff))
+        down = np.empty(len(diff))
+        up[:warm] = (self.up_sum + np.cumsum(up_val[:warm])) / self.period
+        down[:warm] = (self.down_sum + np.cumsum(down_val[:warm])) / self.period
+        if warm < len(diff):
+            up_init = up[warm-1] if warm > 0 else self.up
+            down_init = down[warm-1] if warm > 0 else self.down
+            up[warm:] = ema(up_val[warm:], 1 / self.period, up_init)
+            down[warm:] = ema(down_val[warm:], 1 / self.period, down_init)
+        rs = np.divide(up, down, out=np.zeros(len(diff)), where=down != 0)
+        self.pre_close = values[-1]
+        self.diff_cnt += len(diff)
+        self.up_sum += float(up_val[:warm].sum())
+        self.down_sum += float(down_val[:warm].sum())
+        self.up = float(up[-1])
+        self.down = float(down[-1])
+        return np.concatenate((res, 100.0 - 100.0 / (1.0 + rs)))
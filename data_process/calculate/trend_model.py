@@ -1,22 +1,41 @@
+from typing import List
+
+import numpy as np
+
 from data_process.common.cenum import TrendType
 from data_process.common.chan_exception import ChanException, ErrCode
 
+from .vector import rolling
+from .window import MeanVarWindow, MonotonicWindow
+
+TREND_ROLLING = {TrendType.MEAN: "mean", TrendType.MAX: "max", TrendType.MIN: "min"}
+
 
 class TrendModel:
     def __init__(self, trend_type: TrendType, T: int):
         self.T = T
-        self.arr = []
         self.type = trend_type
-
-    def add(self, value) -> float:
-        self.arr.append(value)
-        if len(self.arr) > self.T:
-            self.arr = self.arr[-self.T:]
-        if self.type == TrendType.MEAN:
-            return sum(self.arr)/len(self.arr)
-        elif self.type == TrendType.MAX:
-            return max(self.arr)
-        elif self.type == TrendType.MIN:
-            return min(self.arr)
+        if trend_type == TrendType.MEAN:
+            self.window = MeanVarWindow(T)
+        elif trend_type in (TrendType.MAX, TrendType.MIN):
+            self.window = MonotonicWindow(T, is_max=trend_type == TrendType.MAX)
         else:
             raise ChanException(f"Unknown trendModel Type = {self.type}", ErrCode.PARA_ERROR)
+
+    def add(self, value) -> float:
+        if isinstance(self.window, MeanVarWindow):
+            self.window.add(value)
+            return self.window.mean
+        return self.window.add(value)
+
+    def add_batch(self, values) -> List[float]:
+        """等价于对 values 逐个 add"""
+        return self.cal_batch(values).tolist()
+
+    def cal_batch(self, values) -> np.ndarray:
+        """同 add_batch，返回数组"""
+        prev = list(self.window.values)
+        res = rolling(values, self.T, TREND_ROLLING[self.type], prev=prev)
+        if len(values):
+            self.window.reset(prev + list(values[-self.T:]))
+        return res
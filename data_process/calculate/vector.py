@@ -0,0 +1,28 @@
+"""
+指标批量计算用的向量化工具，各指标模型的 add_batch 基于这里实现
+递推（EMA）和滑动窗口都交给 pandas 的编译实现，不逐根循环
+"""
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def ema(values, alpha: float, init: float) -> np.ndarray:
+    """y[i] = (1-alpha)*y[i-1] + alpha*values[i]，y[-1] = init"""
+    arr = np.empty(len(values) + 1)
+    arr[0] = init
+    arr[1:] = values
+    return pd.Series(arr).ewm(alpha=alpha, adjust=False).mean().to_numpy()[1:]
+
+
+def rolling(values, window: int, how: str, prev: Sequence[float] = ()) -> np.ndarray:
+    """
+    滑动窗口的 mean/std/max/min，std 为总体标准差
+    前 window-1 个位置用已有的部分窗口，与逐根模型只保留最近 window 个值的行为一致
+    prev: 模型之前保留的值，拼在 values 前面一起算
+    """
+    arr = np.concatenate((np.asarray(prev, dtype=float), np.asarray(values, dtype=float)))
+    r = pd.Series(arr).rolling(window, min_periods=1)
+    res = r.std(ddof=0) if how == "std" else getattr(r, how)()
+    return res.to_numpy()[len(prev):]
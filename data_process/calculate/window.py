@@ -0,0 +1,86 @@
+"""
+逐根指标用的定长滑动窗口，每次 add 均摊 O(1)，内存只与窗口长度有关
+"""
+from collections import deque
+from typing import Deque, Iterable, Tuple
+
+
+class MonotonicWindow:
+    """滑动窗口最大（is_max=True）或最小值，单调队列实现"""
+    __slots__ = ("window", "is_max", "values", "_peak", "_cnt")
+
+    def __init__(self, window: int, is_max: bool):
+        self.window = window
+        self.is_max = is_max
+        self.values: Deque[float] = deque(maxlen=window)  # 窗口内原始值
+        self._peak: Deque[Tuple[int, float]] = deque()  # (序号, 值)，值单调
+        self._cnt = 0
+
+    def add(self, value: float) -> float:
+        self.values.append(value)
+        peak = self._peak
+        if self.is_max:
+            while peak and peak[-1][1] <= value:
+                peak.pop()
+        else:
+            while peak and peak[-1][1] >= value:
+                peak.pop()
+        peak.append((self._cnt, value))
+        self._cnt += 1
+        if peak[0][0] <= self._cnt - 1 - self.window:
+            peak.popleft()
+        return peak[0][1]
+
+    def reset(self, values: Iterable[float]):
+        """用最近的一段值重建窗口，批量计算之后同步状态用"""
+        self.values.clear()
+        self._peak.clear()
+        for value in list(values)[-self.window:]:
+            self.add(value)
+
+
+class MeanVarWindow:
+    """
+    滑动窗口均值和总体方差，Welford 算法
+    窗口满之后每次同时加入新值、移出最旧的值；每 RESYNC_CNT 次用两遍法重算一次，避免浮点误差一直累积
+    """
+    __slots__ = ("window", "values", "mean", "m2", "_cnt")
+    RESYNC_CNT = 4096
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values: Deque[float] = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0  # 离差平方和
+        self._cnt = 0
+
+    def add(self, value: float):
+        self._cnt += 1
+        if self._cnt % self.RESYNC_CNT == 0:
+            self.values.append(value)
+            self.reset(self.values)
+        elif len(self.values) == self.window:
+            old = self.values[0]
+            self.values.append(value)
+            pre_mean = self.mean
+            self.mean += (value - old) / self.window
+            self.m2 += (value - old) * (value - self.mean + old - pre_mean)
+            if self.m2 < 0:  # 浮点误差
+                self.m2 = 0.0
+        else:
+            self.values.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (value - self.mean)
+
+    @property
+    def var(self) -> float:
+        return self.m2 / len(self.values)
+
+    def reset(self, values: Iterable[float]):
+        """用最近的一段值重建窗口（两遍法），批量计算之后同步状态、定期消除累计误差时用"""
+        values = list(values)[-self.window:]
+        self.values.clear()
+        self.values.extend(values)
+        self.mean = sum(self.values) / len(self.values) if self.values else 0.0
+        self.m2 = sum((x - self.mean) ** 2 for x in self.values)
@@ -1,20 +1,34 @@
 import datetime
 from collections import defaultdict
-from typing import Dict, Iterable, List, Optional, Union
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import pandas as pd
 
 from data_process.bsl_point.bs_point import BsPoint
 from .chan_config import ChanConfig
-from common.const import AuType, LvType
+from common.const import AuType, DataField, LvType
 from data_fetch.manager import DataSrc
 from data_process.common.chan_exception import ChanException, ErrCode
+from data_process.common.journal import Journal
+from data_process.common import snapshot
 from common.time import Time
-from data_process.common.func_util import check_kl_type_order, kl_type_lte_day
-from data_fetch.abs_stock_api import AbsStockApi
+from data_process.common.func_util import KL_TYPE_RANK, check_kl_type_order, kl_type_lte_day
+from data_fetch.abs_stock_api import AbsStockApi, read_kl_columns
+from data_fetch.bar_cache import BarCache
+from data_fetch.kl_columns import PRICE_FIELDS, KlColumns
+from data_fetch.resampler import resample
+from data_process.common.cenum import TRADE_INFO_LST
 import data_fetch.manager as fetchManager
 from data_process.kline.kline_list import Kline_List
 from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
 
 class Chan:
+    SNAPSHOT_VERSION = 1  # 实例属性变化时加一，旧快照不再加载，见 common/snapshot.py class_schema
+
     def __init__(
         self,
         code,
@@ -24,7 +38,11 @@ class Chan:
         lv_list=None,
         config=None,
         autype: AuType = AuType.QFQ,
+        kl_columns: Optional[Dict[LvType, KlColumns]] = None,
     ):
+        """
+        kl_columns: 直接传入各级别的列式K线，此时不再通过 data_src 获取数据，见 from_arrays/from_dataframe
+        """
         if lv_list is None:
             lv_list = [LvType.K_DAY, LvType.K_60M]
         check_kl_type_order(lv_list)  # lv_list顺序从高到低
@@ -34,6 +52,7 @@ class Chan:
         self.autype = autype
         self.data_src = data_src
         self.lv_list: List[LvType] = lv_list
+        self.kl_columns = kl_columns
 
         if config is None:
             config = ChanConfig()
@@ -47,12 +66,71 @@ class Chan:
         # 多级别k线单元遍历器
         self.g_kl_iter = defaultdict(list)
 
+        # checkpoint 之后的回滚日志，见 checkpoint
+        self.journal: Optional[Journal] = None
+
         self.do_init()
 
         if not config.triger_step:
             for _ in self.load():
                 ...
 
+    @classmethod
+    def from_arrays(
+        cls,
+        code,
+        arrays: Dict[LvType, Dict[str, Any]],
+        lv_list=None,
+        config=None,
+        autype: AuType = AuType.QFQ,
+    ) -> 'Chan':
+        """
+        用数组直接构造
+        arrays: {级别: {DataField字段: 数组}}，必须包含 time_key/open/high/low/close，volume/turnover/turnover_rate 可选
+        time_key 支持 datetime64、整数 epoch（墙上时间按UTC编码的秒数）、时间字符串或 Time 列表
+        lv_list 不传时按 arrays 里的级别从大到小排列
+        """
+        kl_columns = {
+            lv: KlColumns.from_arrays(
+                arr[DataField.FIELD_TIME],
+                arr[DataField.FIELD_OPEN],
+                arr[DataField.FIELD_HIGH],
+                arr[DataField.FIELD_LOW],
+                arr[DataField.FIELD_CLOSE],
+                volume=arr.get(DataField.FIELD_VOLUME),
+                turnover=arr.get(DataField.FIELD_TURNOVER),
+                turnover_rate=arr.get(DataField.FIELD_TURNRATE),
+            )
+            for lv, arr in arrays.items()
+        }
+        return cls.from_kl_columns(code, kl_columns, lv_list, config, autype)
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        code,
+        data: Union[pd.DataFrame, Dict[LvType, pd.DataFrame]],
+        lv_list=None,
+        config=None,
+        autype: AuType = AuType.QFQ,
+    ) -> 'Chan':
+        """
+        用 DataFrame 直接构造，列名规则同 LocalFetcher（如 date/open/high/low/close/volume）
+        data 为单个 DataFrame 时视为 lv_list[0] 级别，lv_list 默认为 [K_DAY]
+        """
+        if isinstance(data, pd.DataFrame):
+            if lv_list is None:
+                lv_list = [LvType.K_DAY]
+            data = {lv_list[0]: data}
+        kl_columns = {lv: KlColumns.from_dataframe(df) for lv, df in data.items()}
+        return cls.from_kl_columns(code, kl_columns, lv_list, config, autype)
+
+    @classmethod
+    def from_kl_columns(cls, code, kl_columns: Dict[LvType, KlColumns], lv_list=None, config=None, autype: AuType = AuType.QFQ) -> 'Chan':
+        if lv_list is None:
+            lv_list = sorted(kl_columns.keys(), key=lambda lv: KL_TYPE_RANK[lv], reverse=True)
+        return cls(code=code, data_src=None, lv_list=lv_list, config=config, autype=autype, kl_columns=kl_columns)
+
     def do_init(self):
         self.kl_datas: Dict[LvType, Kline_List] = {}
         for idx in range(len(self.lv_list)):
@@ -62,12 +140,33 @@ class Chan:
         """
         从股票API实例加载股票数据
         """
+        kl_columns = stockapi_instance.get_kl_columns()
+        if kl_columns is not None:
+            yield from self.load_stock_columns(kl_columns, lv)
+            return
         for KLU_IDX, klu in enumerate(stockapi_instance.get_kl_data()):
             klu = Kline_Unit(*klu)
             klu.set_idx(KLU_IDX)
             klu.kl_type = lv
             yield klu
 
+    def load_stock_columns(self, kl_columns: KlColumns, lv, idx_begin: int = 0) -> Iterable[Kline_Unit]:
+        """
+        从列式数据加载，不构造逐根的 kl_dict
+        idx_begin: 第一根的 idx，接在已有K线后面 trigger_load 时为该级别已有的K线数
+        """
+        price_lst = [kl_columns.columns[field].tolist() for field in PRICE_FIELDS]
+        # NaN 还原成 None，缺失的字段全为 None
+        trade_lst = [
+            [None if v != v else v for v in kl_columns.columns[field].tolist()] if field in kl_columns.columns else repeat(None)
+            for field in TRADE_INFO_LST
+        ]
+        for KLU_IDX, (time, _open, high, low, close, autofix, *trade_values) in enumerate(zip(kl_columns.iter_time(), *price_lst, kl_columns.autofix.tolist(), *trade_lst)):
+            klu = Kline_Unit.from_fields(time, _open, high, low, close, TradeInfo.from_values(*trade_values), autofix)
+            klu.set_idx(idx_begin + KLU_IDX)
+            klu.kl_type = lv
+            yield klu
+
     def get_load_stock_iter(self, stockapi_cls, lv) -> Iterable[Kline_Unit]:
         """
         获取加载股票的迭代器
@@ -75,6 +174,15 @@ class Chan:
         stockapi_instance = stockapi_cls(code=self.code, k_type=lv, begin_date=self.begin_time, end_date=self.end_time, autype=self.autype)
         return self.load_stock_data(stockapi_instance, lv)
 
+    def get_columns_iter(self, lv) -> Iterable[Kline_Unit]:
+        """
+        获取直接传入的列式K线的迭代器
+        """
+        assert self.kl_columns is not None
+        if lv not in self.kl_columns:
+            raise ChanException(f"没有传入{lv}级别数据", ErrCode.SRC_DATA_NOT_FOUND)
+        return self.load_stock_columns(self.kl_columns[lv], lv)
+
     def add_lv_iter(self, lv_idx, iter):
         """
         添加级别迭代器
@@ -86,18 +194,17 @@ class Chan:
 
     def get_next_lv_klu(self, lv_idx):
         """
-        获取下一个级别的K线单元
+        获取下一个级别的K线单元，当前迭代器用完时换下一个，全部用完时抛出 StopIteration
         """
         if isinstance(lv_idx, int):
             lv_idx = self.lv_list[lv_idx]
-        try:
-            return self.g_kl_iter[lv_idx][0].__next__()
-        except StopIteration:
-            self.g_kl_iter[lv_idx] = self.g_kl_iter[lv_idx][1:]
-            if len(self.g_kl_iter[lv_idx]) != 0:
-                return self.get_next_lv_klu(lv_idx)
-            else:
-                raise
+        lv_iters = self.g_kl_iter[lv_idx]
+        while lv_iters:
+            kline_unit = next(lv_iters[0], None)
+            if kline_unit is not None:
+                return kline_unit
+            del lv_iters[0]
+        raise StopIteration
 
     def step_load(self):
         """
@@ -106,10 +213,10 @@ class Chan:
         assert self.conf.triger_step
         self.do_init()  # 清空数据，防止再次重跑没有数据
         yielded = False  # 是否曾经返回过结果
-        for idx, snapshot in enumerate(self.load(self.conf.triger_step)):
+        for idx, chan in enumerate(self.load(self.conf.triger_step)):
             if idx < self.conf.skip_step:
                 continue
-            yield snapshot
+            yield chan
             yielded = True
         if not yielded:
             yield self
@@ -120,10 +227,8 @@ class Chan:
         """
         # 在已有pickle基础上继续计算新的
         # {type: [klu, ...]}
-        if not hasattr(self, 'klu_cache'):
-            self.klu_cache: List[Optional[Kline_Unit]] = [None for _ in self.lv_list]
-        if not hasattr(self, 'klu_last_t'):
-            self.klu_last_t = [Time(1980, 1, 1, 0, 0) for _ in self.lv_list]
+        self.init_klu_cache()
+        self.close_last_bar()
         for lv_idx, lv in enumerate(self.lv_list):
             if lv not in inp:
                 if lv_idx == 0:
@@ -131,19 +236,160 @@ class Chan:
                 continue
             assert isinstance(inp[lv], list)
             self.add_lv_iter(lv, iter(inp[lv]))
-        for _ in self.load_iterator(lv_idx=0, parent_klu=None, step=False):
+        for _ in self.load_iterator(step=False):
             ...
 
+    def init_klu_cache(self):
+        if not hasattr(self, 'klu_cache'):
+            self.klu_cache: List[Optional[Kline_Unit]] = [None for _ in self.lv_list]
+        if not hasattr(self, 'klu_last_t'):
+            self.klu_last_t = [Time(1980, 1, 1, 0, 0) for _ in self.lv_list]
+
+    def checkpoint(self):
+        """
+        记下当前状态，之后 trigger_load 加入的K线（比如还没走完的大级别K线）可以用 rollback 撤销，
+        代替每次 deepcopy 整个 Chan 再加入临时K线
+        只记录之后会被修改的对象和列表末尾，开销与加入的K线、变化的笔线段中枢数量有关，与已有K线数量无关
+        rollback 撤销，commit 保留；同一时间只能有一个 checkpoint；已经从迭代器里读出的K线不会放回去
+        """
+        if self.journal is not None:
+            raise ChanException("上一个 checkpoint 还没有 rollback 或 commit", ErrCode.COMMON_ERROR)
+        if any(kl_list.open_journal is not None for kl_list in self.kl_datas.values()):
+            raise ChanException("有 update_last_bar 加入的未完成K线，先 close_last_bar", ErrCode.COMMON_ERROR)
+        self.init_klu_cache()
+        journal = self.journal = Journal()
+        for kl_list in self.kl_datas.values():
+            kl_list.checkpoint(journal)
+        # 子K线只会挂到新加入的父级别 klu 上，Chan 上其余的状态都很小，直接拷贝
+        klu_cache, klu_last_t, misalign_cnt = list(self.klu_cache), list(self.klu_last_t), self.kl_misalign_cnt
+        inconsistent_detail = {key: list(value) for key, value in self.kl_inconsistent_detail.items()}
+        kl_iter = {lv: list(iters) for lv, iters in self.g_kl_iter.items()}
+
+        def restore():
+            self.klu_cache, self.klu_last_t, self.kl_misalign_cnt = klu_cache, klu_last_t, misalign_cnt
+            self.kl_inconsistent_detail = defaultdict(list, inconsistent_detail)
+            self.g_kl_iter = defaultdict(list, kl_iter)
+        journal.on_rollback(restore)
+
+    def rollback(self):
+        """恢复到 checkpoint 时的状态"""
+        if self.journal is None:
+            raise ChanException("没有 checkpoint", ErrCode.COMMON_ERROR)
+        for kl_list in self.kl_datas.values():
+            kl_list.rollback()
+        self.journal.rollback()
+        self.journal = None
+
+    def commit(self):
+        """保留 checkpoint 之后加入的K线"""
+        if self.journal is None:
+            raise ChanException("没有 checkpoint", ErrCode.COMMON_ERROR)
+        for kl_list in self.kl_datas.values():
+            kl_list.commit()
+        self.journal = None
+
+    @contextmanager
+    def provisional(self):
+        """
+        临时加入K线，退出时撤销：
+            with chan.provisional():
+                chan.trigger_load({lv: [forming_klu]})
+                ...  # 基于包含未完成K线的结果计算
+        """
+        self.checkpoint()
+        try:
+            yield self
+        finally:
+            self.rollback()
+
+    def update_last_bar(self, lv: LvType, klu: Kline_Unit):
+        """
+        逐笔行情：加入或更新 lv 级别最后一根还没走完的K线
+        - klu 的时间与上一次 update_last_bar 的相同：替换它，只重算最后两根合并K线、分型、虚笔，以及之后变化的线段中枢买卖点
+        - 时间更晚：上一根就此确定，klu 作为新的一根加入
+        多级别时先更新父级别再更新次级别：次级别K线挂到父级别最后一根上，父级别K线被替换时已有的次级别K线转到新K线上
+        trigger_load 之前会先 close_last_bar；有未完成K线时不能 checkpoint
+        """
+        if self.journal is not None:
+            raise ChanException("checkpoint 期间不能 update_last_bar", ErrCode.COMMON_ERROR)
+        self.init_klu_cache()
+        lv_idx = self.lv_list.index(lv)
+        kl_list = self.kl_datas[lv]
+        parent_klu = None
+        if lv_idx > 0:
+            parent_lst = self[lv_idx-1]
+            if parent_lst.klu_cnt == 0 or klu.time > parent_lst.lst[-1].lst[-1].time:
+                raise ChanException(f"{klu.time}在父级别{self.lv_list[lv_idx-1]}没有对应的K线，需要先更新父级别", ErrCode.KL_DATA_NOT_ALIGN)
+            parent_klu = parent_lst.lst[-1].lst[-1]
+        if kl_list.open_journal is not None and klu.time == self.klu_last_t[lv_idx]:
+            old_klu = kl_list.replace_open_klu(klu)
+        elif klu.time > self.klu_last_t[lv_idx]:
+            old_klu = None
+            kl_list.add_open_klu(klu)
+            self.klu_last_t[lv_idx] = klu.time
+        else:
+            raise ChanException(f"kline time err, cur={klu.time}, last={self.klu_last_t[lv_idx]}", ErrCode.KL_NOT_MONOTONOUS)
+
+        if old_klu is not None and old_klu.sup_kl is not None:
+            old_klu.sup_kl.sub_kl_list.remove(old_klu)
+        if parent_klu is not None:
+            self.set_klu_parent_relation(parent_klu, klu, lv, lv_idx)
+        if old_klu is not None and lv_idx != len(self.lv_list)-1:
+            # rollback 截掉了父级别列式存储里这根K线的子K线区间，重新加上
+            for child in old_klu.get_children():
+                klu.add_children(child)
+                child.set_parent(klu)
+                kl_list.store.add_child(klu.idx, child.idx)
+
+    def close_last_bar(self):
+        """update_last_bar 加入的未完成K线就此确定，不再替换"""
+        for kl_list in self.kl_datas.values():
+            kl_list.close_open_klu()
+
+    def save_snapshot(self, path, compress: Optional[str] = None):
+        """
+        把当前状态存成快照文件，之后用 load_snapshot 恢复并继续 trigger_load/update_last_bar，格式见 snapshot 模块
+        compress: None/'zlib'/'lzma'
+        数据源的迭代器、直接传入的列式K线（kl_columns）不保存；checkpoint 期间或者有未完成的K线时不能保存
+        """
+        if self.journal is not None or any(kl_list.open_journal is not None for kl_list in self.kl_datas.values()):
+            raise ChanException("checkpoint 期间或者有 update_last_bar 未完成的K线时不能保存快照", ErrCode.SNAPSHOT_ERR)
+        data = snapshot.dumps(self, compress, skip={type(self): ("g_kl_iter", "kl_columns")})
+        with open(path, "wb") as f:
+            f.write(data)
+
+    @classmethod
+    def load_snapshot(cls, path) -> 'Chan':
+        with open(path, "rb") as f:
+            chan = snapshot.loads(f.read())
+        if not isinstance(chan, cls):
+            raise ChanException(f"快照里保存的是{type(chan)}", ErrCode.SNAPSHOT_ERR)
+        chan.g_kl_iter = defaultdict(list)
+        chan.kl_columns = None
+        return chan
+
     def init_lv_klu_iter(self, stockapi_cls) -> List[Iterable[Kline_Unit]]:
         """
         初始化级别K线单元迭代器
         """
+        if self.conf.resample_lv and len(self.lv_list) > 1:
+            return self.init_resample_lv_klu_iter(stockapi_cls)
+        if self.kl_columns is None and self.conf.parallel_fetch and stockapi_cls.thread_safe and len(self.lv_list) > 1:
+            with ThreadPoolExecutor(max_workers=len(self.lv_list)) as executor:
+                # 各级别同时拉取并缓冲成列式数据，后续仍按 lv_list 顺序组装迭代器
+                futures = {lv: executor.submit(self.fetch_lv_columns, stockapi_cls, lv) for lv in self.lv_list}
+                return self.collect_lv_klu_iter(lambda lv: self.load_stock_columns(futures[lv].result(), lv))
+        if self.kl_columns is not None:
+            return self.collect_lv_klu_iter(self.get_columns_iter)
+        return self.collect_lv_klu_iter(lambda lv: self.get_load_stock_iter(stockapi_cls, lv))
+
+    def collect_lv_klu_iter(self, get_lv_iter: Callable[[LvType], Iterable[Kline_Unit]]) -> List[Iterable[Kline_Unit]]:
         # 为了跳过一些获取数据失败的级别
         lv_klu_iter = []
         valid_lv_list = []
         for lv in self.lv_list:
             try:
-                lv_klu_iter.append(self.get_load_stock_iter(stockapi_cls, lv))
+                lv_klu_iter.append(get_lv_iter(lv))
                 valid_lv_list.append(lv)
             except ChanException as e:
                 if e.errcode == ErrCode.SRC_DATA_NOT_FOUND and self.conf.auto_skip_illegal_sub_lv:
@@ -155,6 +401,26 @@ class Chan:
         self.lv_list = valid_lv_list
         return lv_klu_iter
 
+    def fetch_lv_columns(self, stockapi_cls, lv) -> KlColumns:
+        """
+        获取单个级别的全部数据，parallel_fetch 时在线程池中执行
+        """
+        stockapi_instance = stockapi_cls(code=self.code, k_type=lv, begin_date=self.begin_time, end_date=self.end_time, autype=self.autype)
+        return read_kl_columns(stockapi_instance)
+
+    def init_resample_lv_klu_iter(self, stockapi_cls) -> List[Iterable[Kline_Unit]]:
+        """
+        只获取最小级别数据，其余级别由其本地合成
+        """
+        finest_lv = self.lv_list[-1]
+        if self.kl_columns is not None:
+            if finest_lv not in self.kl_columns:
+                raise ChanException(f"没有传入{finest_lv}级别数据", ErrCode.SRC_DATA_NOT_FOUND)
+            base_columns = self.kl_columns[finest_lv]
+        else:
+            base_columns = self.fetch_lv_columns(stockapi_cls, finest_lv)
+        return [self.load_stock_columns(resample(base_columns, finest_lv, lv, self.conf.resample_session_open), lv) for lv in self.lv_list]
+
     def load(self, step=False):
         """
         加载数据
@@ -164,17 +430,28 @@ class Chan:
                 self.add_lv_iter(lv_idx, klu_iter)
             self.klu_cache: List[Optional[Kline_Unit]] = [None for _ in self.lv_list]
             self.klu_last_t = [Time(1980, 1, 1, 0, 0) for _ in self.lv_list]
+            if not step and self.conf.kl_batch:
+                for lv in self.lv_list:
+                    self.kl_datas[lv].begin_batch()
 
-            yield from self.load_iterator(lv_idx=0, parent_klu=None, step=step)  # 计算入口
+            yield from self.load_iterator(step=step)  # 计算入口
             if not step:  # 非回放模式全部算完之后才算一次中枢和线段
                 for lv in self.lv_list:
                     self.kl_datas[lv].cal_seg_and_zs()
 
-        yield from fetchManager.fetch_data(self.data_src, process)
+        if self.kl_columns is not None:
+            yield from process(None)
+        else:
+            yield from fetchManager.fetch_data(self.data_src, process, cache=self.get_bar_cache())
 
         if len(self[0]) == 0:
             raise ChanException("最高级别没有获得任何数据", ErrCode.NO_DATA)
 
+    def get_bar_cache(self) -> Optional[BarCache]:
+        if self.conf.cache_dir is None:
+            return None
+        return BarCache(self.conf.cache_dir)
+
     def set_klu_parent_relation(self, parent_klu, kline_unit, cur_lv, lv_idx):
         """
         设置K线单元的父子关系
@@ -183,6 +460,8 @@ class Chan:
             self.check_kl_consitent(parent_klu, kline_unit)
         parent_klu.add_children(kline_unit)
         kline_unit.set_parent(parent_klu)
+        self.kl_datas[cur_lv].store.set_parent(kline_unit.idx, parent_klu.idx)
+        self.kl_datas[self.lv_list[lv_idx-1]].store.add_child(parent_klu.idx, kline_unit.idx)
 
     def add_new_kl(self, cur_lv: LvType, kline_unit):
         """
@@ -201,45 +480,61 @@ class Chan:
         """
         if kline_unit.idx >= 0:
             return
-        if len(self[lv_idx]) == 0:
-            kline_unit.set_idx(0)
-        else:
-            kline_unit.set_idx(self[lv_idx][-1][-1].idx + 1)
+        kline_unit.set_idx(self[lv_idx].klu_cnt)
+
+    def pop_lv_klu(self, lv_idx) -> Optional[Kline_Unit]:
+        """
+        取出 lv_idx 级别的下一根K线：优先取上一次超出父级别K线时间被放回的那根，没有K线时返回 None
+        """
+        kline_unit = self.klu_cache[lv_idx]
+        if kline_unit is not None:
+            self.klu_cache[lv_idx] = None
+            return kline_unit
+        try:
+            kline_unit = self.get_next_lv_klu(lv_idx)
+        except StopIteration:
+            return None
+        self.try_set_klu_idx(lv_idx, kline_unit)
+        if not kline_unit.time > self.klu_last_t[lv_idx]:
+            raise ChanException(f"kline time err, cur={kline_unit.time}, last={self.klu_last_t[lv_idx]}（未完成的K线用 update_last_bar 更新）", ErrCode.KL_NOT_MONOTONOUS)
+        self.klu_last_t[lv_idx] = kline_unit.time
+        return kline_unit
 
-    def load_iterator(self, lv_idx, parent_klu, step):
+    def load_iterator(self, step):
         """
-        加载迭代器,递归地加载每个级别的K线数据
+        加载迭代器，在一个循环里按时间把各级别的K线依次挂到上一级别的K线下面
         会检查K线数据的时间是否与上一级的数据对齐，这可以确保数据的一致性
+        parents[i] 是 i 级别K线正在挂靠的 i-1 级别K线；某级别的下一根超出父级别K线的时间（放回 klu_cache）或者没有K线时，
+        回到父级别检查对齐，再取父级别的下一根
         """
         # K线时间天级别以下描述的是结束时间，如60M线，每天第一根是10点30的
         # 天以上是当天日期
-        cur_lv = self.lv_list[lv_idx]
+        last_lv_idx = len(self.lv_list) - 1
+        parents: List[Optional[Kline_Unit]] = [None for _ in self.lv_list]
+        lv_idx = 0
         while True:
-            if self.klu_cache[lv_idx]:
-                kline_unit = self.klu_cache[lv_idx]
-                assert kline_unit is not None
-                self.klu_cache[lv_idx] = None
-            else:
-                try:
-                    kline_unit = self.get_next_lv_klu(lv_idx)
-                    self.try_set_klu_idx(lv_idx, kline_unit)
-                    if not kline_unit.time > self.klu_last_t[lv_idx]:
-                        raise ChanException(f"kline time err, cur={kline_unit.time}, last={self.klu_last_t[lv_idx]}", ErrCode.KL_NOT_MONOTONOUS)
-                    self.klu_last_t[lv_idx] = kline_unit.time
-                except StopIteration:
+            parent_klu = parents[lv_idx]
+            kline_unit = self.pop_lv_klu(lv_idx)
+            if kline_unit is None or (parent_klu is not None and kline_unit.time > parent_klu.time):
+                if kline_unit is not None:
+                    self.klu_cache[lv_idx] = kline_unit
+                if lv_idx == 0:
                     break
+                # 父级别K线的次级别K线已经全部加入
+                lv_idx -= 1
+                self.check_kl_align(parent_klu, lv_idx)
+                if lv_idx == 0 and step:
+                    yield self
+                continue
 
-            if parent_klu and kline_unit.time > parent_klu.time:
-                self.klu_cache[lv_idx] = kline_unit
-                break
+            cur_lv = self.lv_list[lv_idx]
             self.add_new_kl(cur_lv, kline_unit)
-            if parent_klu:
+            if parent_klu is not None:
                 self.set_klu_parent_relation(parent_klu, kline_unit, cur_lv, lv_idx)
-            if lv_idx != len(self.lv_list)-1:
-                for _ in self.load_iterator(lv_idx+1, kline_unit, step):
-                    ...
-                self.check_kl_align(kline_unit, lv_idx)
-            if lv_idx == 0 and step:
+            if lv_idx != last_lv_idx:
+                lv_idx += 1
+                parents[lv_idx] = kline_unit
+            elif lv_idx == 0 and step:
                 yield self
 
     def check_kl_consitent(self, parent_klu, sub_klu):
@@ -152,18 +152,16 @@ class ChanChartMeta:
         if seg_cnt is None or len(self.data.seg_list) <= seg_cnt:
             return 0
         else:
-            return self.data.seg_list[-seg_cnt].get_begin_klu().sub_kl_list[0].idx
+            return self.data.store.child_range(self.data.seg_list[-seg_cnt].get_begin_klu().idx)[0]
 
     def sub_last_kbi_start_idx(self, bi_cnt):
         if bi_cnt is None or len(self.data.bi_list) <= bi_cnt:
             return 0
         else:
-            return self.data.bi_list[-bi_cnt].begin_klc.lst[0].sub_kl_list[0].idx
+            return self.data.store.child_range(self.data.bi_list[-bi_cnt].begin_klc.lst[0].idx)[0]
 
     def sub_range_start_idx(self, x_range):
-        for klc in self.data[::-1]:
-            for klu in klc[::-1]:
-                x_range -= 1
-                if x_range == 0:
-                    return klu.sub_kl_list[0].idx
-        return 0
+        store = self.data.store
+        if x_range <= 0 or x_range > store.klu_cnt:
+            return 0
+        return store.child_range(store.klu_cnt - x_range)[0]
@@ -39,6 +39,8 @@ from data_process.zs.zs_config import ZsConfig
     - kdj_cycle: kdj计算周期，默认为9
 - triger_step: 是否回放逐步返回，默认为 False
     - 用于逐步回放绘图时使用，此时 CChan 会变成一个生成器，每读取一根新K线就会计算一次当前所有指标，返回当前帧指标状况；常用于返回给 CAnimateDriver 绘图
+- kl_batch: triger_step 为 False 时，是否在全部K线读取完之后再一次性做K线合并、分型和笔的计算（见 kline/kline_batch.py），结果与逐根计算相同，默认为 True
+    - 此时指标（macd/boll/rsi 等）在第一次被读取时才对整个级别计算（见 kline/kline_metric.py），整级别数组可以通过 Kline_List.metric_array 获取
 - skip_step: triger_step 为 True 时有效，指定跳过前面几根K线，默认为 0；
 - kl_data_check: 是否需要检验K线数据，检查项包括时间线是否有乱序，大小级别K线是否有缺失；默认为 True
 - max_kl_misalgin_cnt: 在次级别找不到K线最大条数，默认为 2（次级别数据有缺失），`kl_data_check` 为 True 时生效
@@ -46,6 +48,10 @@ from data_process.zs.zs_config import ZsConfig
 - print_warning: 打印K线不一致的明细，默认为 True
 - print_err_time: 计算发生错误时打印因为什么时间的K线数据导致的，默认为 False
 - auto_skip_illegal_sub_lv: 如果获取次级别数据失败，自动删除该级别（比如指数数据一般不提供分钟线），默认为 False
+- parallel_fetch: 多级别时是否用线程池同时获取各级别数据，数据源需声明 thread_safe（如 baostock 不支持，会自动退回逐个获取），默认为 False
+- resample_lv: 是否只获取 lv_list 中最小级别的数据，其余级别由其本地合成（见 data_fetch/resampler.py），默认为 False
+- resample_session_open: resample_lv 合成分钟级别时各交易时段的开盘时间，默认为A股 ["09:30", "13:00"]，24 小时交易的数据可设为 ["00:00"]
+- cache_dir: K线本地列式缓存目录，按 (数据源, code, 级别, 复权类型) 缓存为 .npy，再次加载时直接从缓存读取，默认为 None 不缓存
 """
 
 class ChanConfig:
@@ -74,6 +80,7 @@ class ChanConfig:
 
         self.triger_step = conf.get("triger_step", False)
         self.skip_step = conf.get("skip_step", 0)
+        self.kl_batch = conf.get("kl_batch", True)
 
         self.kl_data_check = conf.get("kl_data_check", True)
         self.max_kl_misalgin_cnt = conf.get("max_kl_misalgin_cnt", 2)
@@ -81,6 +88,10 @@ class ChanConfig:
         self.auto_skip_illegal_sub_lv = conf.get("auto_skip_illegal_sub_lv", False)
         self.print_warning = conf.get("print_warning", True)
         self.print_err_time = conf.get("print_err_time", False)
+        self.cache_dir = conf.get("cache_dir", None)
+        self.resample_lv = conf.get("resample_lv", False)
+        self.resample_session_open = conf.get("resample_session_open", ["09:30", "13:00"])
+        self.parallel_fetch = conf.get("parallel_fetch", False)
 
         self.mean_metrics: List[int] = conf.get("mean_metrics", [])
         self.trend_metrics: List[int] = conf.get("trend_metrics", [])
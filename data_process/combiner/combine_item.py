@@ -1,11 +1,25 @@
 from data_process.common.chan_exception import ChanException, ErrCode
 
+_item_types = None
 
-class CombineItem:
-    def __init__(self, item):
+
+def get_item_types():
+    """Bi/Kline_Unit/Seg 会循环引用，首次使用时再导入，之后复用"""
+    global _item_types
+    if _item_types is None:
         from data_process.bi.bi import Bi
         from data_process.kline.kline_unit import Kline_Unit
         from data_process.seg.seg import Seg
+        _item_types = (Bi, Kline_Unit, Seg)
+    return _item_types
+
+
+class CombineItem:
+    """通用的合并元素，Kline 合并 Kline_Unit 不经过这里，见 Kline.try_add"""
+    __slots__ = ("time_begin", "time_end", "high", "low")
+
+    def __init__(self, item):
+        Bi, Kline_Unit, Seg = get_item_types()
         if type(item) == Bi:
             self.time_begin = item.begin_klc.idx
             self.time_end = item.end_klc.idx
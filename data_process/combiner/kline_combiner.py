@@ -1,6 +1,6 @@
 from typing import Generic, Iterable, List, Optional, Self, TypeVar, Union, overload
 
-from data_process.common.cache import MakeCache
+from data_process.common.cache import clean_memoize, memoize
 from data_process.common.cenum import FxType, KlineDir
 from data_process.common.chan_exception import ChanException, ErrCode
 from data_process.kline.kline_unit import Kline_Unit
@@ -10,12 +10,17 @@ T = TypeVar('T')
 
 
 class KlineCombiner(Generic[T]):
+    __slots__ = ("__time_begin", "__time_end", "__high", "__low", "__lst", "__dir", "__fx", "__pre", "__next", "_memoize_cache")
+
     def __init__(self, kl_unit: T, _dir):
         item = CombineItem(kl_unit)
-        self.__time_begin = item.time_begin
-        self.__time_end = item.time_end
-        self.__high = item.high
-        self.__low = item.low
+        self.init(kl_unit, item.time_begin, item.time_end, item.high, item.low, _dir)
+
+    def init(self, kl_unit: T, time_begin, time_end, high, low, _dir):
+        self.__time_begin = time_begin
+        self.__time_end = time_end
+        self.__high = high
+        self.__low = low
 
         self.__lst: List[T] = [kl_unit]  # 本级别每一根单位K线
 
@@ -23,9 +28,11 @@ class KlineCombiner(Generic[T]):
         self.__fx = FxType.UNKNOWN
         self.__pre: Optional[Self] = None
         self.__next: Optional[Self] = None
+        self._memoize_cache = None
 
-    def clean_cache(self):
-        self._memoize_cache = {}
+    def clean_cache(self, dep: Optional[str] = None):
+        """dep: "merge" 合并了新元素（高低点、成员变化），"fx" 分型或前后关系变化；None 全部清掉"""
+        clean_memoize(self, dep)
 
     @property
     def time_begin(self):
@@ -79,24 +86,29 @@ class KlineCombiner(Generic[T]):
         allow_hl_equal = 1 包含在了item中，顶部相等不合并
         allow_hl_equal = -1 包含在了item中，底部相等不合并
         """
+        return self.test_combine_hl(item.high, item.low, exclude_included, allow_hl_equal)
 
+    def test_combine_hl(self, high, low, exclude_included=False, allow_hl_equal=None):
+        """同 test_combine，直接传入 item 的高低点"""
+        self_high = self.__high
+        self_low = self.__low
         # K线合并器包含了item（包括等HL）
-        if (self.high >= item.high and self.low <= item.low):
+        if self_high >= high and self_low <= low:
             return KlineDir.COMBINE
         # K线合并器被包含在了item中
-        if (self.high <= item.high and self.low >= item.low):
+        if self_high <= high and self_low >= low:
             # 如果allow_hl_equal为1，且等H、item的L更低
-            if allow_hl_equal == 1 and self.high == item.high and self.low > item.low:
+            if allow_hl_equal == 1 and self_high == high and self_low > low:
                 return KlineDir.DOWN
             # 如果allow_hl_equal为 - 1，且等L、item的H更高
-            elif allow_hl_equal == -1 and self.low == item.low and self.high < item.high:
+            elif allow_hl_equal == -1 and self_low == low and self_high < high:
                 return KlineDir.UP
             return KlineDir.INCLUDED if exclude_included else KlineDir.COMBINE
         # item的HL都更低
-        if (self.high > item.high and self.low > item.low):
+        if self_high > high and self_low > low:
             return KlineDir.DOWN
         # item的HL都更高
-        if (self.high < item.high and self.low < item.low):
+        if self_high < high and self_low < low:
             return KlineDir.UP
         else:
             raise ChanException("combine type unknown", ErrCode.COMBINER_ERR)
@@ -105,43 +117,61 @@ class KlineCombiner(Generic[T]):
         """
         尝试将给定的unit_kl添加到当前K线合并器中，如果可以合并，则更新合并器的信息；否则，返回合并的方向
         """
-
         combine_item = CombineItem(unit_kl)
-        _dir = self.test_combine(combine_item, exclude_included, allow_hl_equal)
-        if _dir == KlineDir.COMBINE:
+        return self.try_add_hl(unit_kl, combine_item.high, combine_item.low, combine_item.time_end, exclude_included, allow_hl_equal)
+
+    def try_add_hl(self, unit_kl: T, high, low, time_end, exclude_included=False, allow_hl_equal=None):
+        """
+        try_add 的实现，直接传入 unit_kl 的高低点和结束时间
+        Kline 合并 Kline_Unit 时走这里，不构造 CombineItem、不分配临时列表
+        """
+        _dir = self.test_combine_hl(high, low, exclude_included, allow_hl_equal)
+        if _dir is KlineDir.COMBINE:
             self.__lst.append(unit_kl)
             if isinstance(unit_kl, Kline_Unit):
                 unit_kl.set_klc(self)
             # 上升时，HL都取最高
-            if self.dir == KlineDir.UP:
-                if combine_item.high != combine_item.low or combine_item.high != self.high:  # 排除一字k线刚好在H上的，避免合并后也成一字
-                    self.__high = max([self.high, combine_item.high])
-                    self.__low = max([self.low, combine_item.low])
+            if self.__dir is KlineDir.UP:
+                if high != low or high != self.__high:  # 排除一字k线刚好在H上的，避免合并后也成一字
+                    if high > self.__high:
+                        self.__high = high
+                    if low > self.__low:
+                        self.__low = low
             # 下降时，HL都取最低
-            elif self.dir == KlineDir.DOWN:
-                if combine_item.high != combine_item.low or combine_item.low != self.low:  # 排除一字k线刚好在L上的，避免合并后也成一字
-                    self.__high = min([self.high, combine_item.high])
-                    self.__low = min([self.low, combine_item.low])
+            elif self.__dir is KlineDir.DOWN:
+                if high != low or low != self.__low:  # 排除一字k线刚好在L上的，避免合并后也成一字
+                    if high < self.__high:
+                        self.__high = high
+                    if low < self.__low:
+                        self.__low = low
             else:
                 raise ChanException(f"KLINE_DIR = {self.dir} err!!! must be {KlineDir.UP}/{KlineDir.DOWN}",
                                     ErrCode.COMBINER_ERR)
-            self._time_end = combine_item.time_end
-            self.clean_cache()
+            self.__time_end = time_end
+            self.clean_cache("merge")
         # 返回UP/DOWN/COMBINE给KL_LIST，设置下一个的方向
         return _dir
 
+    def set_combined(self, unit_lst: List[T], high, low, time_end):
+        """直接写入已算好的合并结果（成员追加到末尾、最终高低点），批量计算时代替逐根 try_add"""
+        self.__lst.extend(unit_lst)
+        self.__high = high
+        self.__low = low
+        self.__time_end = time_end
+        self.clean_cache("merge")
+
     def get_peak_klu(self, is_high) -> T:
         # 获取最大值 or 最小值所在klu/bi
         return self.get_high_peak_klu() if is_high else self.get_low_peak_klu()
 
-    @MakeCache
+    @memoize("merge")
     def get_high_peak_klu(self) -> T:
         for kl in self.lst[::-1]:
             if CombineItem(kl).high == self.high:
                 return kl
         raise ChanException("can't find peak...", ErrCode.COMBINER_ERR)
 
-    @MakeCache
+    @memoize("merge")
     def get_low_peak_klu(self) -> T:
         for kl in self.lst[::-1]:
             if CombineItem(kl).low == self.low:
@@ -173,7 +203,15 @@ class KlineCombiner(Generic[T]):
         # 当前的HL比前后都更低(不含等)
         elif _pre.high > self.high and _next.high > self.high and _pre.low > self.low and _next.low > self.low:
             self.__fx = FxType.BOTTOM
-        self.clean_cache()
+        self.clean_cache("fx")
+
+    def set_fx(self, _pre: Self, _next: Self, fx: FxType):
+        """已知分型结果时代替 update_fx，前后关系的设置与 update_fx 一致"""
+        self.set_next(_next)
+        self.set_pre(_pre)
+        _next.set_pre(self)
+        self.__fx = fx
+        self.clean_cache("fx")
 
     def __str__(self):
         return f"{self.time_begin}~{self.time_end} {self.low}->{self.high}"
@@ -197,8 +235,8 @@ class KlineCombiner(Generic[T]):
 
     def set_pre(self, _pre: Self):
         self.__pre = _pre
-        self.clean_cache()
+        self.clean_cache("fx")
 
     def set_next(self, _next: Self):
         self.__next = _next
-        self.clean_cache()
+        self.clean_cache("fx")
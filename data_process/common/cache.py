@@ -1,34 +1,86 @@
-import inspect
-import types
+"""
+无参方法的结果缓存
 
+    class Bi:
+        @memoize("end")
+        def get_end_val(self): ...
 
-class MakeCache:
-    def __init__(self, func):
-        self.func = func
+- 被装饰的方法仍是普通函数，调用时没有额外的 bound method/描述符开销；结果存在实例的 _memoize_cache 字典里，键固定为方法的 __qualname__
+- memoize(*deps) 声明结果依赖哪些状态，clean_memoize(obj, dep) 只清掉依赖 dep 的结果（以及没有声明依赖的结果），
+  例如笔的尾部变化时不需要重算起点相关的值；clean_memoize(obj) 清掉全部
+- enable_stats() 之后统计每个方法的命中/未命中次数，用于评估缓存效果，默认关闭
+"""
+from typing import Callable, Dict, List, Optional, Tuple
 
-        fargspec = inspect.getfullargspec(func)
-        if len(fargspec.args) != 1 or fargspec.args[0] != "self":
-            raise Exception("@memoize must be `(self)`")
+MEMOIZE_DEPS = "__memoize_deps__"
 
-        # set key for this function
-        self.func_key = str(func)
+_stats: Optional[Dict[str, List[int]]] = None  # 方法名 -> [命中, 未命中]
+_drop_keys: Dict[Tuple[type, str], Tuple[str, ...]] = {}
 
-    def __get__(self, instance, cls):
-        if instance is None:
-            raise Exception("@memoize's must be bound")
 
-        if not hasattr(instance, "_memoize_cache"):
-            setattr(instance, "_memoize_cache", {})
+def memoize(*deps: str) -> Callable:
+    """deps 为空表示依赖实例的全部状态，任何 clean_memoize 都会清掉"""
+    def decorator(func):
+        key = func.__qualname__
 
-        return types.MethodType(self, instance)
+        def wrapper(self):
+            cache = self._memoize_cache
+            if cache is None:
+                cache = self._memoize_cache = {}
+            elif key in cache:
+                if _stats is not None:
+                    _stats.setdefault(key, [0, 0])[0] += 1
+                return cache[key]
+            if _stats is not None:
+                _stats.setdefault(key, [0, 0])[1] += 1
+            result = cache[key] = func(self)
+            return result
 
-    def __call__(self, *args, **kwargs):
-        instance = args[0]
-        cache = instance._memoize_cache
+        wrapper.__name__ = func.__name__
+        wrapper.__qualname__ = key
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        setattr(wrapper, MEMOIZE_DEPS, deps)
+        return wrapper
+    return decorator
 
-        if self.func_key in cache:
-            return cache[self.func_key]
 
-        result = self.func(*args, **kwargs)
-        cache[self.func_key] = result
-        return result
+def _keys_to_drop(cls: type, dep: str) -> Tuple[str, ...]:
+    """cls 上依赖 dep（或没有声明依赖）的缓存键"""
+    drop = _drop_keys.get((cls, dep))
+    if drop is None:
+        drop_set = set()
+        for klass in cls.__mro__:
+            for attr in vars(klass).values():
+                deps = getattr(attr, MEMOIZE_DEPS, None)
+                if deps is not None and (not deps or dep in deps):
+                    drop_set.add(attr.__qualname__)
+        drop = _drop_keys[(cls, dep)] = tuple(drop_set)
+    return drop
+
+
+def clean_memoize(instance, dep: Optional[str] = None):
+    """清掉依赖 dep 的缓存结果，dep 为 None 时全部清掉；只删除对应的键，不重建字典"""
+    if dep is None:
+        instance._memoize_cache = None
+        return
+    cache = instance._memoize_cache
+    if cache:
+        for key in _keys_to_drop(type(instance), dep):
+            if key in cache:
+                del cache[key]
+
+
+def enable_stats():
+    global _stats
+    _stats = {}
+
+
+def disable_stats():
+    global _stats
+    _stats = None
+
+
+def get_stats() -> Dict[str, Tuple[int, int]]:
+    """{方法名: (命中, 未命中)}，没有开启统计时为空"""
+    return {key: (hit, miss) for key, (hit, miss) in (_stats or {}).items()}
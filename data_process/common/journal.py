@@ -0,0 +1,87 @@
+"""
+回滚日志：记录对象、列表在第一次被修改之前的状态，rollback 时恢复，用于临时加入未完成的K线后撤销（见 Chan.checkpoint）
+- save(obj): 保存对象的全部属性，list/dict/set/deque 类型的属性拷贝一层；同一对象只保存第一次
+- save_list(lst, begin): 保存列表（或 array）从 begin 开始的部分，之后只能改 begin 及之后的位置、在末尾增删；
+  再次调用时 begin 更小则补上之前没保存的部分
+- on_rollback(func): 自定义的恢复操作
+只保存会被修改的对象和列表末尾，开销与这次修改的多少有关，与已有的K线数量无关
+"""
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+_MISSING = object()
+_COPY_TYPES = (list, dict, set, deque)
+_slot_names: Dict[type, Tuple[str, ...]] = {}
+
+
+def slot_names(cls: type) -> Tuple[str, ...]:
+    """cls 及其父类的全部 slots，双下划线开头的按类名改写"""
+    names = _slot_names.get(cls)
+    if names is None:
+        res = []
+        for klass in cls.__mro__:
+            slots = vars(klass).get("__slots__", ())
+            for name in (slots,) if isinstance(slots, str) else slots:
+                if name in ("__dict__", "__weakref__"):
+                    continue
+                if name.startswith("__") and not name.endswith("__"):
+                    name = f"_{klass.__name__.lstrip('_')}{name}"
+                res.append(name)
+        names = _slot_names[cls] = tuple(res)
+    return names
+
+
+class Journal:
+    def __init__(self):
+        self._undo: List[Callable[[], None]] = []
+        self._saved_obj = set()  # 已保存对象的 id，对象被 undo 闭包引用，id 不会被复用
+        self._saved_list: Dict[int, list] = {}  # id(lst) -> [lst, begin, 保存的 lst[begin:]]
+
+    def save(self, obj, share: Iterable[str] = ()):
+        """share: 这些属性只记录引用不拷贝，对应的容器会被整体替换，或者另外用 save_list 保存"""
+        if id(obj) in self._saved_obj:
+            return
+        self._saved_obj.add(id(obj))
+        state = {}
+        names = slot_names(type(obj))
+        if hasattr(obj, "__dict__"):
+            names = names + tuple(obj.__dict__)
+        for name in names:
+            value = getattr(obj, name, _MISSING)
+            if isinstance(value, _COPY_TYPES) and name not in share:
+                value = value.copy()
+            state[name] = value
+
+        def undo():
+            if hasattr(obj, "__dict__"):
+                obj.__dict__.clear()
+            for name, value in state.items():
+                if value is not _MISSING:
+                    setattr(obj, name, value)
+                elif hasattr(obj, name):
+                    delattr(obj, name)
+        self._undo.append(undo)
+
+    def save_list(self, lst, begin: int):
+        begin = max(min(begin, len(lst)), 0)
+        entry = self._saved_list.get(id(lst))
+        if entry is None:
+            entry = self._saved_list[id(lst)] = [lst, begin, lst[begin:]]
+
+            def undo():
+                entry[0][entry[1]:] = entry[2]
+            self._undo.append(undo)
+        elif begin < entry[1]:
+            entry[2] = lst[begin:entry[1]] + entry[2]  # entry[1] 之前的部分还没有被改过
+            entry[1] = begin
+
+    def on_rollback(self, func: Callable[[], Any]):
+        self._undo.append(func)
+
+    def rollback(self):
+        """按保存的相反顺序恢复，之后日志清空"""
+        for undo in reversed(self._undo):
+            undo()
+        self._undo = []
+        self._saved_obj = set()
+        self._saved_list = {}
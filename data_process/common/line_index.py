@@ -0,0 +1,122 @@
+"""
+笔列表（或作为上一级“笔”的线段列表）上的区间查询，供线段计算里原本逐笔扫描的地方使用
+- high/low: 每笔的 _high()/_low()，用于 left_bi_break 等判断是否突破
+- up_peak/down_peak: find_peak_bi 的候选值，向上（向下）笔且前一根同向笔的尾部没有更高（更低）时为 get_end_val，否则为 -inf（inf）
+列表只在末尾变化（新增笔、删除虚笔、更新最后一笔的尾部、线段列表重算未确定的部分），
+sync 时从末尾往前找到第一根没有变化的笔，只重算之后的部分
+
+TailTracker 是同样的“从末尾往前找第一个没变的元素”，单独用于逐步计算时判断笔、线段、中枢列表从哪里开始变化
+"""
+from typing import Any, Callable, List, Optional
+
+from .range_index import RangeExtreme
+
+
+def line_key(line) -> tuple:
+    return line, line.dir, line._high(), line._low(), line.get_end_val()
+
+
+def line_change_key(line) -> tuple:
+    """笔/线段是否变化：同一对象、确定性和尾部 klu 都没变"""
+    return line, line.is_sure, line.get_end_klu()
+
+
+class TailTracker:
+    """
+    记录上次看到的列表每个元素的 key，update 时返回列表从哪个位置开始变化
+    只适用于在末尾变化的列表；整体重建的列表（新对象）会一直比较到开头，即全部重算
+    """
+    def __init__(self, key: Callable[[Any], tuple]):
+        self.key = key
+        self.keys: List[tuple] = []
+        self.removed: List[tuple] = []  # 上一次 update 里被替换或删掉的元素的旧 key
+        self.changed_from: Optional[int] = None  # watch 之后 update 改到的最小位置
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, lst) -> int:
+        keys, key = self.keys, self.key
+        valid = min(len(keys), len(lst))
+        while valid > 0 and key(lst[valid-1]) != keys[valid-1]:
+            valid -= 1
+        self.removed = keys[valid:]
+        if self.changed_from is not None and valid < self.changed_from:
+            self.changed_from = valid
+        del keys[valid:]
+        keys.extend(key(item) for item in lst[valid:])
+        return valid
+
+    def reset(self):
+        self.keys = []
+        self.removed = []
+        if self.changed_from is not None:
+            self.changed_from = 0
+
+    def watch(self):
+        """开始记录之后 update 改到的最小位置，撤销临时加入的K线时只需要截掉这之后的 key，见 Kline_List.rollback"""
+        self.changed_from = len(self.keys)
+
+    def unwatch(self) -> int:
+        """停止记录，返回 watch 之后改到的最小位置，之前的 key 都没有变过"""
+        changed_from, self.changed_from = self.changed_from, None
+        return len(self.keys) if changed_from is None else changed_from
+
+    def truncate(self, n: int):
+        """只保留前 n 个元素的 key，之后的下次 update 时当作变化了"""
+        del self.keys[n:]
+        self.removed = []
+
+
+class LineIndex:
+    def __init__(self):
+        self.tracker = TailTracker(line_key)
+        self.high = RangeExtreme(is_max=True)
+        self.low = RangeExtreme(is_max=False)
+        self.up_peak = RangeExtreme(is_max=True)
+        self.down_peak = RangeExtreme(is_max=False)
+
+    def __len__(self):
+        return len(self.tracker)
+
+    def sync(self, lst: list):
+        valid = self.tracker.update(lst)
+        self._truncate_index(valid)
+        for line in lst[valid:]:
+            self._append(line)
+
+    def truncate(self, n: int):
+        """只保留前 n 根线的记录，下次 sync 时重算之后的部分"""
+        self.tracker.truncate(n)
+        self._truncate_index(n)
+
+    def _truncate_index(self, n: int):
+        for index in (self.high, self.low, self.up_peak, self.down_peak):
+            index.truncate(n)
+
+    def _append(self, line):
+        self.high.append(line._high())
+        self.low.append(line._low())
+        end_val = line.get_end_val()
+        pre_pre = line.pre.pre if line.pre else None
+        # 与 find_peak_bi 的跳过条件一致
+        if line.is_up() and not (pre_pre and pre_pre.get_end_val() > end_val):
+            self.up_peak.append(end_val)
+        else:
+            self.up_peak.append(float("-inf"))
+        if line.is_down() and not (pre_pre and pre_pre.get_end_val() < end_val):
+            self.down_peak.append(end_val)
+        else:
+            self.down_peak.append(float("inf"))
+
+    def find_peak(self, begin: int, end: int, is_high: bool, prefer_last=True) -> Optional[int]:
+        """
+        [begin, end) 内 find_peak_bi 会选出的笔的位置，没有返回 None
+        find_peak_bi 顺序遍历时相等的取最后一个（prefer_last），倒序遍历时取第一个
+        """
+        index = self.up_peak if is_high else self.down_peak
+        peak_val = index.query(begin, end)
+        if peak_val in (float("-inf"), float("inf")):
+            return None
+        pos = index.last_reach(begin, end, peak_val) if prefer_last else index.first_reach(begin, end, peak_val)
+        return pos
@@ -0,0 +1,205 @@
+"""
+只在末尾变化的序列上的区间查询，用于笔/中枢指标、峰值查找等原本要逐个扫描的地方
+- PrefixSum: 前缀和，区间和 O(1)，同时记录缺失值（None）的个数
+- RangeExtreme: 区间最大或最小值，按 BLOCK 分块，整块的极值放在稀疏表里 O(1) 查询，
+  首尾不满一块的部分直接扫描（不超过 2*BLOCK 个）；追加均摊 O(1)，内存 O(n)
+  first_reach/last_reach 在稀疏表上逐级跳过达不到阈值的块，找第一个/最后一个达到阈值的位置，O(log n + BLOCK)
+两者都支持 append/pop/set_last/truncate，对应K线合并、虚笔删除、撤销临时K线这类只改末尾的更新
+值用 array 保存，每个值 8 字节，不为每个值单独分配 Python float/int
+"""
+from array import array
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+class PrefixSum:
+    __slots__ = ("prefix", "missing")
+
+    def __init__(self):
+        self.prefix = array('d', [0.0])  # prefix[i] 为前 i 个值的和，缺失值按 0 计
+        self.missing = array('q', [0])  # 前 i 个值里缺失值的个数
+
+    def __len__(self):
+        return len(self.prefix) - 1
+
+    def extend(self, values: Iterable[Optional[float]]):
+        prefix, missing = self.prefix, self.missing
+        s, m = prefix[-1], missing[-1]
+        for value in values:
+            if value is None:
+                m += 1
+            else:
+                s += value
+            prefix.append(s)
+            missing.append(m)
+
+    def extend_array(self, values: np.ndarray):
+        """没有缺失值的 numpy 数组，一次性累加"""
+        if len(values) == 0:
+            return
+        self.prefix.frombytes((np.cumsum(values, dtype=float) + self.prefix[-1]).tobytes())
+        self.missing.extend(array('q', [self.missing[-1]]) * len(values))
+
+    def append(self, value: Optional[float]):
+        self.extend((value,))
+
+    def pop(self):
+        self.prefix.pop()
+        self.missing.pop()
+
+    def truncate(self, n: int):
+        """只保留前 n 个值"""
+        del self.prefix[n+1:]
+        del self.missing[n+1:]
+
+    def sum(self, begin: int, end: int) -> Optional[float]:
+        """[begin, end) 的和，区间内有缺失值时返回 None"""
+        if self.missing[end] != self.missing[begin]:
+            return None
+        return self.prefix[end] - self.prefix[begin]
+
+
+class RangeExtreme:
+    BLOCK = 32
+    __slots__ = ("is_max", "values", "table", "_pick")
+
+    def __init__(self, is_max: bool):
+        self.is_max = is_max
+        self.values = array('d')
+        # table[k][j]: 第 j ~ j+2^k-1 个整块的极值；最后一个值所在的块不进表，这样 set_last 不需要更新表
+        self.table: List[array] = [array('d')]
+        self._pick = max if is_max else min
+
+    def __len__(self):
+        return len(self.values)
+
+    def _closed_block_cnt(self) -> int:
+        return (len(self.values) - 1) // self.BLOCK if self.values else 0
+
+    def _push_block(self):
+        table, pick = self.table, self._pick
+        j = len(table[0])
+        table[0].append(pick(self.values[j*self.BLOCK:(j+1)*self.BLOCK]))
+        k = 1
+        while j + 1 - (1 << k) >= 0:
+            if k == len(table):
+                table.append(array('d'))
+            i = j + 1 - (1 << k)
+            table[k].append(pick(table[k-1][i], table[k-1][i + (1 << (k-1))]))
+            k += 1
+
+    def _pop_block(self):
+        table = self.table
+        table[0].pop()
+        for k in range(1, len(table)):
+            if table[k] and len(table[k]) > len(table[0]) - (1 << k) + 1:
+                table[k].pop()
+        while len(table) > 1 and not table[-1]:
+            table.pop()
+
+    def append(self, value: float):
+        self.values.append(value)
+        if (len(self.values) - 1) % self.BLOCK == 0 and len(self.values) > 1:
+            self._push_block()
+
+    def extend(self, values: Iterable[float]):
+        values = list(values)
+        if len(values) < 4 * self.BLOCK:
+            for value in values:
+                self.append(value)
+            return
+        self.values.frombytes(np.asarray(values, dtype=float).tobytes())
+        self._rebuild()
+
+    def _rebuild(self):
+        """按块用 numpy 重建稀疏表，批量追加时用"""
+        block_cnt = self._closed_block_cnt()
+        arr = np.frombuffer(self.values[:block_cnt*self.BLOCK], dtype=float).reshape(block_cnt, self.BLOCK)
+        level = arr.max(axis=1) if self.is_max else arr.min(axis=1)
+        pick = np.maximum if self.is_max else np.minimum
+        self.table = [array('d', level.tobytes())]
+        k = 1
+        while (1 << k) <= block_cnt:
+            half = 1 << (k-1)
+            level = pick(level[:-half], level[half:])
+            self.table.append(array('d', level.tobytes()))
+            k += 1
+
+    def pop(self) -> float:
+        value = self.values.pop()
+        if len(self.table[0]) > self._closed_block_cnt():
+            self._pop_block()
+        return value
+
+    def truncate(self, n: int):
+        """只保留前 n 个值"""
+        while len(self.values) > n:
+            self.pop()
+
+    def set_last(self, value: float):
+        self.values[-1] = value
+
+    def query(self, begin: int, end: int) -> float:
+        """[begin, end) 的极值，空区间返回 -inf（最大值）或 inf（最小值）"""
+        if begin >= end:
+            return float("-inf") if self.is_max else float("inf")
+        pick, block = self._pick, self.BLOCK
+        first = -(-begin // block)  # 第一个完整的块
+        last = min(end // block, len(self.table[0]))  # 最后一个完整且进了表的块之后
+        if first >= last:
+            return pick(self.values[begin:end])
+        k = (last - first).bit_length() - 1
+        res = pick(self.table[k][first], self.table[k][last - (1 << k)])
+        if begin < first * block:
+            res = pick(res, pick(self.values[begin:first*block]))
+        if last * block < end:
+            res = pick(res, pick(self.values[last*block:end]))
+        return res
+
+    def _reach(self, value: float, x: float) -> bool:
+        return value >= x if self.is_max else value <= x
+
+    def _scan(self, begin: int, end: int, x: float, reverse: bool) -> int:
+        positions = range(end - 1, begin - 1, -1) if reverse else range(begin, end)
+        values = self.values
+        for pos in positions:
+            if self._reach(values[pos], x):
+                return pos
+        return -1
+
+    def first_reach(self, begin: int, end: int, x: float) -> int:
+        """[begin, end) 内第一个不小于（最大值索引）/不大于（最小值索引）x 的位置，没有返回 -1"""
+        block, table = self.BLOCK, self.table
+        first = -(-begin // block)
+        last = min(end // block, len(table[0]))
+        if first >= last:
+            return self._scan(begin, end, x, reverse=False)
+        pos = self._scan(begin, first * block, x, reverse=False)
+        if pos != -1:
+            return pos
+        j = first
+        for k in range(len(table) - 1, -1, -1):  # 跳过整段都达不到 x 的块
+            if j + (1 << k) <= last and not self._reach(table[k][j], x):
+                j += 1 << k
+        if j < last:
+            return self._scan(j * block, (j + 1) * block, x, reverse=False)
+        return self._scan(last * block, end, x, reverse=False)
+
+    def last_reach(self, begin: int, end: int, x: float) -> int:
+        """[begin, end) 内最后一个不小于（最大值索引）/不大于（最小值索引）x 的位置，没有返回 -1"""
+        block, table = self.BLOCK, self.table
+        first = -(-begin // block)
+        last = min(end // block, len(table[0]))
+        if first >= last:
+            return self._scan(begin, end, x, reverse=True)
+        pos = self._scan(last * block, end, x, reverse=True)
+        if pos != -1:
+            return pos
+        j = last
+        for k in range(len(table) - 1, -1, -1):
+            if j - (1 << k) >= first and not self._reach(table[k][j - (1 << k)], x):
+                j -= 1 << k
+        if j > first:
+            return self._scan((j - 1) * block, j * block, x, reverse=True)
+        return self._scan(begin, first * block, x, reverse=True)
@@ -0,0 +1,373 @@
+"""
+Chan 状态的二进制快照，见 Chan.save_snapshot/load_snapshot
+对象图（klu/klc/笔/线段/中枢/买卖点之间的 pre/next、sup_kl/sub_kl_list、parent_seg 等互相引用）按类展开成表：
+- 同一个类的对象放在一张表里，每个属性一列，引用其他对象记为全局编号，不递归，也不依赖对象的创建顺序
+- list/dict/set/deque 同样按对象保存（保留共享引用），元素拼成一列；array.array、numpy 数组直接存字节
+- tuple、Enum、本库的函数和类、numpy 标量内联编码
+整个结构只含 int/float/str/bytes/list/tuple，用 pickle 协议编码并可选 zlib/lzma 压缩，
+读取时不允许 pickle 引用任何类或函数；本库的类按 模块:类名 查找，只允许 ALLOWED_MODULES 下的模块
+
+文件头为 MAGIC + 格式版本 + 压缩方式；每张对象表带着保存时类的属性结构指纹（slots 和 SNAPSHOT_VERSION，见 class_schema），
+版本不一致、类已经不存在、属性结构与当前代码不一致（多了或少了属性）时抛 ChanException(SNAPSHOT_ERR)，需要重新计算
+"""
+import array
+import hashlib
+import importlib
+import io
+import lzma
+import pickle
+import struct
+import zlib
+from collections import defaultdict, deque
+from enum import Enum
+from types import BuiltinFunctionType, FunctionType
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .chan_exception import ChanException, ErrCode
+from .journal import slot_names
+
+MAGIC = b"CHANSNAP"
+FORMAT_VERSION = 2
+COMPRESS_TYPES = {None: 0, "zlib": 1, "lzma": 2}
+ALLOWED_MODULES = ("common.", "data_process.", "data_fetch.")
+ALLOWED_BUILTINS = ("list", "dict", "set", "tuple", "int", "float", "str", "min", "max", "abs")
+SKIP_ATTRS = ("__orig_class__",)  # BsPointList[Bi, BiList](...) 记录的泛型参数
+
+_HEADER = struct.Struct("<8sHB")
+_PRIMITIVE = (type(None), bool, int, float, str, bytes)
+
+# 列的存储方式
+_RAW = 0  # 全是基础类型，原样保存
+_REF = 1  # 全是对象引用或 None，存编号，None 为 -1
+_MIX = 2  # 其余情况，逐个编码
+_ENUM = 3  # 全是同一个 Enum 类的成员，存类名和 value
+
+# 内联编码的标记，编码后的值里只有这些是 tuple
+_T_REF = 0
+_T_TUPLE = 1
+_T_ENUM = 2
+_T_GLOBAL = 3
+_T_NP_SCALAR = 4
+_T_FROZENSET = 5
+_T_MISSING = 6  # 对象没有这个属性
+
+_MISSING = object()
+_class_schemas: Dict[type, str] = {}
+
+
+def _is_inline(value) -> bool:
+    t = type(value)
+    return t in _PRIMITIVE or t is tuple or t is frozenset or isinstance(value, (Enum, type, FunctionType, BuiltinFunctionType, np.generic))
+
+
+def _global_key(value) -> str:
+    module, name = value.__module__, value.__qualname__
+    if "<" in name or not (module.startswith(ALLOWED_MODULES) or module == "builtins" and name in ALLOWED_BUILTINS):
+        raise ChanException(f"快照不支持保存 {module}.{name}", ErrCode.SNAPSHOT_ERR)
+    return f"{module}:{name}"
+
+
+def _resolve_global(key: str):
+    module, name = key.split(":")
+    if not (module.startswith(ALLOWED_MODULES) or module == "builtins" and name in ALLOWED_BUILTINS):
+        raise ChanException(f"快照里有不允许加载的 {key}", ErrCode.SNAPSHOT_ERR)
+    try:
+        value = importlib.import_module(module)
+        for part in name.split("."):
+            value = getattr(value, part)
+    except (ImportError, AttributeError) as e:
+        raise ChanException(f"快照里的 {key} 在当前代码中不存在，需要重新计算", ErrCode.SNAPSHOT_ERR) from e
+    return value
+
+
+def class_schema(cls: type) -> str:
+    """
+    类的属性结构指纹：全部 slots 名，加上本库内各层类显式声明的 SNAPSHOT_VERSION（未声明视为 0）
+    有 __dict__ 的类属性不固定，修改其实例属性（增删改名或含义变化）时需把该类的 SNAPSHOT_VERSION 加一，旧快照随之失效
+    """
+    schema = _class_schemas.get(cls)
+    if schema is None:
+        parts = list(slot_names(cls))
+        for klass in cls.__mro__:
+            if klass.__module__.startswith(ALLOWED_MODULES):
+                parts.append(f"{klass.__qualname__}={vars(klass).get('SNAPSHOT_VERSION', 0)}")
+        schema = _class_schemas[cls] = hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+    return schema
+
+
+class _Writer:
+    def __init__(self, skip: Dict[type, Iterable[str]]):
+        self.skip = {cls: set(names) | set(SKIP_ATTRS) for cls, names in skip.items()}
+        self.groups: Dict[Any, list] = {}  # 类 -> 对象列表，按加入顺序
+        self.ids: Dict[int, int] = {}  # id(对象) -> 全局编号
+        self.globals: Dict[Any, str] = {}
+        self.slot_names: Dict[type, List[str]] = {}  # 类 -> 要保存的 slots
+
+    def attr_names(self, obj) -> List[str]:
+        t = type(obj)
+        names = self.slot_names.get(t)
+        if names is None:
+            skip = self.skip.get(t, SKIP_ATTRS)
+            names = self.slot_names[t] = [name for name in slot_names(t) if name not in skip]
+        if hasattr(obj, "__dict__"):
+            skip = self.skip.get(t, SKIP_ATTRS)
+            names = names + [name for name in obj.__dict__ if name not in skip]
+        return names
+
+    def collect(self, root):
+        """遍历对象图，按类分组"""
+        seen = set()
+        stack = [root]
+        while stack:
+            value = stack.pop()
+            if type(value) in _PRIMITIVE or id(value) in seen:
+                continue
+            seen.add(id(value))
+            t = type(value)
+            if t is tuple or t is frozenset:
+                stack.extend(value)
+                continue
+            if _is_inline(value):
+                continue
+            self.groups.setdefault(t, []).append(value)
+            if t is list or t is set or t is deque:
+                stack.extend(value)
+            elif t is dict or t is defaultdict:
+                stack.extend(value.keys())
+                stack.extend(value.values())
+            elif t is array.array or t is np.ndarray:
+                if t is np.ndarray and value.dtype.hasobject:
+                    raise ChanException("快照不支持 object 类型的 numpy 数组", ErrCode.SNAPSHOT_ERR)
+            elif isinstance(value, (list, dict, set, deque)) or value.__class__.__module__ == "builtins":
+                raise ChanException(f"快照不支持保存 {t}", ErrCode.SNAPSHOT_ERR)
+            else:
+                for name in self.attr_names(value):
+                    stack.append(getattr(value, name, None))
+        for objs in self.groups.values():
+            for obj in objs:
+                self.ids[id(obj)] = len(self.ids)
+
+    def enc(self, value):
+        t = type(value)
+        if t in _PRIMITIVE:
+            return value
+        idx = self.ids.get(id(value))
+        if idx is not None:
+            return _T_REF, idx
+        if value is _MISSING:
+            return (_T_MISSING,)
+        if t is tuple:
+            return _T_TUPLE, [self.enc(v) for v in value]
+        if t is frozenset:
+            return _T_FROZENSET, [self.enc(v) for v in value]
+        if isinstance(value, Enum):
+            return _T_ENUM, self.global_key(t), value.value
+        if isinstance(value, np.generic):
+            return _T_NP_SCALAR, value.dtype.str, value.tobytes()
+        return _T_GLOBAL, self.global_key(value)
+
+    def global_key(self, value) -> str:
+        key = self.globals.get(value)
+        if key is None:
+            key = self.globals[value] = _global_key(value)
+        return key
+
+    def column(self, values: Iterable) -> tuple:
+        encoded = [self.enc(v) for v in values]
+        if not any(type(v) is tuple for v in encoded):
+            return _RAW, encoded
+        if all(v is None or type(v) is tuple and v[0] == _T_REF for v in encoded):
+            return _REF, [-1 if v is None else v[1] for v in encoded]
+        first = encoded[0]
+        if type(first) is tuple and first[0] == _T_ENUM and all(type(v) is tuple and v[0] == _T_ENUM and v[1] == first[1] for v in encoded):
+            return _ENUM, (first[1], [v[2] for v in encoded])
+        return _MIX, encoded
+
+    def group_table(self, t: type, objs: list) -> tuple:
+        if t is list or t is set:
+            return t.__name__, len(objs), [len(obj) for obj in objs], self.column(v for obj in objs for v in obj)
+        if t is deque:
+            return "deque", len(objs), [len(obj) for obj in objs], self.column(v for obj in objs for v in obj), [obj.maxlen for obj in objs]
+        if t is dict or t is defaultdict:
+            keys = self.column(k for obj in objs for k in obj.keys())
+            values = self.column(v for obj in objs for v in obj.values())
+            factories = self.column(obj.default_factory for obj in objs) if t is defaultdict else None
+            return t.__name__, len(objs), [len(obj) for obj in objs], keys, values, factories
+        if t is array.array:
+            return "array", len(objs), [obj.typecode for obj in objs], [obj.tobytes() for obj in objs]
+        if t is np.ndarray:
+            return "ndarray", len(objs), [obj.dtype.str for obj in objs], [obj.shape for obj in objs], [obj.tobytes() for obj in objs]
+        names = {}
+        for obj in objs:
+            for name in self.attr_names(obj):
+                names[name] = None
+        columns = [self.column(getattr(obj, name, _MISSING) for obj in objs) for name in names]
+        return "object", len(objs), self.global_key(t), list(names), columns, class_schema(t)
+
+    def dump(self, root) -> dict:
+        self.collect(root)
+        tables = [self.group_table(t, objs) for t, objs in self.groups.items()]
+        return {"version": FORMAT_VERSION, "root": self.ids[id(root)], "tables": tables}
+
+
+class _Reader:
+    def __init__(self):
+        self.objs: list = []
+        self.globals: Dict[str, Any] = {}
+
+    def resolve(self, key: str):
+        value = self.globals.get(key)
+        if value is None:
+            value = self.globals[key] = _resolve_global(key)
+        return value
+
+    def dec(self, value):
+        if type(value) is not tuple:
+            return value
+        tag = value[0]
+        if tag == _T_REF:
+            return self.objs[value[1]]
+        if tag == _T_TUPLE:
+            return tuple(self.dec(v) for v in value[1])
+        if tag == _T_ENUM:
+            return self.resolve(value[1])(value[2])
+        if tag == _T_GLOBAL:
+            return self.resolve(value[1])
+        if tag == _T_NP_SCALAR:
+            return np.frombuffer(value[2], dtype=value[1])[0]
+        if tag == _T_FROZENSET:
+            return frozenset(self.dec(v) for v in value[1])
+        if tag == _T_MISSING:
+            return _MISSING
+        raise ChanException(f"快照数据错误: {tag}", ErrCode.SNAPSHOT_ERR)
+
+    def decode(self, column: tuple) -> list:
+        kind, values = column
+        if kind == _RAW:
+            return values
+        if kind == _REF:
+            objs = self.objs
+            return [None if idx < 0 else objs[idx] for idx in values]
+        if kind == _ENUM:
+            key, values = values
+            members = {member.value: member for member in self.resolve(key)}
+            return [members[v] for v in values]
+        return [self.dec(v) for v in values]
+
+    def create(self, table: tuple):
+        """先创建全部对象，引用才能按编号找到；内容在 fill 里填"""
+        kind, cnt = table[0], table[1]
+        objs = self.objs
+        if kind == "list":
+            objs.extend([] for _ in range(cnt))
+        elif kind == "set":
+            objs.extend(set() for _ in range(cnt))
+        elif kind == "deque":
+            objs.extend(deque(maxlen=maxlen) for maxlen in table[4])
+        elif kind == "dict":
+            objs.extend({} for _ in range(cnt))
+        elif kind == "defaultdict":
+            objs.extend(defaultdict() for _ in range(cnt))
+        elif kind == "array":
+            for typecode, data in zip(table[2], table[3]):
+                arr = array.array(typecode)
+                arr.frombytes(data)
+                objs.append(arr)
+        elif kind == "ndarray":
+            objs.extend(np.frombuffer(data, dtype=dtype).reshape(shape).copy() for dtype, shape, data in zip(table[2], table[3], table[4]))
+        elif kind == "object":
+            cls = self.resolve(table[2])
+            if table[5] != class_schema(cls):
+                raise ChanException(f"快照里 {table[2]} 的属性与当前代码不一致，需要重新计算", ErrCode.SNAPSHOT_ERR)
+            new = cls.__new__
+            objs.extend(new(cls) for _ in range(cnt))
+        else:
+            raise ChanException(f"快照数据错误: {kind}", ErrCode.SNAPSHOT_ERR)
+
+    def fill(self, table: tuple, begin: int):
+        kind, cnt = table[0], table[1]
+        objs = self.objs[begin:begin + cnt]
+        if kind in ("list", "set", "deque"):
+            values = self.decode(table[3])
+            pos = 0
+            for obj, size in zip(objs, table[2]):
+                if kind == "set":
+                    obj.update(values[pos:pos + size])
+                else:
+                    obj.extend(values[pos:pos + size])
+                pos += size
+        elif kind in ("dict", "defaultdict"):
+            keys, values = self.decode(table[3]), self.decode(table[4])
+            pos = 0
+            for obj, size in zip(objs, table[2]):
+                obj.update(zip(keys[pos:pos + size], values[pos:pos + size]))
+                pos += size
+            if kind == "defaultdict":
+                for obj, factory in zip(objs, self.decode(table[5])):
+                    obj.default_factory = factory
+        elif kind == "object":
+            for name, column in zip(table[3], table[4]):
+                values = self.decode(column)
+                if column[0] == _MIX:
+                    for obj, value in zip(objs, values):
+                        if value is not _MISSING:
+                            setattr(obj, name, value)
+                else:
+                    for obj, value in zip(objs, values):
+                        setattr(obj, name, value)
+
+    def load(self, data: dict):
+        tables = data["tables"]
+        begins = []
+        for table in tables:
+            begins.append(len(self.objs))
+            self.create(table)
+        # dict/set 最后填，它们的键可能依赖其他对象的属性计算 hash
+        order = sorted(range(len(tables)), key=lambda idx: tables[idx][0] in ("dict", "defaultdict", "set"))
+        for idx in order:
+            self.fill(tables[idx], begins[idx])
+        return self.objs[data["root"]]
+
+
+class _SafeUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise ChanException(f"快照数据错误: 不允许引用 {module}.{name}", ErrCode.SNAPSHOT_ERR)
+
+
+def dumps(root, compress: Optional[str] = None, skip: Optional[Dict[type, Iterable[str]]] = None) -> bytes:
+    """
+    compress: None/'zlib'/'lzma'
+    skip: {类: 属性名}，这些属性不保存，加载后需要自行设置
+    """
+    if compress not in COMPRESS_TYPES:
+        raise ChanException(f"不支持的压缩方式: {compress}", ErrCode.PARA_ERROR)
+    payload = pickle.dumps(_Writer(skip or {}).dump(root), protocol=pickle.HIGHEST_PROTOCOL)
+    if compress == "zlib":
+        payload = zlib.compress(payload, 6)
+    elif compress == "lzma":
+        payload = lzma.compress(payload)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, COMPRESS_TYPES[compress]) + payload
+
+
+def loads(data: bytes):
+    if len(data) < _HEADER.size:
+        raise ChanException("快照数据错误: 文件太短", ErrCode.SNAPSHOT_ERR)
+    magic, version, compress = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ChanException("不是 Chan 快照文件", ErrCode.SNAPSHOT_ERR)
+    if version != FORMAT_VERSION:
+        raise ChanException(f"快照格式版本 {version} 与当前版本 {FORMAT_VERSION} 不一致，需要重新计算", ErrCode.SNAPSHOT_ERR)
+    payload = memoryview(data)[_HEADER.size:]
+    if compress == COMPRESS_TYPES["zlib"]:
+        payload = zlib.decompress(payload)
+    elif compress == COMPRESS_TYPES["lzma"]:
+        payload = lzma.decompress(payload)
+    elif compress != COMPRESS_TYPES[None]:
+        raise ChanException(f"快照数据错误: 压缩方式 {compress}", ErrCode.SNAPSHOT_ERR)
+    try:
+        tables = _SafeUnpickler(io.BytesIO(payload)).load()
+    except (pickle.UnpicklingError, EOFError, ValueError) as e:
+        raise ChanException(f"快照数据错误: {e}", ErrCode.SNAPSHOT_ERR) from e
+    return _Reader().load(tables)
@@ -1,4 +1,5 @@
 from data_process.combiner.kline_combiner import KlineCombiner
+from data_process.common.cache import memoize
 from data_process.common.cenum import FxCheckMethod, FxType, KlineDir
 from data_process.common.chan_exception import ChanException, ErrCode
 from data_process.common.func_util import has_overlap
@@ -7,12 +8,37 @@ from data_process.kline.kline_unit import Kline_Unit
 
 # 合并后的K线
 class Kline(KlineCombiner[Kline_Unit]):
+    __slots__ = ("idx", "kl_type")
+
     def __init__(self, kl_unit: Kline_Unit, idx, _dir=KlineDir.UP):
-        super(Kline, self).__init__(kl_unit, _dir)
+        # 不经过 CombineItem，直接用 klu 的字段
+        self.init(kl_unit, kl_unit.time, kl_unit.time, kl_unit.high, kl_unit.low, _dir)
         self.idx: int = idx
         self.kl_type = kl_unit.kl_type
         kl_unit.set_klc(self)
 
+    def try_add(self, unit_kl: Kline_Unit, exclude_included=False, allow_hl_equal=None):
+        return self.try_add_hl(unit_kl, unit_kl.high, unit_kl.low, unit_kl.time, exclude_included, allow_hl_equal)
+
+    def set_combined(self, unit_lst, high, low, time_end):
+        super().set_combined(unit_lst, high, low, time_end)
+        for klu in unit_lst:
+            klu.set_klc(self)
+
+    @memoize("merge")
+    def get_high_peak_klu(self) -> Kline_Unit:
+        for klu in reversed(self.lst):
+            if klu.high == self.high:
+                return klu
+        raise ChanException("can't find peak...", ErrCode.COMBINER_ERR)
+
+    @memoize("merge")
+    def get_low_peak_klu(self) -> Kline_Unit:
+        for klu in reversed(self.lst):
+            if klu.low == self.low:
+                return klu
+        raise ChanException("can't find peak...", ErrCode.COMBINER_ERR)
+
     def __str__(self):
         fx_token = ""
         if self.fx == FxType.TOP:
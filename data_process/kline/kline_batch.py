@@ -0,0 +1,193 @@
+"""
+非逐步模式（triger_step=False）下一次性计算一个级别的指标、K线合并与分型
+- combine_hl: 对全部 klu 的高低点做包含合并，得到每根 klc 的起始位置、方向和最终高低点；
+  语义与 Kline.try_add 完全一致（包括一字K线落在合并K线高/低点上时不参与合并的处理）
+- cal_fx: 用 numpy 对整段 klc 一次算出顶底分型
+- add_klu_batch: 按上面的结果构造 Kline 并更新笔，结果与逐根 Kline_List.add_single_klu 相同
+- set_metric_batch: 各指标模型对整段 close/high/low 一次性计算（cal_batch），再挂到 klu 上；由 LazyMetric 在第一次读取时调用
+
+逐根计算时，klc[i] 的分型是在 klc[i+1] 刚创建（只含第一根 klu）时确定的，
+所以分型比较的是 klc[i-1]、klc[i] 的最终高低点和 klc[i+1] 第一根 klu 的高低点；
+笔的更新也发生在这个时刻，check_fx_valid 读到的 klc[i+1] 同样是只含第一根 klu 的状态
+包含合并本身是前后依赖的，只能顺序扫描，这里用纯 float 列表完成，不构造任何对象
+"""
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+import numpy as np
+
+from data_process.calculate.boll import BollModel
+from data_process.calculate.demark import DemarkEngine
+from data_process.calculate.kdj import Kdj
+from data_process.calculate.macd import Macd
+from data_process.calculate.rsi import Rsi
+from data_process.calculate.trend_model import TrendModel
+from data_process.common.cenum import FxType, KlineDir
+from data_process.common.chan_exception import ChanException, ErrCode
+
+from .kline import Kline
+from .kline_unit import Kline_Unit
+
+if TYPE_CHECKING:
+    from .kline_list import Kline_List
+
+DIR_UP = 1
+DIR_DOWN = -1
+FX_TYPES = {1: FxType.TOP, -1: FxType.BOTTOM, 0: FxType.UNKNOWN}
+
+
+def combine_hl(high: List[float], low: List[float]) -> Tuple[List[int], List[int], List[float], List[float]]:
+    """
+    包含合并，返回每根 klc 的 (第一根 klu 的位置, 方向 1/-1, 最终 high, 最终 low)
+    第一根 klc 方向为 UP，与 Kline 默认值一致
+    """
+    begin = [0]
+    dirs = [DIR_UP]
+    klc_high: List[float] = []
+    klc_low: List[float] = []
+    cur_high, cur_low, cur_dir = high[0], low[0], DIR_UP
+    for i in range(1, len(high)):
+        h = high[i]
+        l = low[i]
+        if (cur_high >= h and cur_low <= l) or (cur_high <= h and cur_low >= l):
+            # 同 KlineCombiner.try_add_hl
+            if cur_dir == DIR_UP:
+                if h != l or h != cur_high:  # 排除一字k线刚好在H上的，避免合并后也成一字
+                    if h > cur_high:
+                        cur_high = h
+                    if l > cur_low:
+                        cur_low = l
+            elif h != l or l != cur_low:  # 排除一字k线刚好在L上的，避免合并后也成一字
+                if h < cur_high:
+                    cur_high = h
+                if l < cur_low:
+                    cur_low = l
+            continue
+        if cur_high > h and cur_low > l:
+            cur_dir = DIR_DOWN
+        elif cur_high < h and cur_low < l:
+            cur_dir = DIR_UP
+        else:
+            raise ChanException("combine type unknown", ErrCode.COMBINER_ERR)
+        klc_high.append(cur_high)
+        klc_low.append(cur_low)
+        begin.append(i)
+        dirs.append(cur_dir)
+        cur_high, cur_low = h, l
+    klc_high.append(cur_high)
+    klc_low.append(cur_low)
+    return begin, dirs, klc_high, klc_low
+
+
+def cal_fx(klc_high, klc_low, first_high, first_low) -> np.ndarray:
+    """
+    顶底分型，1:TOP -1:BOTTOM 0:UNKNOWN，与 KlineCombiner.update_fx（exclude_included=False）一致
+    first_high/first_low 为每根 klc 第一根 klu 的高低点，首尾两根 klc 没有分型
+    """
+    high = np.asarray(klc_high, dtype=float)
+    low = np.asarray(klc_low, dtype=float)
+    first_high = np.asarray(first_high, dtype=float)
+    first_low = np.asarray(first_low, dtype=float)
+    fx = np.zeros(len(high), dtype=np.int8)
+    if len(high) < 3:
+        return fx
+    cur_high, cur_low = high[1:-1], low[1:-1]
+    pre_high, pre_low = high[:-2], low[:-2]
+    next_high, next_low = first_high[2:], first_low[2:]
+    top = (pre_high < cur_high) & (next_high < cur_high) & (pre_low < cur_low) & (next_low < cur_low)
+    bottom = (pre_high > cur_high) & (next_high > cur_high) & (pre_low > cur_low) & (next_low > cur_low)
+    fx[1:-1] = top.astype(np.int8) - bottom.astype(np.int8)
+    return fx
+
+
+def add_klu_batch(kl_list: 'Kline_List', klu_lst: List[Kline_Unit]):
+    """
+    把 klu_lst 一次性加入空的 kl_list，klu 的指标需已经计算过
+    笔只在出现分型的 klc 上更新：非逐步模式下没有虚笔，分型为 UNKNOWN 时 update_bi 不会改变笔列表
+    """
+    if len(kl_list.lst) != 0:
+        raise ChanException("batch load only supports empty kline list", ErrCode.COMMON_ERROR)
+    if len(klu_lst) == 0:
+        return
+    high = [klu.high for klu in klu_lst]
+    low = [klu.low for klu in klu_lst]
+    begin, dirs, klc_high, klc_low = combine_hl(high, low)
+    fx = cal_fx(klc_high, klc_low, [high[b] for b in begin], [low[b] for b in begin]).tolist()
+    begin.append(len(klu_lst))
+
+    lst = kl_list.lst
+    store = kl_list.store
+    bi_list = kl_list.bi_list
+    for idx in range(len(klc_high)):
+        b, e = begin[idx], begin[idx+1]
+        klc = Kline(klu_lst[b], idx=idx, _dir=KlineDir.UP if dirs[idx] == DIR_UP else KlineDir.DOWN)
+        lst.append(klc)
+        store.add_klc(klc)
+        store.add_klu(klu_lst[b])
+        if idx >= 2:
+            lst[-2].set_fx(lst[-3], klc, FX_TYPES[fx[idx-1]])
+            store.update_klc(lst[-2])
+        if idx >= 1 and fx[idx-1] != 0:
+            bi_list.update_bi(lst[-2], klc, False)
+        if e - b > 1:
+            klc.set_combined(klu_lst[b+1:e], klc_high[idx], klc_low[idx], klu_lst[e-1].time)
+            store.update_klc(klc)
+            for klu in klu_lst[b+1:e]:
+                store.add_klu(klu)
+
+
+def metric_name(metric_model) -> str:
+    """指标模型对应的 Kline_Unit 属性名"""
+    if isinstance(metric_model, Macd):
+        return "macd"
+    elif isinstance(metric_model, TrendModel):
+        return "trend"
+    elif isinstance(metric_model, BollModel):
+        return "boll"
+    elif isinstance(metric_model, DemarkEngine):
+        return "demark"
+    elif isinstance(metric_model, Rsi):
+        return "rsi"
+    elif isinstance(metric_model, Kdj):
+        return "kdj"
+    raise ChanException(f"unknown metric model {type(metric_model)}", ErrCode.PARA_ERROR)
+
+
+def set_metric_batch(klu_lst: List[Kline_Unit], metric_model_lst: list) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    等价于按顺序对每根 klu 调用 Kline_Unit.set_metric，各模型之间没有依赖，所以可以逐个模型整段计算
+    计算完模型的状态与逐根 add 之后相同，之后还可以继续逐根 add
+    返回 {指标名: {字段: 数组}}，trend 的字段为 TrendType 名加周期，如 MEAN5；demark 没有数组
+    """
+    arrays: Dict[str, Dict[str, np.ndarray]] = {}
+    if len(klu_lst) == 0:
+        return arrays
+    close = [klu.close for klu in klu_lst]
+    for metric_model in metric_model_lst:
+        if isinstance(metric_model, Macd):
+            arrays["macd"] = metric_model.cal_batch(close)
+            for klu, macd in zip(klu_lst, metric_model.to_items(arrays["macd"])):
+                klu.macd = macd
+        elif isinstance(metric_model, TrendModel):
+            values = metric_model.cal_batch(close)
+            arrays.setdefault("trend", {})[f"{metric_model.type.name}{metric_model.T}"] = values
+            for klu, value in zip(klu_lst, values.tolist()):
+                klu.trend.setdefault(metric_model.type, {})[metric_model.T] = value
+        elif isinstance(metric_model, BollModel):
+            arrays["boll"] = metric_model.cal_batch(close)
+            for klu, boll in zip(klu_lst, metric_model.to_items(arrays["boll"])):
+                klu.boll = boll
+        elif isinstance(metric_model, DemarkEngine):
+            for klu in klu_lst:
+                klu.demark = metric_model.update(idx=klu.idx, close=klu.close, high=klu.high, low=klu.low)
+        elif isinstance(metric_model, Rsi):
+            values = metric_model.cal_batch(close)
+            arrays["rsi"] = {"rsi": values}
+            for klu, rsi in zip(klu_lst, values.tolist()):
+                klu.rsi = rsi
+        elif isinstance(metric_model, Kdj):
+            high = [klu.high for klu in klu_lst]
+            low = [klu.low for klu in klu_lst]
+            arrays["kdj"] = metric_model.cal_batch(high, low, close)
+            for klu, kdj in zip(klu_lst, metric_model.to_items(arrays["kdj"])):
+                klu.kdj = kdj
+    return arrays
@@ -1,17 +1,27 @@
-from typing import List, Union, overload
+from typing import Dict, List, Optional, Union, overload
+
+import numpy as np
 
 from data_process.bi.bi import Bi
 from data_process.bi.bi_list import BiList
 from data_process.bsl_point.bs_point_list import BsPointList
+from data_process.calculate.demark import DemarkEngine
+from data_process.calculate.window import MeanVarWindow, MonotonicWindow
 from data_process.chan_config import ChanConfig
 from data_process.common.cenum import KlineDir, SegType
 from data_process.common.chan_exception import ChanException, ErrCode
+from data_process.common.journal import Journal
+from data_process.common.line_index import TailTracker, line_change_key
 from data_process.seg.seg import Seg
 from data_process.seg.seg_config import SegConfig
 from data_process.seg.seg_list_comm import SegListComm
-from data_process.zs.zs_list import ZsList
+from data_process.zs.zs_list import ZsList, zs_change_key
 
 from .kline import Kline
+from .kline_batch import add_klu_batch
+from .kline_metric import LazyMetric
+from .kline_store import KlineStore
+from .klu_metric_index import KluMetricIndex
 from .kline_unit import Kline_Unit
 
 
@@ -33,11 +43,14 @@ def get_seglist_instance(seg_config: SegConfig, lv) -> SegListComm:
 
 
 class Kline_List:
+    SNAPSHOT_VERSION = 1  # 实例属性变化时加一，旧快照不再加载，见 common/snapshot.py class_schema
+
     def __init__(self, kl_type, conf: ChanConfig):
         self.kl_type = kl_type
         self.config = conf
         self.lst: List[Kline] = []  # K线列表，可递归  元素Kline类型
-        self.bi_list = BiList(bi_conf=conf.bi_conf)
+        self.store = KlineStore()  # 列式镜像，见 KlineStore
+        self.bi_list = BiList(bi_conf=conf.bi_conf, store=self.store)
         self.seg_list: SegListComm[Bi] = get_seglist_instance(seg_config=conf.seg_conf, lv=SegType.BI)
         self.segseg_list: SegListComm[Seg[Bi]] = get_seglist_instance(seg_config=conf.seg_conf, lv=SegType.SEG)
 
@@ -50,6 +63,22 @@ class Kline_List:
         self.metric_model_lst = conf.get_metric_model()
 
         self.step_calculation = self.need_cal_step_by_step()
+        self.pending_klu: Optional[List[Kline_Unit]] = None  # 批量模式下尚未合并的K线，见 begin_batch
+        self.lazy_metric: Optional[LazyMetric] = None  # 批量模式下按需计算的指标
+        self.metric_index = KluMetricIndex(self)  # 笔的背驰指标用的区间查询
+
+        # 逐步计算时记录上一次 cal_seg_and_zs 看到的各列表，只重算变化的部分，见 TailTracker
+        self.bi_tracker = TailTracker(line_change_key)
+        self.seg_tracker = TailTracker(line_change_key)
+        self.segseg_tracker = TailTracker(line_change_key)
+        self.zs_tracker = TailTracker(zs_change_key)
+        self.segzs_tracker = TailTracker(zs_change_key)
+
+        # checkpoint 之后的回滚日志，见 checkpoint
+        self.journal: Optional[Journal] = None
+        self.checkpoint_klu_cnt = 0
+        # 最后一根 klu 还没走完时，撤销它用的日志，见 add_open_klu
+        self.open_journal: Optional[Journal] = None
 
     @overload
     def __getitem__(self, index: int) -> Kline: ...
@@ -63,19 +92,50 @@ class Kline_List:
     def __len__(self):
         return len(self.lst)
 
+    @property
+    def klu_cnt(self) -> int:
+        """已加入的 klu 数量（包括批量模式下尚未合并的）"""
+        return self.store.klu_cnt + (len(self.pending_klu) if self.pending_klu else 0)
+
+    def begin_batch(self):
+        """
+        非逐步模式下先缓存 klu，到 cal_seg_and_zs 时一次性合并K线、计算分型和笔，见 kline_batch
+        指标在第一次读取时才整级别计算，见 LazyMetric
+        只对空列表生效；缓存期间 lst/bi_list 为空，不要读取
+        """
+        if not self.step_calculation and len(self.lst) == 0:
+            self.pending_klu = []
+
+    def flush_batch(self):
+        """把批量模式下缓存的 klu 加入K线列表"""
+        if self.pending_klu is None:
+            return
+        klu_lst, self.pending_klu = self.pending_klu, None
+        self.lazy_metric = LazyMetric(self, self.metric_model_lst)
+        for klu in klu_lst:
+            klu.set_lazy_metric(self.lazy_metric)
+        add_klu_batch(self, klu_lst)
+
     def cal_seg_and_zs(self):
         """计算线段和中枢"""
+        self.flush_batch()
         if not self.step_calculation:
+            if self.journal is not None:
+                self.save_bi_tail()
             self.bi_list.try_add_virtual_bi(self.lst[-1])
-        cal_seg(self.bi_list, self.seg_list)
-        self.zs_list.cal_bi_zs(self.bi_list, self.seg_list)
-        update_zs_in_seg(self.bi_list, self.seg_list, self.zs_list)  # 计算seg的zs_lst，以及中枢的bi_in, bi_out
+        # *_dirty: 列表从哪个位置开始与上一次计算不同，之前的部分不用重算
+        bi_dirty = self.bi_tracker.update(self.bi_list)
+        if self.journal is not None:
+            self.save_seg_and_zs(bi_dirty)
+        seg_dirty = cal_seg(self.bi_list, self.seg_list, bi_dirty, self.seg_tracker)
+        self.zs_list.cal_bi_zs(self.bi_list, self.seg_list, bi_dirty, seg_dirty)
+        update_zs_in_seg(self.bi_list, self.seg_list, self.zs_list, bi_dirty, seg_dirty, self.zs_tracker)  # 计算seg的zs_lst，以及中枢的bi_in, bi_out
 
-        cal_seg(self.seg_list, self.segseg_list)
-        self.segzs_list.cal_bi_zs(self.seg_list, self.segseg_list)
-        update_zs_in_seg(self.seg_list, self.segseg_list, self.segzs_list)  # 计算segseg的zs_lst，以及中枢的bi_in, bi_out
+        segseg_dirty = cal_seg(self.seg_list, self.segseg_list, seg_dirty, self.segseg_tracker)
+        self.segzs_list.cal_bi_zs(self.seg_list, self.segseg_list, seg_dirty, segseg_dirty)
+        update_zs_in_seg(self.seg_list, self.segseg_list, self.segzs_list, seg_dirty, segseg_dirty, self.segzs_tracker)  # 计算segseg的zs_lst，以及中枢的bi_in, bi_out
 
-        self.update_klc_in_bi()  # 计算每一笔里面的 klc列表
+        self.update_klc_in_bi(bi_dirty)  # 计算每一笔里面的 klc列表
 
         # 计算买卖点
         self.seg_bs_point_lst.cal(self.seg_list, self.segseg_list)  # 线段线段买卖点
@@ -87,54 +147,310 @@ class Kline_List:
 
     def add_single_klu(self, klu: Kline_Unit):
         """添加单个K线单位到K线列表"""
+        if self.pending_klu is not None:
+            self.pending_klu.append(klu)
+            return
+        self.end_lazy_metric()
+        if self.journal is not None:
+            self.save_bi_tail()
         klu.set_metric(self.metric_model_lst)
         if len(self.lst) == 0:
             self.lst.append(Kline(klu, idx=0))
+            self.store.add_klc(self.lst[-1])
+            self.store.add_klu(klu)
         else:
             _dir = self.lst[-1].try_add(klu)
             # 不需要合并K线
             if _dir != KlineDir.COMBINE:
                 self.lst.append(Kline(klu, idx=len(self.lst), _dir=_dir))
+                self.store.add_klc(self.lst[-1])
+                self.store.add_klu(klu)
                 if len(self.lst) >= 3:
                     self.lst[-2].update_fx(self.lst[-3], self.lst[-1])
+                    self.store.update_klc(self.lst[-2])
                 if self.bi_list.update_bi(self.lst[-2], self.lst[-1], self.step_calculation) and self.step_calculation:
                     self.cal_seg_and_zs()
-            # 需要合并K线
-            elif self.step_calculation and self.bi_list.try_add_virtual_bi(self.lst[-1], need_del_end=True):  # 这里的必要性参见issue#175
-                self.cal_seg_and_zs()
+            else:
+                self.store.update_klc(self.lst[-1])
+                self.store.add_klu(klu)
+                # 需要合并K线
+                if self.step_calculation and self.bi_list.try_add_virtual_bi(self.lst[-1], need_del_end=True):  # 这里的必要性参见issue#175
+                    self.cal_seg_and_zs()
+
+    def end_lazy_metric(self):
+        """批量加载之后继续逐根加入（如 trigger_load），指标模型需要先推进到最后一根"""
+        if self.lazy_metric is not None:
+            self.lazy_metric.materialize_all()
+            self.lazy_metric = None
+
+    def checkpoint(self, journal: Journal):
+        """
+        之后加入K线、计算线段中枢时，先在 journal 里记下会被修改的对象和列表末尾，见 Chan.checkpoint
+        合并K线、指标模型、列式存储在 checkpoint 时记一次即可（只改最后两根 klc、最后一根 klu 之后的部分），
+        笔在每根 klu 加入前、线段中枢买卖点在每次 cal_seg_and_zs 前按增量计算的范围记录
+        """
+        if self.journal is not None:
+            raise ChanException("上一个 checkpoint 还没有 rollback 或 commit", ErrCode.COMMON_ERROR)
+        self.flush_batch()
+        self.end_lazy_metric()
+        self.journal = journal
+        self.checkpoint_klu_cnt = self.store.klu_cnt
+        for tracker in self.trackers():
+            tracker.watch()
+        journal.save_list(self.lst, len(self.lst))
+        for klc in self.lst[-2:]:
+            journal.save(klc)
+        self.store.save_tail(journal)
+        save_metric_models(journal, self.metric_model_lst)
+        self.save_bi_tail()
+
+    def rollback(self):
+        """
+        在 journal.rollback() 之前调用：截掉 checkpoint 之后变化过的索引（TailTracker/LineIndex/KluMetricIndex），下次计算时重建
+        对象、列表的恢复由 journal 完成
+        """
+        for tracker in (self.bi_tracker, self.seg_tracker, self.segseg_tracker, self.zs_tracker, self.segzs_tracker):
+            tracker.truncate(tracker.unwatch())
+        for line_list in (self.bi_list, self.seg_list, self.segseg_list):
+            line_index = line_list.line_index()
+            line_index.truncate(line_index.tracker.unwatch())
+        self.metric_index.truncate(self.checkpoint_klu_cnt)
+        self.journal = None
+
+    def commit(self):
+        """保留 checkpoint 之后的修改"""
+        for tracker in self.trackers():
+            tracker.unwatch()
+        self.journal = None
+
+    def add_open_klu(self, klu: Kline_Unit):
+        """
+        加入一根还没走完的 klu，之后可以用 replace_open_klu 替换，见 Chan.update_last_bar
+        上一根没走完的 klu 就此确定
+        """
+        self.close_open_klu()
+        self.open_journal = Journal()
+        self.checkpoint(self.open_journal)
+        klu.set_idx(self.klu_cnt)
+        klu.kl_type = self.kl_type
+        self.add_single_klu(klu)
+        if not self.step_calculation:
+            self.cal_seg_and_zs()
+
+    def replace_open_klu(self, klu: Kline_Unit) -> Kline_Unit:
+        """
+        撤销上一次 add_open_klu 的影响（最后两根合并K线、分型、笔的末尾，以及之后变化的线段中枢买卖点），换成 klu 重新加入
+        返回被替换的 klu
+        """
+        assert self.open_journal is not None
+        old_klu = self.lst[-1].lst[-1]
+        journal, self.open_journal = self.open_journal, None
+        self.rollback()
+        journal.rollback()
+        self.add_open_klu(klu)
+        return old_klu
+
+    def close_open_klu(self):
+        """最后一根没走完的 klu 不再替换"""
+        if self.open_journal is not None:
+            self.open_journal = None
+            self.commit()
+
+    def trackers(self) -> List[TailTracker]:
+        """checkpoint 之后要记录变化位置的 TailTracker"""
+        trackers = [self.bi_tracker, self.seg_tracker, self.segseg_tracker, self.zs_tracker, self.segzs_tracker]
+        return trackers + [line_list.line_index().tracker for line_list in (self.bi_list, self.seg_list, self.segseg_list)]
+
+    def save_bi_tail(self):
+        """加入 klu 时只会删除、修改最后两笔，或者在末尾加笔"""
+        journal, bi_list = self.journal, self.bi_list
+        journal.save(bi_list, share=("bi_list",))
+        journal.save_list(bi_list.bi_list, len(bi_list) - 2)
+        for bi in bi_list[-2:]:
+            journal.save(bi)
+
+    def save_seg_and_zs(self, bi_dirty: int):
+        """cal_seg_and_zs 修改之前记下这一次会改到的笔、线段、中枢和买卖点，范围与各步骤的增量计算一致"""
+        seg_dirty = self.save_line_level(self.bi_list.bi_list, self.seg_list, self.zs_list, self.bs_point_lst, bi_dirty, self.seg_tracker, self.zs_tracker)
+        self.save_line_level(self.seg_list.lst, self.segseg_list, self.segzs_list, self.seg_bs_point_lst, seg_dirty, self.segseg_tracker, self.segzs_tracker)
+
+    def save_line_level(self, line_lst: list, seg_list: SegListComm, zs_list: ZsList, bsp_list: BsPointList, line_dirty: int, seg_tracker: TailTracker, zs_tracker: TailTracker) -> int:
+        """
+        一个级别（笔或者作为“笔”的线段）上的线段、中枢、买卖点计算会修改的部分，返回线段列表变化位置的下界
+        - 线段: 保留 kept_seg_cnt 个，最后一个保留的线段的 next 会被修改，包含变化的笔的线段的中枢列表会重新收集
+        - 笔: 从第一个变化的线段开始重新设置所属线段，尾部在 last_sure_pos 之后的笔会重新设置买卖点
+        - 中枢: 用到了这些笔的中枢会重新设置进出笔
+        """
+        journal = self.journal
+        seg_dirty = min(seg_list.kept_seg_cnt(), len(seg_tracker))
+        first_seg = ZsList.first_dirty_seg(seg_list, line_dirty, seg_dirty)
+        if first_seg < len(seg_list):
+            line_begin = seg_list[first_seg].begin_bi.idx
+        else:
+            line_begin = seg_list[-1].end_bi.idx+1 if len(seg_list) else 0
+        line_begin = min(line_begin, line_dirty)
+        while line_begin > 0 and line_lst[line_begin-1].get_end_klu().idx > bsp_list.last_sure_pos:
+            line_begin -= 1
+        for line in line_lst[line_begin:]:
+            journal.save(line)
+
+        seg_begin = max(min(first_seg, seg_dirty - 1), 0)
+        journal.save(seg_list, share=("lst",))
+        journal.save_list(seg_list.lst, seg_begin)
+        for seg in seg_list[seg_begin:]:
+            journal.save(seg)
+
+        zs_begin = min(len(zs_list), len(zs_tracker))
+        while zs_begin > 0 and zs_list[zs_begin-1].end_bi.idx+1 >= line_begin:
+            zs_begin -= 1
+        journal.save(zs_list, share=("zs_lst",))
+        journal.save_list(zs_list.zs_lst, zs_begin)
+        for zs in zs_list[zs_begin:]:
+            journal.save(zs)
+
+        journal.save(bsp_list, share=("lst", "bsp1_lst", "klu_bsp_dict"))
+        return seg_dirty
+
+    def metric_array(self, name: str) -> Dict[str, np.ndarray]:
+        """
+        整个级别某个指标的数组（见 kline_batch.set_metric_batch 的字段说明）
+        批量加载时第一次读取直接返回计算结果，其余情况从已经算好的 klu 上收集
+        """
+        if self.lazy_metric is not None:
+            arrays = self.lazy_metric.array(name)
+            if arrays is not None:
+                return arrays
+        return collect_metric_array(list(self.klu_iter()), name)
 
     def klu_iter(self, klc_begin_idx=0):
         """迭代K线单位"""
         for klc in self.lst[klc_begin_idx:]:
             yield from klc.lst
 
-    def update_klc_in_bi(self):
-        """更新每一笔中的K线列表"""
-        for bi in self.bi_list:
-            bi.set_klc_lst(self[bi.begin_klc.idx:bi.end_klc.idx+1])
+    def klu_iter_from(self, klu_idx: int):
+        """从 klu_idx 开始迭代K线单位"""
+        if klu_idx >= self.store.klu_cnt:
+            return
+        klc_idx = self.store.klu_klc[klu_idx]
+        yield from self.lst[klc_idx].lst[klu_idx - self.store.klc_begin[klc_idx]:]
+        for idx in range(klc_idx + 1, len(self.lst)):
+            yield from self.lst[idx].lst
+
+    def update_klc_in_bi(self, bi_dirty: int = 0):
+        """更新每一笔中的K线列表，bi_dirty 之前的笔没有变化，不用重新设置"""
+        for bi in self.bi_list[bi_dirty:]:
+            bi.set_klc_lst(self[bi.begin_klc.idx:bi.end_klc.idx+1], self.metric_index)
 
 
-def cal_seg(bi_list, seg_list):
-    """计算线段"""
+def cal_seg(bi_list, seg_list, bi_dirty: int = 0, seg_tracker: Optional[TailTracker] = None) -> int:
+    """
+    计算线段，返回线段列表从哪个位置开始变化
+    bi_dirty 之前的笔、以及第一个变化的线段之前的线段都没变，这些笔所属的线段不用重新设置；不传 seg_tracker 时全部重新设置
+    """
     seg_list.update(bi_list)
+    seg_dirty = seg_tracker.update(seg_list) if seg_tracker is not None else 0
+    # 线段首尾相连，第一个变化的线段（或最后一个线段）之后的笔都要重新设置
+    if seg_dirty < len(seg_list):
+        begin_bi_idx = seg_list[seg_dirty].begin_bi.idx
+    else:
+        begin_bi_idx = seg_list[-1].end_bi.idx+1 if len(seg_list) else 0
+    begin_bi_idx = min(begin_bi_idx, bi_dirty)
+    begin_seg_idx = min(seg_dirty, len(seg_list))
+    while begin_seg_idx > 0 and seg_list[begin_seg_idx-1].end_bi.idx >= begin_bi_idx:
+        begin_seg_idx -= 1
     # 计算每一笔属于哪个线段
     bi_seg_idx_dict = {}
-    for seg_idx, seg in enumerate(seg_list):
-        for i in range(seg.begin_bi.idx, seg.end_bi.idx+1):
+    for seg_idx in range(begin_seg_idx, len(seg_list)):
+        seg = seg_list[seg_idx]
+        for i in range(max(seg.begin_bi.idx, begin_bi_idx), seg.end_bi.idx+1):
             bi_seg_idx_dict[i] = seg_idx
-    for bi in bi_list:
+    for bi in bi_list[begin_bi_idx:]:
         bi.set_seg_idx(bi_seg_idx_dict.get(bi.idx, len(seg_list)))  # 找不到的应该都是最后一个线段的
+    return seg_dirty
+
 
+def update_zs_in_seg(bi_list, seg_list, zs_list, bi_dirty: int = 0, seg_dirty: int = 0, zs_tracker: Optional[TailTracker] = None):
+    """
+    更新线段中的中枢，以及中枢的进出笔、笔列表
+    只处理变化的中枢、用到了变化的笔的中枢，和变化的线段、包含变化的中枢的线段；中枢按位置排列，这些都在列表末尾
+    不传 zs_tracker 时全部重算
+    """
+    if len(seg_list) == 0:
+        if zs_tracker is not None:
+            zs_tracker.reset()  # 这一次没有设置中枢的进出笔，下次全部重算
+        return
+    zs_dirty = zs_tracker.update(zs_list) if zs_tracker is not None else 0
 
-def update_zs_in_seg(bi_list, seg_list, zs_list):
-    """更新线段中的中枢"""
-    for seg in seg_list:
+    begin_zs_idx = zs_dirty
+    while begin_zs_idx > 0 and zs_list[begin_zs_idx-1].end_bi.idx+1 >= bi_dirty:
+        begin_zs_idx -= 1
+    for zs in zs_list[begin_zs_idx:]:
+        assert zs.begin_bi.idx > 0
+        zs.set_bi_in(bi_list[zs.begin_bi.idx-1])
+        if zs.end_bi.idx+1 < len(bi_list):
+            zs.set_bi_out(bi_list[zs.end_bi.idx+1])
+        zs.set_bi_lst(list(bi_list[zs.begin_bi.idx:zs.end_bi.idx+1]))
+
+    # 第一个变化的中枢（包括被删掉的）的起始笔，之后的线段里的中枢要重新收集
+    zs_begin_bi_idx = float("inf")
+    if zs_dirty < len(zs_list):
+        zs_begin_bi_idx = zs_list[zs_dirty].begin_bi.idx
+    if zs_tracker is not None and zs_tracker.removed:
+        zs_begin_bi_idx = min(zs_begin_bi_idx, zs_tracker.removed[0][1])
+    begin_seg_idx = min(seg_dirty, len(seg_list))
+    while begin_seg_idx > 0 and seg_list[begin_seg_idx-1].end_bi.idx >= zs_begin_bi_idx:
+        begin_seg_idx -= 1
+    if begin_seg_idx == len(seg_list):
+        return
+    zs_idx = len(zs_list)
+    while zs_idx > 0 and zs_list[zs_idx-1].begin_bi.idx >= seg_list[begin_seg_idx].begin_bi.idx:
+        zs_idx -= 1
+    for seg in seg_list[begin_seg_idx:]:
         seg.clear_zs_lst()
-        for zs in zs_list:
-            if zs.is_inside(seg):
-                seg.add_zs(zs)
-            assert zs.begin_bi.idx > 0
-            zs.set_bi_in(bi_list[zs.begin_bi.idx-1])
-            if zs.end_bi.idx+1 < len(bi_list):
-                zs.set_bi_out(bi_list[zs.end_bi.idx+1])
-            zs.set_bi_lst(list(bi_list[zs.begin_bi.idx:zs.end_bi.idx+1]))
+        while zs_idx < len(zs_list) and zs_list[zs_idx].begin_bi.idx <= seg.end_bi.idx:
+            if zs_list[zs_idx].is_inside(seg):
+                seg.add_zs(zs_list[zs_idx])
+            zs_idx += 1
+
+
+def save_metric_models(journal: Journal, metric_model_lst: list):
+    """
+    指标模型只有滑动窗口等最近的状态，原地恢复（上一根的结果对象和 klu 共享，不拷贝）
+    DemarkEngine 的K线列表只追加，setup 对象被 klu 上的 DemarkIndex 引用
+    """
+    for model in metric_model_lst:
+        if isinstance(model, DemarkEngine):
+            journal.save(model, share=("kl_lst",))
+            journal.save_list(model.kl_lst, len(model.kl_lst))
+            for series in model.series:
+                journal.save(series)
+                if series.countdown is not None:
+                    journal.save(series.countdown)
+            continue
+        journal.save(model)
+        for value in vars(model).values():
+            if isinstance(value, (MeanVarWindow, MonotonicWindow)):
+                journal.save(value)
+
+
+def collect_metric_array(klu_lst: List[Kline_Unit], name: str) -> Dict[str, np.ndarray]:
+    """从 klu 上已经算好的指标对象收集数组，字段与 set_metric_batch 一致"""
+    if name == "macd":
+        fields = ["fast_ema", "slow_ema", "DIF", "DEA", "macd"]
+    elif name == "boll":
+        fields = ["MID", "_theta", "UP", "DOWN"]
+    elif name == "kdj":
+        fields = ["k", "d", "j"]
+    elif name == "rsi":
+        return {"rsi": np.array([klu.rsi for klu in klu_lst], dtype=float)}
+    elif name == "trend":
+        if not klu_lst:
+            return {}
+        return {
+            f"{trend_type.name}{T}": np.array([klu.trend[trend_type][T] for klu in klu_lst], dtype=float)
+            for trend_type, t_dict in klu_lst[0].trend.items() for T in t_dict
+        }
+    else:
+        raise ChanException(f"metric {name} is not available as array", ErrCode.PARA_ERROR)
+    items = [getattr(klu, name) for klu in klu_lst]
+    return {field: np.array([getattr(item, field) for item in items], dtype=float) for field in fields}
@@ -0,0 +1,49 @@
+"""
+一个级别的指标按需计算：批量加载（kl_batch）时不再逐根计算 ChanConfig 里声明的指标，
+而是在第一次读取某个指标时（如 Bi.cal_macd_area 读 klu.macd、导出时取数组），对整个级别一次性计算
+没被读取的指标（如大多数场景下的 boll）完全不算
+计算出的整级别数组只在计算时返回一次，不保留：klu 上已经有一份，之后需要数组时从 klu 上收集（见 Kline_List.metric_array）
+"""
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from data_process.common.chan_exception import ChanException, ErrCode
+
+from .kline_batch import metric_name, set_metric_batch
+
+if TYPE_CHECKING:
+    from .kline_list import Kline_List
+
+
+class LazyMetric:
+    def __init__(self, kl_list: 'Kline_List', metric_model_lst: list):
+        self.kl_list = kl_list
+        self.pending: Dict[str, list] = {}  # 指标名 -> 尚未计算的模型
+        for metric_model in metric_model_lst:
+            self.pending.setdefault(metric_name(metric_model), []).append(metric_model)
+        self.declared: List[str] = list(self.pending)
+
+    def is_pending(self, name: str) -> bool:
+        return name in self.pending
+
+    def materialize(self, name: str) -> Optional[Dict[str, Dict[str, np.ndarray]]]:
+        """计算整个级别的某个指标并挂到 klu 上，返回 set_metric_batch 的数组；已经算过或者没有配置的返回 None"""
+        metric_model_lst = self.pending.pop(name, None)  # 先移除，计算过程中读 klu 属性不会再次触发
+        if metric_model_lst is None:
+            return None
+        return set_metric_batch(list(self.kl_list.klu_iter()), metric_model_lst)
+
+    def materialize_all(self):
+        for name in list(self.pending):
+            self.materialize(name)
+
+    def array(self, name: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        指标还没计算时计算并返回整个级别上的数组，字段见 set_metric_batch；已经计算过的返回 None，由调用方从 klu 上收集
+        demark 没有数组形式
+        """
+        if name not in self.declared or name == "demark":
+            raise ChanException(f"metric {name} is not available as array, declared: {self.declared}", ErrCode.PARA_ERROR)
+        arrays = self.materialize(name)
+        return None if arrays is None else arrays[name]
@@ -0,0 +1,178 @@
+"""
+一个级别K线的列式存储：与 Kline_List 同步增长的连续数组，供指标、图表导出、跨级别查找等批量计算使用
+- klu 按加入顺序排列，位置即 klu.idx
+- klc 按 Kline.idx 排列，成员 klu 为 [klc_begin[i], klc_begin[i+1]) 这一连续区间
+- 父子级别关系用整数表示：klu_parent 为父级别 klu 的位置，klu_child_begin/klu_child_end 为次级别 klu 的区间
+- klu 的 time 与 KlColumns 相同，是墙上时间按UTC编码的秒数（time2epoch），不是 Time.ts
+逐根计算仍以 Kline_Unit/Kline 对象为准，这里只是镜像，不要直接修改
+"""
+from array import array
+from typing import TYPE_CHECKING, Dict, Tuple
+
+import numpy as np
+
+from common.func_util import time2epoch
+from data_process.common.cenum import FxType, KlineDir
+from data_process.common.range_index import RangeExtreme
+
+if TYPE_CHECKING:
+    from data_process.common.journal import Journal
+
+NO_LINK = -1
+NAN = float("nan")
+
+
+
+def fx_code(fx: FxType) -> int:
+    # 不用 dict：Enum.__hash__ 是 Python 实现，每根K线都查会明显变慢
+    return 1 if fx is FxType.TOP else -1 if fx is FxType.BOTTOM else 0
+
+
+def dir_code(_dir: KlineDir) -> int:
+    return 1 if _dir is KlineDir.UP else -1
+
+
+class KlineStore:
+    KLU_COLUMNS = ("time", "open", "high", "low", "close", "volume")
+    KLU_INT_COLUMNS = ("klu_klc", "klu_parent", "klu_child_begin", "klu_child_end")
+    KLC_COLUMNS = ("klc_high", "klc_low", "klc_dir", "klc_fx", "klc_begin")
+
+    def __init__(self):
+        # klu 列，缺失的 volume 为 NaN
+        self.time = array('q')
+        self.open = array('d')
+        self.high = array('d')
+        self.low = array('d')
+        self.close = array('d')
+        self.volume = array('d')
+        self.klu_klc = array('q')
+        self.klu_parent = array('q')
+        self.klu_child_begin = array('q')
+        self.klu_child_end = array('q')
+
+        # klc 列
+        self.klc_high = array('d')
+        self.klc_low = array('d')
+        self.klc_dir = array('b')  # 1:UP -1:DOWN
+        self.klc_fx = array('b')  # 1:TOP -1:BOTTOM 0:UNKNOWN
+        self.klc_begin = array('q')
+        # klc 高低点的区间极值，笔的跨度/尾部是否极值等判断用，见 klc_max_high
+        self.klc_high_index = RangeExtreme(is_max=True)
+        self.klc_low_index = RangeExtreme(is_max=False)
+
+    @property
+    def klu_cnt(self) -> int:
+        return len(self.klu_klc)
+
+    @property
+    def klc_cnt(self) -> int:
+        return len(self.klc_high)
+
+    def add_klu(self, klu):
+        """klu 需已归入 klc，即 Kline_List.add_single_klu 处理完之后调用"""
+        volume = klu.trade_info.volume
+        self.time.append(time2epoch(klu.time))
+        self.open.append(klu.open)
+        self.high.append(klu.high)
+        self.low.append(klu.low)
+        self.close.append(klu.close)
+        self.volume.append(NAN if volume is None else volume)
+        self.klu_klc.append(klu.klc.idx)
+
+    def add_klc(self, klc):
+        """klc 刚创建，其第一根 klu 尚未 add_klu"""
+        self.klc_high.append(klc.high)
+        self.klc_low.append(klc.low)
+        self.klc_dir.append(dir_code(klc.dir))
+        self.klc_fx.append(fx_code(klc.fx))
+        self.klc_begin.append(len(self.klu_klc))
+        self.klc_high_index.append(klc.high)
+        self.klc_low_index.append(klc.low)
+
+    def update_klc(self, klc):
+        """合并新 klu 后 high/low 变化，或者确定分型后调用"""
+        self.klc_high[klc.idx] = klc.high
+        self.klc_low[klc.idx] = klc.low
+        self.klc_fx[klc.idx] = fx_code(klc.fx)
+        if klc.idx == self.klc_cnt - 1:  # 只有最后一根 klc 会合并新的 klu
+            self.klc_high_index.set_last(klc.high)
+            self.klc_low_index.set_last(klc.low)
+
+    def save_tail(self, journal: 'Journal'):
+        """
+        记下之后加入K线会修改的部分，见 Kline_List.checkpoint
+        之后只会修改最后两根 klc、最后一根 klu 的子K线区间（父级别 klu 加入子K线），其余都是追加
+        """
+        klu_cnt, klc_cnt = self.klu_cnt, self.klc_cnt
+        for name in self.KLU_COLUMNS + ("klu_klc",):
+            journal.save_list(getattr(self, name), klu_cnt)
+        for name in ("klu_parent", "klu_child_begin", "klu_child_end"):
+            journal.save_list(getattr(self, name), klu_cnt - 1)
+        for name in self.KLC_COLUMNS:
+            journal.save_list(getattr(self, name), klc_cnt - 2)
+        if klc_cnt:
+            last_high, last_low = self.klc_high_index.values[-1], self.klc_low_index.values[-1]
+
+        def restore_index():
+            self.klc_high_index.truncate(klc_cnt)
+            self.klc_low_index.truncate(klc_cnt)
+            if klc_cnt:
+                self.klc_high_index.set_last(last_high)
+                self.klc_low_index.set_last(last_low)
+        journal.on_rollback(restore_index)
+
+    def pad_links(self, min_cnt: int = 0):
+        """
+        父子级别列只在多级别时用到，按需补齐到 klu 数量
+        批量加载时父子关系先于 klu 写入，用 min_cnt 补齐到需要的长度
+        """
+        missing = max(self.klu_cnt, min_cnt) - len(self.klu_parent)
+        if missing > 0:
+            padding = array('q', [NO_LINK]) * missing
+            self.klu_parent.extend(padding)
+            self.klu_child_begin.extend(padding)
+            self.klu_child_end.extend(padding)
+
+    def set_parent(self, klu_idx: int, parent_idx: int):
+        if klu_idx >= len(self.klu_parent):
+            self.pad_links(klu_idx + 1)
+        self.klu_parent[klu_idx] = parent_idx
+
+    def add_child(self, klu_idx: int, child_idx: int):
+        """次级别 klu 按时间顺序加入，同一个父 klu 的子 klu 是连续的"""
+        if klu_idx >= len(self.klu_child_begin):
+            self.pad_links(klu_idx + 1)
+        if self.klu_child_begin[klu_idx] == NO_LINK:
+            self.klu_child_begin[klu_idx] = child_idx
+        self.klu_child_end[klu_idx] = child_idx + 1
+
+    def klc_klu_range(self, klc_idx: int) -> Tuple[int, int]:
+        """klc 包含的 klu 区间 [begin, end)"""
+        end = self.klc_begin[klc_idx + 1] if klc_idx + 1 < self.klc_cnt else self.klu_cnt
+        return self.klc_begin[klc_idx], end
+
+    def klc_max_high(self, begin: int, end: int) -> float:
+        """klc[begin:end] 的最高点，空区间为 -inf"""
+        return self.klc_high_index.query(begin, end)
+
+    def klc_min_low(self, begin: int, end: int) -> float:
+        """klc[begin:end] 的最低点，空区间为 inf"""
+        return self.klc_low_index.query(begin, end)
+
+    def child_range(self, klu_idx: int) -> Tuple[int, int]:
+        """次级别 klu 区间 [begin, end)，没有子K线时为 (NO_LINK, NO_LINK)"""
+        self.pad_links()
+        return self.klu_child_begin[klu_idx], self.klu_child_end[klu_idx]
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        单列的 numpy 数组（拷贝一次连续内存）
+        不返回共享内存的视图：array 被导出 buffer 时无法再 append，会导致后续加入K线失败
+        """
+        if name in self.KLU_INT_COLUMNS:
+            self.pad_links()
+        arr = getattr(self, name)
+        return np.frombuffer(arr, dtype=arr.typecode).copy() if len(arr) else np.zeros(0, dtype=arr.typecode)
+
+    def as_numpy(self) -> Dict[str, np.ndarray]:
+        return {name: self.column(name) for name in self.KLU_COLUMNS + self.KLU_INT_COLUMNS + self.KLC_COLUMNS}
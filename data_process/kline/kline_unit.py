@@ -1,4 +1,4 @@
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 
 from data_process.common.cenum import TrendType
 from common.const import DataField
@@ -6,44 +6,160 @@ from data_process.common.chan_exception import ChanException, ErrCode
 from common.time import Time
 from data_process.calculate.boll import BollMetric, BollModel
 from data_process.calculate.demark import DemarkEngine, DemarkIndex
-from data_process.calculate.kdj import Kdj
+from data_process.calculate.kdj import Kdj, KdjItem
 from data_process.calculate.macd import Macd, MacdItem
 from data_process.calculate.rsi import Rsi
 from data_process.calculate.trend_model import TrendModel
 
 from .trade_info import TradeInfo
 
+if TYPE_CHECKING:
+    from .kline_metric import LazyMetric
+
 
 class Kline_Unit:
+    # 每根K线一个对象，用 slots 省掉实例字典
+    __slots__ = (
+        "kl_type", "time", "close", "open", "high", "low", "trade_info", "sup_kl", "limit_flag",
+        "_demark", "_trend", "_sub_kl_list", "__klc", "__idx",
+        "_macd", "_boll", "_rsi", "_kdj", "_lazy_metric",
+    )
+
     def __init__(self, kl_dict, autofix=False):
         # _time, _close, _open, _high, _low, _extra_info={}
+        self.init(
+            kl_dict[DataField.FIELD_TIME],
+            kl_dict[DataField.FIELD_OPEN],
+            kl_dict[DataField.FIELD_HIGH],
+            kl_dict[DataField.FIELD_LOW],
+            kl_dict[DataField.FIELD_CLOSE],
+            TradeInfo(kl_dict),
+            autofix,
+        )
+
+    @classmethod
+    def from_fields(cls, time: Time, _open, high, low, close, trade_info: TradeInfo, autofix=False) -> 'Kline_Unit':
+        """不经过 kl_dict 直接构造，用于列式数据加载"""
+        klu = cls.__new__(cls)
+        klu.init(time, _open, high, low, close, trade_info, autofix)
+        return klu
+
+    def init(self, time: Time, _open, high, low, close, trade_info: TradeInfo, autofix):
         self.kl_type = None
-        self.time: Time = kl_dict[DataField.FIELD_TIME]
-        self.close = kl_dict[DataField.FIELD_CLOSE]
-        self.open = kl_dict[DataField.FIELD_OPEN]
-        self.high = kl_dict[DataField.FIELD_HIGH]
-        self.low = kl_dict[DataField.FIELD_LOW]
+        self.time: Time = time
+        self.close = close
+        self.open = _open
+        self.high = high
+        self.low = low
 
         self.check(autofix)
 
-        self.trade_info = TradeInfo(kl_dict)
+        self.trade_info = trade_info
 
-        self.demark: DemarkIndex = DemarkIndex()
+        # demark/trend/次级别K线大多数K线用不到，首次使用时才分配
+        self._demark: Optional[DemarkIndex] = None
+        self._trend: Optional[Dict[TrendType, Dict[int, float]]] = None
+        self._sub_kl_list: Optional[List[Kline_Unit]] = None
 
-        self.sub_kl_list = []  # 次级别KLU列表
         self.sup_kl: Optional[Kline_Unit] = None  # 指向更高级别KLU
 
         from data_process.kline.kline import Kline
         self.__klc: Optional[Kline] = None  # 指向Kline
 
-        # self.macd: Optional[CMACD_item] = None
-        # self.boll: Optional[BOLL_Metric] = None
-        self.trend: Dict[TrendType, Dict[int, float]] = {}  # int -> float
+        # 指标，未配置的为 None（读取时抛 AttributeError）；批量加载时由 _lazy_metric 在第一次读取时整级别计算
+        self._macd: Optional[MacdItem] = None
+        self._boll: Optional[BollMetric] = None
+        self._rsi: Optional[float] = None
+        self._kdj: Optional[KdjItem] = None
+        self._lazy_metric: Optional['LazyMetric'] = None
 
         self.limit_flag = 0  # 0:普通 -1:跌停，1:涨停
 
         self.set_idx(-1)
 
+    def set_lazy_metric(self, lazy_metric: 'LazyMetric'):
+        self._lazy_metric = lazy_metric
+
+    def load_metric(self, name: str):
+        """批量加载时指标尚未计算的，现在整个级别一起算"""
+        if self._lazy_metric is not None:
+            self._lazy_metric.materialize(name)
+
+    @property
+    def macd(self) -> MacdItem:
+        if self._macd is None:
+            self.load_metric("macd")
+            if self._macd is None:
+                raise AttributeError("macd")
+        return self._macd
+
+    @macd.setter
+    def macd(self, macd: MacdItem):
+        self._macd = macd
+
+    @property
+    def boll(self) -> BollMetric:
+        if self._boll is None:
+            self.load_metric("boll")
+            if self._boll is None:
+                raise AttributeError("boll")
+        return self._boll
+
+    @boll.setter
+    def boll(self, boll: BollMetric):
+        self._boll = boll
+
+    @property
+    def rsi(self) -> float:
+        if self._rsi is None:
+            self.load_metric("rsi")
+            if self._rsi is None:
+                raise AttributeError("rsi")
+        return self._rsi
+
+    @rsi.setter
+    def rsi(self, rsi: float):
+        self._rsi = rsi
+
+    @property
+    def kdj(self) -> KdjItem:
+        if self._kdj is None:
+            self.load_metric("kdj")
+            if self._kdj is None:
+                raise AttributeError("kdj")
+        return self._kdj
+
+    @kdj.setter
+    def kdj(self, kdj: KdjItem):
+        self._kdj = kdj
+
+    @property
+    def demark(self) -> DemarkIndex:
+        if self._demark is None:
+            self.load_metric("demark")
+        if self._demark is None:
+            self._demark = DemarkIndex()
+        return self._demark
+
+    @demark.setter
+    def demark(self, demark: DemarkIndex):
+        self._demark = demark
+
+    @property
+    def trend(self) -> Dict[TrendType, Dict[int, float]]:  # int -> float
+        if self._trend is None:
+            self.load_metric("trend")
+        if self._trend is None:
+            self._trend = {}
+        return self._trend
+
+    @property
+    def sub_kl_list(self) -> List['Kline_Unit']:
+        """次级别KLU列表"""
+        if self._sub_kl_list is None:
+            self._sub_kl_list = []
+        return self._sub_kl_list
+
     @property
     def klc(self):
         assert self.__klc is not None
@@ -81,7 +197,8 @@ class Kline_Unit:
         self.sup_kl = parent
 
     def get_children(self):
-        yield from self.sub_kl_list
+        if self._sub_kl_list is not None:
+            yield from self._sub_kl_list
 
     def _low(self):
         return self.low
@@ -92,19 +209,19 @@ class Kline_Unit:
     def set_metric(self, metric_model_lst: list) -> None:
         for metric_model in metric_model_lst:
             if isinstance(metric_model, Macd):
-                self.macd: MacdItem = metric_model.add(self.close)
+                self._macd = metric_model.add(self.close)
             elif isinstance(metric_model, TrendModel):
                 if metric_model.type not in self.trend:
                     self.trend[metric_model.type] = {}
                 self.trend[metric_model.type][metric_model.T] = metric_model.add(self.close)
             elif isinstance(metric_model, BollModel):
-                self.boll: BollMetric = metric_model.add(self.close)
+                self._boll = metric_model.add(self.close)
             elif isinstance(metric_model, DemarkEngine):
                 self.demark = metric_model.update(idx=self.idx, close=self.close, high=self.high, low=self.low)
             elif isinstance(metric_model, Rsi):
-                self.rsi = metric_model.add(self.close)
+                self._rsi = metric_model.add(self.close)
             elif isinstance(metric_model, Kdj):
-                self.kdj = metric_model.add(self.high, self.low, self.close)
+                self._kdj = metric_model.add(self.high, self.low, self.close)
 
     def get_parent_klc(self):
         assert self.sup_kl is not None
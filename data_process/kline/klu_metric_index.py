@@ -0,0 +1,157 @@
+"""
+一个级别 klu 指标的区间查询，供笔的背驰指标（Bi.cal_macd_* / cal_rsi / cal_macd_trade_metric）使用
+- |macd|、成交量/成交额/换手率: 前缀和
+- macd、rsi: 区间最大最小值（RangeExtreme）
+- macd 同号连续段的起点 run_begin，用于 MacdAlgo.AREA 的半段面积
+klu 只会在末尾追加（或撤销临时加入的部分），加入后指标不再变化，所以各列第一次查询时才建立，之后每次查询只补上新加入的 klu
+批量加载时优先从 LazyMetric 的整级别数组取值，不逐根读 klu
+"""
+from array import array
+from bisect import bisect_right
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from data_process.common.range_index import PrefixSum, RangeExtreme
+
+if TYPE_CHECKING:
+    from .kline_list import Kline_List
+
+
+class MacdColumn:
+    __slots__ = ("abs_sum", "max", "min", "run_begin")
+
+    def __init__(self):
+        self.abs_sum = PrefixSum()
+        self.max = RangeExtreme(is_max=True)
+        self.min = RangeExtreme(is_max=False)
+        self.run_begin = array('q')  # 所在严格同号（0 单独成段）连续段的起点，单调不减
+
+    def __len__(self):
+        return len(self.run_begin)
+
+    def extend(self, values: List[float]):
+        if not values:
+            return
+        if len(values) >= 4 * RangeExtreme.BLOCK:
+            arr = np.asarray(values, dtype=float)
+            self.abs_sum.extend_array(np.abs(arr))
+            self.run_begin.frombytes(self._run_begin_array(arr).astype(np.int64).tobytes())
+        else:
+            self.abs_sum.extend(abs(v) for v in values)
+            run_begin = self.run_begin
+            pre = self.max.values[-1] if self.max.values else 0.0
+            for v in values:
+                run_begin.append(run_begin[-1] if run_begin and v * pre > 0 else len(run_begin))
+                pre = v
+        self.max.extend(values)
+        self.min.extend(values)
+
+    def truncate(self, n: int):
+        self.abs_sum.truncate(n)
+        self.max.truncate(n)
+        self.min.truncate(n)
+        del self.run_begin[n:]
+
+    def _run_begin_array(self, arr: np.ndarray) -> np.ndarray:
+        offset = len(self.run_begin)
+        pre = np.empty(len(arr))
+        pre[0] = self.max.values[-1] if self.max.values else 0.0
+        pre[1:] = arr[:-1]
+        pos = np.arange(offset, offset + len(arr))
+        start = np.where(arr * pre > 0, -1, pos)
+        if offset and start[0] == -1:
+            start[0] = self.run_begin[-1]
+        return np.maximum.accumulate(start)
+
+    def same_sign_sum(self, pos: int, begin: int, end: int, peak: float, forward: bool) -> float:
+        """
+        在 [begin, end) 内从 pos 开始向后（forward）或向前，累加与 peak 同号的连续一段 |macd|，遇到异号或 0 停止
+        pos 超出区间时从区间的端点开始，与 Bi.cal_macd_half_* 跳过区间外 klu 的行为一致
+        """
+        values = self.max.values
+        if forward:
+            pos = max(pos, begin)
+            if pos >= end or values[pos] * peak <= 0:
+                return 0.0
+            stop = bisect_right(self.run_begin, self.run_begin[pos], pos, end)
+            return self.abs_sum.sum(pos, stop)
+        pos = min(pos, end - 1)
+        if pos < begin or values[pos] * peak <= 0:
+            return 0.0
+        return self.abs_sum.sum(max(self.run_begin[pos], begin), pos + 1)
+
+
+class KluMetricIndex:
+    def __init__(self, kl_list: 'Kline_List'):
+        self.kl_list = kl_list
+        self.macd_column: Optional[MacdColumn] = None
+        self.rsi_max: Optional[RangeExtreme] = None
+        self.rsi_min: Optional[RangeExtreme] = None
+        self.trade_sum: Dict[str, PrefixSum] = {}
+
+    def truncate(self, klu_cnt: int):
+        """去掉 klu_cnt 之后的部分，撤销临时加入的K线时用，见 Chan.rollback"""
+        if self.macd_column is not None:
+            self.macd_column.truncate(klu_cnt)
+        if self.rsi_max is not None:
+            self.rsi_max.truncate(klu_cnt)
+            self.rsi_min.truncate(klu_cnt)
+        for prefix in self.trade_sum.values():
+            prefix.truncate(klu_cnt)
+
+    def _new_values(self, name: str, start: int) -> List[float]:
+        """klu[start:] 的某个指标值"""
+        lazy_metric = self.kl_list.lazy_metric
+        if lazy_metric is not None and name in lazy_metric.declared:
+            return self.kl_list.metric_array(name)[name][start:].tolist()
+        klu_iter = self.kl_list.klu_iter_from(start)
+        if name == "macd":
+            return [klu.macd.macd for klu in klu_iter]
+        return [klu.rsi for klu in klu_iter]
+
+    def macd(self, end: int) -> MacdColumn:
+        """覆盖到 klu[:end] 的 macd 列"""
+        if self.macd_column is None:
+            self.macd_column = MacdColumn()
+        if len(self.macd_column) < end:
+            self.macd_column.extend(self._new_values("macd", len(self.macd_column)))
+        return self.macd_column
+
+    def macd_abs_sum(self, begin: int, end: int) -> float:
+        return self.macd(end).abs_sum.sum(begin, end)
+
+    def macd_max(self, begin: int, end: int) -> float:
+        return self.macd(end).max.query(begin, end)
+
+    def macd_min(self, begin: int, end: int) -> float:
+        return self.macd(end).min.query(begin, end)
+
+    def macd_same_sign_sum(self, pos: int, begin: int, end: int, peak: float, forward: bool) -> float:
+        return self.macd(end).same_sign_sum(pos, begin, end, peak, forward)
+
+    def _sync_rsi(self, end: int):
+        if self.rsi_max is None:
+            self.rsi_max = RangeExtreme(is_max=True)
+            self.rsi_min = RangeExtreme(is_max=False)
+        if len(self.rsi_max) < end:
+            values = self._new_values("rsi", len(self.rsi_max))
+            self.rsi_max.extend(values)
+            self.rsi_min.extend(values)
+
+    def rsi_range_max(self, begin: int, end: int) -> float:
+        self._sync_rsi(end)
+        return self.rsi_max.query(begin, end)
+
+    def rsi_range_min(self, begin: int, end: int) -> float:
+        self._sync_rsi(end)
+        return self.rsi_min.query(begin, end)
+
+    def trade_metric_sum(self, metric: str, begin: int, end: int) -> Optional[float]:
+        """成交量类指标的区间和，区间内有缺失值时返回 None"""
+        prefix = self.trade_sum.get(metric)
+        if prefix is None:
+            prefix = self.trade_sum[metric] = PrefixSum()
+        if len(prefix) < end:
+            prefix.extend(klu.trade_info.get(metric) for klu in self.kl_list.klu_iter_from(len(prefix)))
+        return prefix.sum(begin, end)
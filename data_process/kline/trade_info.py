@@ -1,13 +1,40 @@
-from typing import Dict, Optional
+from types import MappingProxyType
+from typing import Mapping, Optional
 
 from data_process.common.cenum import TRADE_INFO_LST
 
 
 class TradeInfo:
-    def __init__(self, info: Dict[str, float]):
-        self.metric: Dict[str, Optional[float]] = {}
+    # 每根K线一个，用 slots 代替 metric 字典，字段名即 TRADE_INFO_LST 中的名字
+    __slots__ = tuple(TRADE_INFO_LST)
+
+    def __init__(self, info: Mapping[str, float]):
+        for metric_name in TRADE_INFO_LST:
+            setattr(self, metric_name, info.get(metric_name))
+
+    @classmethod
+    def from_metric(cls, metric: Mapping[str, Optional[float]]) -> 'TradeInfo':
+        """metric 需已按 TRADE_INFO_LST 补全"""
+        trade_info = cls.__new__(cls)
         for metric_name in TRADE_INFO_LST:
-            self.metric[metric_name] = info.get(metric_name)
+            setattr(trade_info, metric_name, metric[metric_name])
+        return trade_info
+
+    @classmethod
+    def from_values(cls, *values: Optional[float]) -> 'TradeInfo':
+        """values 按 TRADE_INFO_LST 的顺序"""
+        trade_info = cls.__new__(cls)
+        for metric_name, value in zip(TRADE_INFO_LST, values):
+            setattr(trade_info, metric_name, value)
+        return trade_info
+
+    def get(self, metric_name: str) -> Optional[float]:
+        return getattr(self, metric_name)
+
+    @property
+    def metric(self) -> Mapping[str, Optional[float]]:
+        """按需生成的只读视图，写入会抛 TypeError；修改请直接设置属性，如 trade_info.volume = v"""
+        return MappingProxyType({metric_name: getattr(self, metric_name) for metric_name in TRADE_INFO_LST})
 
     def __str__(self):
         return " ".join([f"{metric_name}:{value}" for metric_name, value in self.metric.items()])
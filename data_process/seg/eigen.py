@@ -4,6 +4,8 @@ from data_process.common.cenum import BiDir, FxType
 
 
 class Eigen(KlineCombiner[Bi]):
+    __slots__ = ("gap",)
+
     def __init__(self, bi, _dir):
         super(Eigen, self).__init__(bi, _dir)
         self.gap = False
@@ -12,6 +12,11 @@ LINE_TYPE = TypeVar('LINE_TYPE', Bi, "CSeg")
 
 
 class Seg(Generic[LINE_TYPE]):
+    __slots__ = (
+        "idx", "begin_bi", "end_bi", "is_sure", "dir", "zs_lst", "eigen_fx", "seg_idx", "parent_seg", "pre", "next", "bsp",
+        "bi_list", "reason", "support_trend_line", "resistance_trend_line",
+    )
+
     def __init__(self, idx: int, begin_bi: LINE_TYPE, end_bi: LINE_TYPE, is_sure=True, seg_dir=None, reason="normal"):
         """
         初始化一个线段，需要提供线段的索引、起始笔、结束笔、是否确定、线段方向和原因。
@@ -11,14 +11,19 @@ class SegListChan(SegListComm):
         super(SegListChan, self).__init__(seg_config=seg_config, lv=lv)
 
     def do_init(self):
+        self.lst = self.lst[:self.kept_seg_cnt()]
+
+    def kept_seg_cnt(self) -> int:
         # 删除线段列表末尾的不确定线段
-        while len(self) and not self.lst[-1].is_sure:
-            self.lst = self.lst[:-1]
+        cnt = len(self)
+        while cnt and not self.lst[cnt-1].is_sure:
+            cnt -= 1
         # 如果列表中存在确定的线段，并且该线段的特征分型的第三元素包含不确定的笔，则需要重新计算，因为线段分型元素的高低点可能不对
-        if len(self):
-            assert self.lst[-1].eigen_fx and self.lst[-1].eigen_fx.ele[-1]
-            if not self.lst[-1].eigen_fx.ele[-1].lst[-1].is_sure:
-                self.lst = self.lst[:-1]
+        if cnt:
+            assert self.lst[cnt-1].eigen_fx and self.lst[cnt-1].eigen_fx.ele[-1]
+            if not self.lst[cnt-1].eigen_fx.ele[-1].lst[-1].is_sure:
+                cnt -= 1
+        return cnt
 
     def update(self, bi_lst: BiList):
         """
@@ -5,6 +5,7 @@ from data_process.bi.bi import Bi
 from data_process.bi.bi_list import BiList
 from data_process.common.cenum import BiDir, LeftSegMethod, SegType
 from data_process.common.chan_exception import ChanException, ErrCode
+from data_process.common.line_index import LineIndex
 
 from .seg import Seg
 from .seg_config import SegConfig
@@ -18,10 +19,15 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
         self.lv = lv
         self.do_init()
         self.config = seg_config
+        self._line_index = LineIndex()  # 作为上一级的“笔”时的区间查询
 
     def do_init(self):
         self.lst = []
 
+    def kept_seg_cnt(self) -> int:
+        """下一次 update 时保留的线段个数，之后的线段会被删掉重算（或者被修改）"""
+        return 0
+
     def __iter__(self):
         yield from self.lst
 
@@ -37,6 +43,11 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
     def __len__(self):
         return len(self.lst)
 
+    def line_index(self) -> LineIndex:
+        """线段的区间查询（计算线段的线段用），查询前先同步末尾的变化"""
+        self._line_index.sync(self.lst)
+        return self._line_index
+
     def left_bi_break(self, bi_lst: BiList):
         """
         检查最后一个确定线段之后的笔是否突破了该线段的最后一笔
@@ -44,11 +55,11 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
         if len(self) == 0:
             return False
         last_seg_end_bi = self[-1].end_bi
-        for bi in bi_lst[last_seg_end_bi.idx+1:]:
-            if last_seg_end_bi.is_up() and bi._high() > last_seg_end_bi._high():
-                return True
-            elif last_seg_end_bi.is_down() and bi._low() < last_seg_end_bi._low():
-                return True
+        index = bi_lst.line_index()
+        if last_seg_end_bi.is_up():
+            return index.high.query(last_seg_end_bi.idx+1, len(bi_lst)) > last_seg_end_bi._high()
+        elif last_seg_end_bi.is_down():
+            return index.low.query(last_seg_end_bi.idx+1, len(bi_lst)) < last_seg_end_bi._low()
         return False
 
     def collect_first_seg(self, bi_lst: BiList):
@@ -58,14 +69,15 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
         if len(bi_lst) < 3:
             return
         if self.config.left_method == LeftSegMethod.PEAK:
-            _high = max(bi._high() for bi in bi_lst)
-            _low = min(bi._low() for bi in bi_lst)
+            index = bi_lst.line_index()
+            _high = index.high.query(0, len(bi_lst))
+            _low = index.low.query(0, len(bi_lst))
             if abs(_high-bi_lst[0].get_begin_val()) >= abs(_low-bi_lst[0].get_begin_val()):
-                peak_bi = find_peak_bi(bi_lst, is_high=True)
+                peak_bi = find_peak_bi_in(bi_lst, 0, len(bi_lst), is_high=True)
                 assert peak_bi is not None
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BiDir.UP, split_first_seg=False, reason="0seg_find_high")
             else:
-                peak_bi = find_peak_bi(bi_lst, is_high=False)
+                peak_bi = find_peak_bi_in(bi_lst, 0, len(bi_lst), is_high=False)
                 assert peak_bi is not None
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BiDir.DOWN, split_first_seg=False, reason="0seg_find_low")
             self.collect_left_as_seg(bi_lst)
@@ -80,11 +92,11 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
         使用峰值方法收集剩余的线段
         """
         if last_seg_end_bi.is_down():
-            peak_bi = find_peak_bi(bi_lst[last_seg_end_bi.idx + 3:], is_high=True)
+            peak_bi = find_peak_bi_in(bi_lst, last_seg_end_bi.idx + 3, len(bi_lst), is_high=True)
             if peak_bi and peak_bi.idx - last_seg_end_bi.idx >= 3:
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BiDir.UP, reason="collectleft_find_high")
         else:
-            peak_bi = find_peak_bi(bi_lst[last_seg_end_bi.idx + 3:], is_high=False)
+            peak_bi = find_peak_bi_in(bi_lst, last_seg_end_bi.idx + 3, len(bi_lst), is_high=False)
             if peak_bi and peak_bi.idx - last_seg_end_bi.idx >= 3:
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BiDir.DOWN, reason="collectleft_find_low")
         last_seg_end_bi = self[-1].end_bi
@@ -100,11 +112,11 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
         if last_bi.idx-last_seg_end_bi.idx < 3:
             return
         if last_seg_end_bi.is_down() and last_bi.get_end_val() <= last_seg_end_bi.get_end_val():
-            if peak_bi := find_peak_bi(bi_lst[last_seg_end_bi.idx + 3:], is_high=True):
+            if peak_bi := find_peak_bi_in(bi_lst, last_seg_end_bi.idx + 3, len(bi_lst), is_high=True):
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BiDir.UP, reason="collectleft_find_high_force")
                 self.collect_left_seg(bi_lst)
         elif last_seg_end_bi.is_up() and last_bi.get_end_val() >= last_seg_end_bi.get_end_val():
-            if peak_bi := find_peak_bi(bi_lst[last_seg_end_bi.idx + 3:], is_high=False):
+            if peak_bi := find_peak_bi_in(bi_lst, last_seg_end_bi.idx + 3, len(bi_lst), is_high=False):
                 self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=BiDir.DOWN, reason="collectleft_find_low_force")
                 self.collect_left_seg(bi_lst)
         # 剩下线段的尾部相比于最后一个线段的尾部，高低关系和最后一个虚线段的方向一致
@@ -142,7 +154,7 @@ class SegListComm(Generic[SUB_LINE_TYPE]):
         尝试添加一个新的线段
         """
         if len(self) == 0 and split_first_seg and end_bi_idx >= 3:
-            if peak_bi := find_peak_bi(bi_lst[end_bi_idx - 3::-1], bi_lst[end_bi_idx].is_down()):
+            if peak_bi := find_peak_bi_in(bi_lst, 0, end_bi_idx - 2, bi_lst[end_bi_idx].is_down(), reverse=True):
                 if (peak_bi.is_down() and (peak_bi._low() < bi_lst[0]._low() or peak_bi.idx == 0)) or \
                    (peak_bi.is_up() and (peak_bi._high() > bi_lst[0]._high() or peak_bi.idx == 0)):  # 要比第一笔开头还高/低（因为没有比较到）
                     self.add_new_seg(bi_lst, peak_bi.idx, is_sure=False, seg_dir=peak_bi.dir, reason="split_first_1st")
@@ -193,3 +205,12 @@ def find_peak_bi(bi_lst: Union[BiList, List[Bi]], is_high):
             peak_val = bi.get_end_val()
             peak_bi = bi
     return peak_bi
+
+
+def find_peak_bi_in(bi_lst: Union[BiList, 'SegListComm'], begin: int, end: int, is_high, reverse=False):
+    """
+    等价于 find_peak_bi(bi_lst[begin:end], is_high)，reverse=True 时等价于倒序遍历这一段
+    用 bi_lst 的 LineIndex 做区间查询，不逐笔遍历
+    """
+    pos = bi_lst.line_index().find_peak(begin, end, is_high, prefer_last=not reverse)
+    return None if pos is None else bi_lst[pos]
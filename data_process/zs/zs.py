@@ -2,6 +2,7 @@ from typing import Generic, List, Optional, TypeVar
 
 from data_process.bi.bi import Bi
 from data_process.bsl_point.bs_point_config import PointConfig
+from data_process.common.cache import clean_memoize
 from data_process.common.chan_exception import ChanException, ErrCode
 from data_process.common.func_util import has_overlap
 from data_process.kline.kline_unit import Kline_Unit
@@ -11,6 +12,11 @@ LINE_TYPE = TypeVar('LINE_TYPE', Bi, "CSeg")
 
 
 class Zs(Generic[LINE_TYPE]):
+    __slots__ = (
+        "__is_sure", "__sub_zs_lst", "__begin", "__begin_bi", "__low", "__high", "__mid", "__end", "__end_bi",
+        "__peak_high", "__peak_low", "__bi_in", "__bi_out", "__bi_lst", "_memoize_cache",
+    )
+
     def __init__(self, lst: Optional[List[LINE_TYPE]], is_sure=True):
         # begin/end：永远指向 klu
         # low/high: 中枢的范围
@@ -42,7 +48,8 @@ class Zs(Generic[LINE_TYPE]):
         self.__bi_lst: List[LINE_TYPE] = []  # begin_bi~end_bi之间的笔，在update_zs_in_seg函数中更新
 
     def clean_cache(self):
-        self._memoize_cache = {}
+        # 进出中枢的笔、笔列表每次计算都会重新设置，没有缓存依赖它们，设置时不需要清缓存
+        clean_memoize(self)
 
     @property
     def is_sure(self): return self.__is_sure
@@ -239,14 +246,11 @@ class Zs(Generic[LINE_TYPE]):
     def set_bi_in(self, bi):
         """获取进入中枢的笔"""
         self.__bi_in = bi
-        self.clean_cache()
 
     def set_bi_out(self, bi):
         """设置离开中枢的笔"""
         self.__bi_out = bi
-        self.clean_cache()
 
     def set_bi_lst(self, bi_lst):
         """设置中枢内部的笔列表"""
         self.__bi_lst = bi_lst
-        self.clean_cache()
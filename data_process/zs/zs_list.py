@@ -10,6 +10,11 @@ from data_process.zs.zs_config import ZsConfig
 from .zs import Zs
 
 
+def zs_change_key(zs: Zs) -> tuple:
+    """中枢是否变化，第二项是起始笔的位置，见 update_zs_in_seg"""
+    return zs, zs.begin_bi.idx, zs.end_bi, zs.end, zs.low, zs.high, zs.peak_low, zs.peak_high, len(zs.sub_zs_lst)
+
+
 class ZsList:
     def __init__(self, zs_config=ZsConfig()):
         self.zs_lst: List[Zs] = []
@@ -25,7 +30,7 @@ class ZsList:
         self.last_sure_pos = -1
         if self.FORCE_CAL_ALL:
             return
-        for seg in seg_list[::-1]:
+        for seg in reversed(seg_list):
             if seg.is_sure:
                 self.last_sure_pos = seg.end_bi.get_begin_klu().idx
                 return
@@ -91,12 +96,21 @@ class ZsList:
         max_low = max(item._low() for item in lst)
         return Zs(lst, is_sure=is_sure) if min_high > max_low else None
 
-    def cal_bi_zs(self, bi_lst: Union[BiList, SegListComm], seg_lst: SegListComm):
-        """计算笔的中枢"""
+    def cal_bi_zs(self, bi_lst: Union[BiList, SegListComm], seg_lst: SegListComm, bi_dirty: int = 0, seg_dirty: int = 0):
+        """
+        计算笔的中枢
+        bi_dirty/seg_dirty: 笔、线段列表从哪个位置开始与上一次计算不同；
+        normal 算法里中枢只在同一线段内合并，没变的线段（笔也没变）里的中枢直接保留，不传时全部重算
+        """
         if self.config.zs_algo == "normal":
-            self.zs_lst = [zs for zs in self.zs_lst if zs.end.idx is not None and zs.end.idx <= self.last_sure_pos]
+            begin_seg_idx = self.first_dirty_seg(seg_lst, bi_dirty, seg_dirty)
+            if begin_seg_idx < len(seg_lst):
+                keep_before = seg_lst[begin_seg_idx].begin_bi.idx
+            else:
+                keep_before = seg_lst[-1].end_bi.idx+1 if len(seg_lst) else 0
+            self.zs_lst = self.zs_lst[:self.sure_zs_cnt(lambda zs: zs.begin_bi.idx < keep_before)]
 
-            for seg in seg_lst:
+            for seg in seg_lst[begin_seg_idx:]:
                 if not self.seg_need_cal(seg):
                     continue
                 self.clear_free_lst()
@@ -109,12 +123,27 @@ class ZsList:
                 self.add_zs_from_bi_range(bi_lst[seg_lst[-1].end_bi.idx+1:], revert_bi_dir(seg_lst[-1].dir), False)
         else:
             assert self.config.one_bi_zs is False
-            self.zs_lst = [zs for zs in self.zs_lst if zs.begin_bi.idx < self.last_sure_pos]
+            self.zs_lst = self.zs_lst[:self.sure_zs_cnt(lambda zs: zs.begin_bi.idx < self.last_sure_pos)]
             self.free_item_lst = []
             begin_bi_idx = self.zs_lst[-1].end_bi.idx+1 if self.zs_lst else 0
             for bi in bi_lst[begin_bi_idx:]:
                 self.update_overseg_zs(bi)
 
+    def sure_zs_cnt(self, is_sure) -> int:
+        """开头连续满足 is_sure 的中枢个数，中枢按位置排列，从末尾往前找"""
+        cnt = len(self.zs_lst)
+        while cnt > 0 and not is_sure(self.zs_lst[cnt-1]):
+            cnt -= 1
+        return cnt
+
+    @staticmethod
+    def first_dirty_seg(seg_lst: SegListComm, bi_dirty: int, seg_dirty: int) -> int:
+        """第一个变化了或者包含变化的笔的线段"""
+        idx = min(seg_dirty, len(seg_lst))
+        while idx > 0 and seg_lst[idx-1].end_bi.idx >= bi_dirty:
+            idx -= 1
+        return idx
+
     def update_overseg_zs(self, bi: Bi | Seg):
         """更新超过线段的中枢"""
         if len(self.zs_lst) and len(self.free_item_lst) == 0:
@@ -1,4 +1,3 @@
-import copy
 from typing import List
 
 from data_process.chan import Chan
@@ -35,8 +34,7 @@ if __name__ == "__main__":
         "triger_step": True,
     })
 
-    # 快照
-    chan_snapshot = Chan(
+    chan = Chan(
         code=code,
         data_src=data_src_type,
         lv_list=lv_list,
@@ -53,10 +51,10 @@ if __name__ == "__main__":
         klu_60m = combine_60m_klu_form_15m(klu_15m_lst_tmp)  # 合成60分钟K线
 
         """
-        拷贝一份chan_snapshot
-        如果是用序列化方式，这里可以采用pickle.load()
+        记下当前状态，加入还没走完的60分钟K线之后可以撤销
+        不需要每次 deepcopy 整个chan，开销只与这次变化的部分有关，与已有K线数量无关
         """
-        chan: Chan = copy.deepcopy(chan_snapshot)
+        chan.checkpoint()
         chan.trigger_load({LvType.K_60M: [klu_60m], LvType.K_15M: klu_15m_lst_tmp})
 
         """
@@ -69,11 +67,9 @@ if __name__ == "__main__":
         # 策略结束：
 
         if len(klu_15m_lst_tmp) == 4:  # 已经完成4根15分钟K线了，说明这个最新的60分钟K线和里面的4根15分钟K线在将来不会再变化
-            """
-            把当前完整chan重新保存成chan_snapshot
-            如果是序列化方式，这里可以采用pickle.dump()
-            """
-            chan_snapshot = chan
+            chan.commit()  # 保留
             klu_15m_lst_tmp = []  # 清空1分钟K线，用于下一个五分钟周期的合成
+        else:
+            chan.rollback()  # 撤销这次加入的K线，下一根15分钟K线来了之后重新合成
 
     BaostockFetcher.do_close()
@@ -0,0 +1,129 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import data_fetch.manager as fetchManager
+from common.const import AuType, DataField, LvType
+from common.func_util import parse_normal_date_str
+from data_fetch.abs_stock_api import AbsStockApi
+from data_fetch.bar_cache import BarCache
+
+
+class CountingFetcher(AbsStockApi):
+    """按日期区间返回K线，并统计一共返回了多少行"""
+    total_days = 100
+    factor = 1.0  # 模拟前复权因子
+    served = 0
+    init_cnt = 0
+    close_cnt = 0
+
+    def get_kl_data(self):
+        for i in range(self.total_days):
+            date = (datetime(2020, 1, 1) + timedelta(i)).strftime("%Y-%m-%d")
+            if (self.begin_date and date < self.begin_date) or (self.end_date and date > self.end_date):
+                continue
+            price = (100 + i) * self.factor
+            CountingFetcher.served += 1
+            yield {
+                DataField.FIELD_TIME: parse_normal_date_str(date),
+                DataField.FIELD_OPEN: price,
+                DataField.FIELD_HIGH: price + 1,
+                DataField.FIELD_LOW: price - 1,
+                DataField.FIELD_CLOSE: price,
+                DataField.FIELD_VOLUME: float(i),
+            }, False
+
+    @classmethod
+    def do_init(cls):
+        cls.init_cnt += 1
+
+    @classmethod
+    def do_close(cls):
+        cls.close_cnt += 1
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    CountingFetcher.total_days = 100
+    CountingFetcher.factor = 1.0
+    CountingFetcher.served = 0
+    CountingFetcher.init_cnt = 0
+    CountingFetcher.close_cnt = 0
+    return BarCache(str(tmp_path)).wrap("counting", CountingFetcher)
+
+
+def load(api_cls, end_date):
+    api = api_cls("000001", LvType.K_DAY, "2020-01-01", end_date, AuType.QFQ)
+    return list(api.get_kl_data())
+
+
+def test_cache_hit(fetcher):
+    first = load(fetcher, "2020-04-09")
+    assert len(first) == 100 and CountingFetcher.served == 100
+    second = load(fetcher, "2020-04-09")
+    assert CountingFetcher.served == 100
+    assert CountingFetcher.init_cnt == 1
+    assert [str(kl[DataField.FIELD_TIME]) for kl, _ in second] == [str(kl[DataField.FIELD_TIME]) for kl, _ in first]
+    assert [kl[DataField.FIELD_CLOSE] for kl, _ in second] == [kl[DataField.FIELD_CLOSE] for kl, _ in first]
+    assert len(load(fetcher, "2020-02-09")) == 40
+    assert CountingFetcher.served == 100
+
+
+def test_delta_fetch(fetcher):
+    CountingFetcher.total_days = 90
+    load(fetcher, "2020-03-30")
+    assert CountingFetcher.served == 90
+    CountingFetcher.total_days = 100
+    res = load(fetcher, "2020-04-09")
+    # 只拉取了倒数第二根之后的数据
+    assert CountingFetcher.served == 90 + 12
+    assert len(res) == 100
+    assert [kl[DataField.FIELD_VOLUME] for kl, _ in res] == [float(i) for i in range(100)]
+    load(fetcher, "2020-04-09")
+    assert CountingFetcher.served == 102
+
+
+def test_save_keeps_mapped_cache(fetcher):
+    """重写缓存时，之前内存映射读出来的数据不受影响"""
+    CountingFetcher.total_days = 90
+    load(fetcher, "2020-03-30")
+    api = fetcher("000001", LvType.K_DAY, "2020-01-01", None, AuType.QFQ)
+    mapped = api.cached
+    CountingFetcher.factor = 0.5
+    api.fetch_all(api.new_api("2020-01-01", None))
+    assert mapped.columns[DataField.FIELD_CLOSE].tolist() == [100.0 + i for i in range(90)]
+    assert not any(name.endswith(".tmp") for name in os.listdir(api.key_dir))
+    reloaded = api.cache.load(api.key_dir, api.cache.load_meta(api.key_dir))
+    assert reloaded.columns[DataField.FIELD_CLOSE].tolist() == [(100 + i) * 0.5 for i in range(90)]
+
+
+def test_refetch_when_adjust_changed(fetcher):
+    CountingFetcher.total_days = 90
+    load(fetcher, "2020-03-30")
+    CountingFetcher.total_days = 100
+    CountingFetcher.factor = 0.5
+    res = load(fetcher, "2020-04-09")
+    assert CountingFetcher.served == 90 + 12 + 100
+    assert [kl[DataField.FIELD_CLOSE] for kl, _ in res] == [(100 + i) * 0.5 for i in range(100)]
+
+
+def test_session_and_lazy_close(tmp_path, monkeypatch, fetcher):
+    monkeypatch.setattr(fetchManager, "get_stock_api", lambda src: CountingFetcher)
+    cache = BarCache(str(tmp_path / "session"))
+
+    def process(api_cls):
+        # 和 Chan.load 一样是生成器，迭代时才读取数据
+        for code in ["000001", "000002"]:
+            yield len(list(api_cls(code, LvType.K_DAY, "2020-01-01", "2020-04-09", AuType.QFQ).get_kl_data()))
+            assert CountingFetcher.close_cnt == 0
+
+    # 未命中缓存时延迟初始化，迭代完才关闭
+    assert list(fetchManager.fetch_data("counting", process, cache=cache)) == [100, 100]
+    assert (CountingFetcher.init_cnt, CountingFetcher.close_cnt) == (1, 1)
+
+    # open_session 之后不再逐个代码初始化和关闭
+    monkeypatch.setattr(fetchManager, "_session_src", {"counting"})
+    for code in ["000003", "000004"]:
+        fetchManager.fetch_data("counting", lambda api_cls: list(api_cls(code, LvType.K_DAY, "2020-01-01", "2020-04-09", AuType.QFQ).get_kl_data()), cache=cache)
+    assert (CountingFetcher.init_cnt, CountingFetcher.close_cnt) == (1, 1)
@@ -0,0 +1,75 @@
+import shutil
+
+import numpy as np
+
+from biz.batch import BatchTask, main, run_batch, share_bars
+from common.const import DataField, LvType
+from data_fetch.fetchers.local_fetcher import LocalFetcher
+from data_fetch.kl_columns import KlColumns
+from data_fetch.manager import DataSrc
+from data_fetch.shared_bars import SharedBars
+
+
+def test_run_batch_local(tmp_path):
+    for code in ["a", "b", "c"]:
+        shutil.copy(LocalFetcher.data_path, tmp_path / f"{code}.csv")
+    task = BatchTask(
+        lv_list=[LvType.K_DAY],
+        config={"print_warning": False},
+        data_src=DataSrc.LOCAL,
+        fetcher_attrs={"data_path": str(tmp_path), "max_rows": 2000},
+    )
+    progress = []
+    res = list(run_batch(["a", "b", "missing", "c"], task, max_workers=2, chunk_size=1, on_progress=lambda done, total, _: progress.append((done, total))))
+
+    assert progress == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    res_dict = {r.code: r for r in res}
+    assert not res_dict["missing"].ok and "can not find local data" in res_dict["missing"].error
+    assert all(res_dict[code].ok for code in ["a", "b", "c"])
+    assert res_dict["a"].data == res_dict["c"].data
+    assert res_dict["a"].data["K_DAY"]["bsp"]
+    assert res_dict["a"].data["K_DAY"]["last_seg"] is not None
+
+
+def test_cli(tmp_path):
+    output = tmp_path / "res.jsonl"
+    assert main(["--codes", "x,y", "--src", "GENERATE", "--workers", "1", "--config", '{"print_warning": false}', "--output", str(output)]) == 0
+    assert len(output.read_text().splitlines()) == 2
+
+
+def test_run_batch_shared_bars(tmp_path):
+    default_path = LocalFetcher.data_path
+    for code in ["a", "b"]:
+        shutil.copy(LocalFetcher.data_path, tmp_path / f"{code}.csv")
+    task = BatchTask(
+        lv_list=[LvType.K_DAY],
+        config={"print_warning": False},
+        data_src=DataSrc.LOCAL,
+        fetcher_attrs={"data_path": str(tmp_path), "max_rows": 2000},
+    )
+    expected = {r.code: r.data for r in run_batch(["a", "b"], task, max_workers=1)}
+    # 单进程计算和 share_bars 结束后还原 fetcher_attrs 覆盖的类属性
+    assert (LocalFetcher.data_path, LocalFetcher.max_rows) == (default_path, None)
+    with share_bars(["a", "b", "missing"], task) as bars:
+        task.shared_bars = bars.handle
+        res = {r.code: r for r in run_batch(["a", "b", "missing"], task, max_workers=2, chunk_size=1)}
+        assert LocalFetcher.data_path == default_path
+    assert {code: res[code].data for code in ["a", "b"]} == expected
+    assert not res["missing"].ok
+
+
+def test_shared_bars_segments():
+    columns = KlColumns.from_arrays(np.arange(100) * 86400, np.ones(100), np.ones(100) * 2, np.zeros(100), np.ones(100), volume=np.arange(100.0))
+    with SharedBars.create(segment_size=6000) as bars:
+        bars.add("a", LvType.K_DAY, columns)
+        bars.add("b", LvType.K_DAY, columns.slice(0, 10))
+        bars.add("c", LvType.K_DAY, columns.slice(0, 50))
+        assert len(bars.handle.shm_names) == 2  # 放不下时新开一段
+        worker = SharedBars.attach(bars.handle)
+        res = worker.get("c", LvType.K_DAY)
+        assert res.time.tolist() == columns.time[:50].tolist()
+        assert res.columns[DataField.FIELD_VOLUME].tolist() == list(range(50))
+        assert DataField.FIELD_TURNOVER not in res.columns
+        assert worker.get("a", LvType.K_60M) is None
+        del res
+        worker.close()
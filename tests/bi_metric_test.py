@@ -0,0 +1,111 @@
+import random
+
+import numpy as np
+import pytest
+
+from common.const import DataField, LvType
+from common.time import Time
+from data_process.chan_config import ChanConfig
+from data_process.common.cenum import MacdAlgo
+from data_process.common.range_index import PrefixSum, RangeExtreme
+from data_process.kline.kline_list import Kline_List
+from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
+
+
+def test_range_extreme_matches_scan():
+    rng = random.Random(5)
+    index_max, index_min, prefix = RangeExtreme(is_max=True), RangeExtreme(is_max=False), PrefixSum()
+    values = []
+    for step in range(3000):
+        op = rng.random()
+        if op < 0.1 and values:
+            values.pop()
+            index_max.pop()
+            index_min.pop()
+            prefix.pop()
+        elif op < 0.2 and values:
+            values[-1] = rng.uniform(-1, 1)
+            index_max.set_last(values[-1])
+            index_min.set_last(values[-1])
+            prefix.pop()
+            prefix.append(values[-1])
+        elif op < 0.22:
+            new = [rng.uniform(-1, 1) for _ in range(rng.randint(1, 300))]
+            values.extend(new)
+            index_max.extend(new)
+            index_min.extend(new)
+            prefix.extend(new)
+        else:
+            values.append(rng.uniform(-1, 1))
+            index_max.append(values[-1])
+            index_min.append(values[-1])
+            prefix.append(values[-1])
+        if step % 7 == 0 and values:
+            b = rng.randrange(len(values))
+            e = rng.randint(b + 1, len(values))
+            assert index_max.query(b, e) == max(values[b:e])
+            assert index_min.query(b, e) == min(values[b:e])
+            assert prefix.sum(b, e) == pytest.approx(sum(values[b:e]))
+    assert index_max.query(3, 3) == float("-inf")
+
+
+def naive_metric(bi, macd_algo):
+    klu_lst = [klu for klc in bi.klc_lst for klu in klc.lst]
+    macd = [klu.macd.macd for klu in klu_lst]
+    if macd_algo == MacdAlgo.FULL_AREA:
+        return 1e-7 + sum(abs(m) for m in macd)
+    if macd_algo == MacdAlgo.PEAK:
+        return max([1e-7] + [-m for m in macd] if bi.is_down() else [1e-7] + macd)
+    if macd_algo == MacdAlgo.DIFF:
+        return max(macd) - min(macd)
+    if macd_algo == MacdAlgo.RSI:
+        rsi = [klu.rsi for klu in klu_lst]
+        return 10000.0 / (min(rsi) + 1e-7) if bi.is_down() else max(rsi)
+    if macd_algo == MacdAlgo.AREA:
+        res = []
+        for peak_klu, seq in [(bi.get_begin_klu(), klu_lst), (bi.get_end_klu(), klu_lst[::-1])]:
+            _s = 1e-7
+            for klu in seq:
+                if (klu.idx < peak_klu.idx) if seq is klu_lst else (klu.idx > peak_klu.idx):
+                    continue
+                if klu.macd.macd * peak_klu.macd.macd <= 0:
+                    break
+                _s += abs(klu.macd.macd)
+            res.append(_s)
+        return res
+    field, cal_avg = {
+        MacdAlgo.VOLUMN: (DataField.FIELD_VOLUME, False),
+        MacdAlgo.VOLUMN_AVG: (DataField.FIELD_VOLUME, True),
+        MacdAlgo.AMOUNT: (DataField.FIELD_TURNOVER, False),
+    }[macd_algo]
+    trade = [klu.trade_info.get(field) for klu in klu_lst]
+    if None in trade:
+        return 0.0
+    return sum(trade) / bi.get_klu_cnt() if cal_avg else sum(trade)
+
+
+def make_kl_list(triger_step, n=2000):
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    spread = rng.uniform(0.1, 2, (n, 2))
+    kl_list = Kline_List(LvType.K_DAY, ChanConfig({"cal_rsi": True, "triger_step": triger_step}))
+    kl_list.begin_batch()
+    for idx, (c, (up, down), volume) in enumerate(zip(close.tolist(), spread.tolist(), rng.uniform(30, 100, n).tolist())):
+        klu = Kline_Unit.from_fields(Time(2000 + idx // 300, idx % 300 // 25 + 1, idx % 25 + 1, 0, 0), c, c + up, c - down, c, TradeInfo({DataField.FIELD_VOLUME: volume}))
+        klu.set_idx(idx)
+        kl_list.add_single_klu(klu)
+    kl_list.cal_seg_and_zs()
+    return kl_list
+
+
+@pytest.mark.parametrize("triger_step", [False, True])
+def test_bi_metric_matches_naive(triger_step):
+    bi_list = make_kl_list(triger_step).bi_list
+    assert len(bi_list) > 10
+    algos = [MacdAlgo.FULL_AREA, MacdAlgo.PEAK, MacdAlgo.DIFF, MacdAlgo.RSI, MacdAlgo.VOLUMN, MacdAlgo.VOLUMN_AVG, MacdAlgo.AMOUNT]
+    for bi in bi_list:
+        for macd_algo in algos:
+            assert bi.cal_macd_metric(macd_algo, is_reverse=False) == pytest.approx(naive_metric(bi, macd_algo), rel=1e-9), (bi.idx, macd_algo)
+        half = [bi.cal_macd_metric(MacdAlgo.AREA, is_reverse=is_reverse) for is_reverse in [False, True]]
+        assert half == pytest.approx(naive_metric(bi, MacdAlgo.AREA), rel=1e-9)
@@ -0,0 +1,56 @@
+from data_process.common import cache
+from data_process.common.cache import clean_memoize, memoize
+
+
+class Line:
+    __slots__ = ("begin", "end", "calls", "_memoize_cache")
+
+    def __init__(self, begin, end):
+        self.begin, self.end = begin, end
+        self.calls = []
+        self._memoize_cache = None
+
+    @memoize("begin")
+    def begin_val(self):
+        self.calls.append("begin")
+        return self.begin
+
+    @memoize("end")
+    def end_val(self):
+        self.calls.append("end")
+        return self.end
+
+    @memoize()
+    def amp(self):
+        self.calls.append("amp")
+        return self.end - self.begin
+
+
+def test_selective_invalidation():
+    line = Line(1, 5)
+    assert (line.begin_val(), line.end_val(), line.amp()) == (1, 5, 4)
+    assert (line.begin_val(), line.end_val(), line.amp()) == (1, 5, 4)
+    assert line.calls == ["begin", "end", "amp"]
+
+    line.end = 8
+    memo = line._memoize_cache
+    clean_memoize(line, "end")
+    assert line._memoize_cache is memo and list(memo) == [Line.begin_val.__qualname__]  # 原地删除
+    assert (line.begin_val(), line.end_val(), line.amp()) == (1, 8, 7)
+    assert line.calls == ["begin", "end", "amp", "end", "amp"]
+
+    line.begin = 0
+    clean_memoize(line)
+    assert line.begin_val() == 0 and line.calls[-1] == "begin"
+
+
+def test_stats():
+    cache.enable_stats()
+    try:
+        line = Line(1, 5)
+        for _ in range(3):
+            line.end_val()
+        assert cache.get_stats()[Line.end_val.__qualname__] == (2, 1)
+    finally:
+        cache.disable_stats()
+    assert cache.get_stats() == {}
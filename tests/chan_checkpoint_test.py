@@ -0,0 +1,177 @@
+import copy
+import random
+import sys
+
+import numpy as np
+import pytest
+
+from common.const import LvType
+from common.time import Time
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.common.chan_exception import ChanException
+from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
+
+
+def make_bars(n, seed=5):
+    """(time, open, high, low, close)，每天 16 根 15 分钟K线，9:45 ~ 11:30、13:15 ~ 15:00"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    spread = rng.uniform(0.05, 1, (n, 2))
+    bars = []
+    for idx, (c, (up, down)) in enumerate(zip(close.tolist(), spread.tolist())):
+        day, pos = divmod(idx, 16)
+        minute = 9 * 60 + 45 + pos * 15 + (90 if pos >= 8 else 0)
+        t = Time(2000 + day // 300, day % 300 // 25 + 1, day % 25 + 1, minute // 60, minute % 60)
+        bars.append((t, c, c + up, c - down, c))
+    return bars
+
+
+def new_klu(bar):
+    t, _open, high, low, close = bar
+    return Kline_Unit.from_fields(t, _open, high, low, close, TradeInfo({}))
+
+
+def combine(bars):
+    return bars[-1][0], bars[0][1], max(bar[2] for bar in bars), min(bar[3] for bar in bars), bars[-1][4]
+
+
+def summary(chan: Chan):
+    res = []
+    for kl_list in chan.kl_datas.values():
+        res.append((
+            [(klc.idx, klc.high, klc.low, klc.fx, len(klc.lst)) for klc in kl_list],
+            [(bi.idx, bi.seg_idx, bi.is_sure, bi.get_end_klu().idx, len(bi.klc_lst)) for bi in kl_list.bi_list],
+            [(seg.end_bi.idx, seg.is_sure, [(zs.begin_bi.idx, zs.end_bi.idx) for zs in seg.zs_lst]) for seg in kl_list.seg_list],
+            [(zs.bi_in and zs.bi_in.idx, zs.bi_out and zs.bi_out.idx) for zs in kl_list.zs_list],
+            [(bsp.klu.idx, bsp.type2str()) for bsp in kl_list.bs_point_lst],
+            [(seg.end_bi.idx, seg.is_sure) for seg in kl_list.segseg_list],
+            [klu.macd.macd for klu in kl_list.klu_iter()][-20:],
+            [len(klu.sub_kl_list) for klu in kl_list.klu_iter()][-20:],
+            kl_list.store.klu_cnt, kl_list.store.klc_cnt,
+        ))
+    return res
+
+
+def new_chan(conf):
+    return Chan("test", data_src=None, lv_list=[LvType.K_60M, LvType.K_15M], config=ChanConfig(dict(conf)))  # ChanConfig 会消耗传入的字典
+
+
+def replay(conf, bars, use_checkpoint: bool):
+    """strategy_demo3 的用法：每根 15 分钟K线都带上未走完的 60 分钟K线算一次，走完 4 根之后才真正加入"""
+    chan = new_chan(conf)
+    res = []
+    cur, cur_klu = [], []
+    for bar in bars:
+        cur.append(bar)
+        cur_klu.append(new_klu(bar))  # 同一根 15 分钟K线会重复加入，与 strategy_demo3 一致
+        inp = {LvType.K_60M: [new_klu(combine(cur))], LvType.K_15M: list(cur_klu)}
+        if use_checkpoint:
+            chan.checkpoint()
+            chan.trigger_load(inp)
+            res.append(summary(chan))
+            if len(cur) == 4:
+                chan.commit()
+            else:
+                chan.rollback()
+        else:
+            tmp = copy.deepcopy(chan)
+            tmp.trigger_load(inp)
+            res.append(summary(tmp))
+            if len(cur) == 4:
+                chan = tmp
+        if len(cur) == 4:
+            cur, cur_klu = [], []
+    return res, summary(chan)
+
+
+@pytest.mark.parametrize("conf", [
+    {"triger_step": True, "kl_data_check": False},
+    {"triger_step": True, "kl_data_check": False, "cal_demark": True, "cal_rsi": True, "cal_kdj": True, "zs_algo": "over_seg"},
+])
+def test_rollback_matches_deepcopy(conf):
+    bars = make_bars(200)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(20000)  # deepcopy 整个 Chan 递归很深
+    try:
+        expected = replay(conf, bars, use_checkpoint=False)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert replay(conf, bars, use_checkpoint=True) == expected
+
+
+def test_provisional_restores_state():
+    conf = {"triger_step": True, "kl_data_check": False}
+    bars = make_bars(800)
+    chan = new_chan(conf)
+    rng = random.Random(1)
+    for idx in range(0, 400, 4):
+        chan.trigger_load({LvType.K_60M: [new_klu(combine(bars[idx:idx+4]))], LvType.K_15M: [new_klu(bar) for bar in bars[idx:idx+4]]})
+    before = summary(chan)
+    for idx in range(400, 800, 4):
+        with chan.provisional():
+            # 随便改动未完成的K线，包括大幅突破前面的高低点
+            forming = [(t, o, h + rng.uniform(0, 20), l - rng.uniform(0, 20), c) for t, o, h, l, c in bars[idx:idx+rng.randint(1, 4)]]
+            chan.trigger_load({LvType.K_60M: [new_klu(combine(forming))], LvType.K_15M: [new_klu(bar) for bar in forming]})
+        assert summary(chan) == before
+        chan.trigger_load({LvType.K_60M: [new_klu(combine(bars[idx:idx+4]))], LvType.K_15M: [new_klu(bar) for bar in bars[idx:idx+4]]})
+        before = summary(chan)
+
+    expected = new_chan(conf)
+    for idx in range(0, 800, 4):
+        expected.trigger_load({LvType.K_60M: [new_klu(combine(bars[idx:idx+4]))], LvType.K_15M: [new_klu(bar) for bar in bars[idx:idx+4]]})
+    assert summary(chan) == summary(expected)
+
+
+def test_checkpoint_misuse():
+    chan = new_chan({"triger_step": True, "kl_data_check": False})
+    with pytest.raises(ChanException):
+        chan.rollback()
+    chan.checkpoint()
+    with pytest.raises(ChanException):
+        chan.checkpoint()
+    chan.commit()
+    with pytest.raises(ChanException):
+        chan.commit()
+
+
+def ticks(bar, rng, cnt):
+    """一根K线走完之前的 cnt 个中间状态，最后一个就是 bar 本身"""
+    t, _open, high, low, close = bar
+    res = []
+    for _ in range(cnt - 1):
+        c = rng.uniform(low, high)
+        res.append((t, _open, max(_open, c) + rng.uniform(0, 3), min(_open, c) - rng.uniform(0, 3), c))  # 中间可能超出最终的高低点
+    return res + [bar]
+
+
+@pytest.mark.parametrize("conf", [
+    {"triger_step": True, "kl_data_check": False},
+    {"triger_step": True, "kl_data_check": False, "cal_demark": True, "cal_rsi": True, "zs_algo": "over_seg"},
+])
+def test_update_last_bar(conf):
+    bars = make_bars(600)
+    rng = random.Random(3)
+    chan = new_chan(conf)
+    for idx in range(0, 400, 4):
+        chan.trigger_load({LvType.K_60M: [new_klu(combine(bars[idx:idx+4]))], LvType.K_15M: [new_klu(bar) for bar in bars[idx:idx+4]]})
+    for idx in range(400, 600):
+        group_begin = idx - idx % 4
+        for tick in ticks(bars[idx], rng, rng.randint(1, 4)):
+            forming = combine(bars[group_begin:idx] + [tick])
+            chan.update_last_bar(LvType.K_60M, new_klu((bars[group_begin + 3][0],) + forming[1:]))  # 用这个小时结束的时间
+            chan.update_last_bar(LvType.K_15M, new_klu(tick))
+        if idx % 40 == 39:
+            # 与从头逐根加入走完的K线的结果一致
+            expected = new_chan(conf)
+            for begin in range(0, idx + 1, 4):
+                expected.trigger_load({LvType.K_60M: [new_klu(combine(bars[begin:idx+1][:4]))], LvType.K_15M: [new_klu(bar) for bar in bars[begin:idx+1][:4]]})
+            assert summary(chan) == summary(expected)
+    assert [len(klu.sub_kl_list) for klu in chan[0].klu_iter()][-5:] == [4] * 5
+    assert all(klu.sup_kl is parent for parent in chan[0].klu_iter() for klu in parent.sub_kl_list)
+
+    more = make_bars(604)[600:]
+    chan.trigger_load({LvType.K_60M: [new_klu(combine(more))], LvType.K_15M: [new_klu(bar) for bar in more]})  # 之后还可以继续 trigger_load
+    with pytest.raises(ChanException):
+        chan.update_last_bar(LvType.K_15M, new_klu(more[-1]))  # 已经确定的K线不能再替换
@@ -0,0 +1,47 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from common.const import DataField, LvType
+from data_fetch.manager import DataSrc
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+
+
+def chan_summary(chan: Chan):
+    kl_list = chan[0]
+    return (
+        [(klc.idx, klc.high, klc.low, klc.fx) for klc in kl_list],
+        [(bi.begin_klc.idx, bi.end_klc.idx, bi.is_sure) for bi in kl_list.bi_list],
+        [(seg.begin_bi.idx, seg.end_bi.idx, seg.is_sure) for seg in kl_list.seg_list],
+        [(bsp.klu.idx, bsp.type2str()) for bsp in chan.get_bsp()],
+    )
+
+
+def test_from_arrays_same_as_fetcher():
+    random.seed(1)
+    np.random.seed(1)
+    chan = Chan(code="random", data_src=DataSrc.GENERATE, lv_list=[LvType.K_DAY], config=ChanConfig())
+    klu_lst = list(chan[0].klu_iter())
+    arrays = {
+        DataField.FIELD_TIME: [klu.time for klu in klu_lst],
+        DataField.FIELD_OPEN: np.array([klu.open for klu in klu_lst]),
+        DataField.FIELD_HIGH: np.array([klu.high for klu in klu_lst]),
+        DataField.FIELD_LOW: np.array([klu.low for klu in klu_lst]),
+        DataField.FIELD_CLOSE: np.array([klu.close for klu in klu_lst]),
+        DataField.FIELD_VOLUME: np.array([klu.trade_info.metric[DataField.FIELD_VOLUME] for klu in klu_lst]),
+    }
+    chan_arr = Chan.from_arrays("random", {LvType.K_DAY: arrays})
+    assert chan_summary(chan_arr) == chan_summary(chan)
+    assert [str(klu.time) for klu in chan_arr[0].klu_iter()] == [str(klu.time) for klu in klu_lst]
+
+    df = pd.DataFrame({
+        "date": pd.to_datetime([klu.time.to_str() for klu in klu_lst]),
+        "open": arrays[DataField.FIELD_OPEN],
+        "high": arrays[DataField.FIELD_HIGH],
+        "low": arrays[DataField.FIELD_LOW],
+        "close": arrays[DataField.FIELD_CLOSE],
+        "volume": arrays[DataField.FIELD_VOLUME],
+    })
+    assert chan_summary(Chan.from_dataframe("random", df)) == chan_summary(chan)
@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import biz.chan_state as chan_state
+from biz.chan_state import ChanStateStore, load_chan_incremental
+from common.const import AuType, LvType
+from data_fetch.fetchers.local_fetcher import LocalFetcher
+from data_fetch.manager import DataSrc
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+
+
+def make_df(n, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    spread = rng.uniform(0.1, 2, (n, 2))
+    return pd.DataFrame({
+        "time_key": pd.bdate_range("2010-01-04", periods=n).strftime("%Y-%m-%d"),
+        "open": close,
+        "high": close + spread[:, 0],
+        "low": close - spread[:, 1],
+        "close": close,
+    })
+
+
+def summary(chan: Chan):
+    kl_list = chan[0]
+    return (
+        [(bi.idx, bi.is_sure, bi.get_begin_klu().idx, bi.get_end_klu().idx) for bi in kl_list.bi_list],
+        [(seg.begin_bi.idx, seg.end_bi.idx, seg.is_sure) for seg in kl_list.seg_list],
+        [(zs.begin_bi.idx, zs.end_bi.idx, zs.high, zs.low) for zs in kl_list.zs_list],
+        sorted((bsp.klu.idx, bsp.type2str()) for bsp in kl_list.bs_point_lst),  # 增量计算时已确定的买卖点在前
+        [round(klu.macd.macd, 9) for klu in kl_list.klu_iter()],
+    )
+
+
+def full_chan(conf):
+    chan = Chan("600000", data_src=DataSrc.LOCAL, lv_list=[LvType.K_DAY], config=ChanConfig(dict(conf)))
+    if conf.get("triger_step"):
+        for _ in chan.step_load():
+            ...
+    return chan
+
+
+@pytest.mark.parametrize("conf", [{}, {"triger_step": True, "zs_algo": "over_seg"}])
+def test_incremental_matches_full(tmp_path, monkeypatch, conf):
+    monkeypatch.setattr(LocalFetcher, "data_path", str(tmp_path))
+    store = ChanStateStore(str(tmp_path / "state"))
+    df = make_df(900)
+
+    def run(rows):
+        df.iloc[:rows].to_csv(tmp_path / "600000_K_DAY.csv", index=False)
+        return load_chan_incremental(store, "600000", [LvType.K_DAY], conf, data_src=DataSrc.LOCAL)
+
+    build_chan = chan_state.build_chan
+    built = []
+    monkeypatch.setattr(chan_state, "build_chan", lambda *args: built.append(args) or build_chan(*args))
+
+    assert summary(run(600)) == summary(full_chan(conf))
+    assert len(built) == 1
+    path = store.state_path(DataSrc.LOCAL, "600000", [LvType.K_DAY], AuType.QFQ, None, conf)
+    assert os.path.exists(path) and not [name for name in os.listdir(os.path.dirname(path)) if name.endswith(".tmp")]
+
+    for rows in (601, 640, 900):  # 每次只加入新的K线
+        assert summary(run(rows)) == summary(full_chan(conf))
+    assert len(built) == 1
+
+    # 复权价格变了，整个重新计算
+    df[["open", "high", "low", "close"]] *= 0.9
+    assert summary(run(900)) == summary(full_chan(conf))
+    assert len(built) == 2
+
+    # 配置变了不会用到旧状态
+    load_chan_incremental(store, "600000", [LvType.K_DAY], dict(conf, bi_strict=False), data_src=DataSrc.LOCAL)
+    assert len(built) == 3
+
+
+def make_30m_df(n_days, seed=7):
+    """n_days 个交易日的30分钟线（10:00-11:30, 13:30-15:00），以及由它合成的日线"""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range("2015-01-05", periods=n_days)
+    offsets = pd.to_timedelta(["10:00:00", "10:30:00", "11:00:00", "11:30:00", "13:30:00", "14:00:00", "14:30:00", "15:00:00"])
+    times = [day + offset for day in days for offset in offsets]
+    close = 100 + np.cumsum(rng.normal(0, 0.5, len(times)))
+    spread = rng.uniform(0.05, 1, (len(times), 2))
+    sub = pd.DataFrame({"time_key": times, "open": close, "high": close + spread[:, 0], "low": close - spread[:, 1], "close": close})
+    day = sub.groupby(sub["time_key"].dt.normalize()).agg({"open": "first", "high": "max", "low": "min", "close": "last"}).reset_index()
+    sub["time_key"] = sub["time_key"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    day["time_key"] = day["time_key"].dt.strftime("%Y-%m-%d")
+    return day, sub
+
+
+def test_incremental_multi_level(tmp_path, monkeypatch):
+    monkeypatch.setattr(LocalFetcher, "data_path", str(tmp_path))
+    lv_list = [LvType.K_DAY, LvType.K_30M]
+    conf = {"print_warning": False}
+    store = ChanStateStore(str(tmp_path / "state"))
+    day, sub = make_30m_df(160)
+
+    def write(n_days):
+        day.iloc[:n_days].to_csv(tmp_path / "600000_K_DAY.csv", index=False)
+        sub.iloc[:n_days * 8].to_csv(tmp_path / "600000_K_30M.csv", index=False)
+
+    def multi_summary(chan: Chan):
+        res = []
+        for lv in lv_list:
+            kl_list = chan[lv]
+            res.append((
+                [(klu.time.to_str(), klu.close) for klu in kl_list.klu_iter()],
+                [(bi.get_begin_klu().idx, bi.get_end_klu().idx, bi.is_sure) for bi in kl_list.bi_list],
+                [(seg.begin_bi.idx, seg.end_bi.idx, seg.is_sure) for seg in kl_list.seg_list],
+                sorted((bsp.klu.idx, bsp.type2str()) for bsp in kl_list.bs_point_lst),
+            ))
+        # 每根次级别K线挂在所在日期的日线上
+        res.append([(klu.time.to_str(), klu.sup_kl.time.to_str()) for klu in chan[LvType.K_30M].klu_iter()])
+        return res
+
+    build_chan = chan_state.build_chan
+    built = []
+    monkeypatch.setattr(chan_state, "build_chan", lambda *args: built.append(args) or build_chan(*args))
+    for n_days in (100, 101, 130, 160):
+        write(n_days)
+        chan = load_chan_incremental(store, "600000", lv_list, conf, data_src=DataSrc.LOCAL)
+        full = Chan("600000", data_src=DataSrc.LOCAL, lv_list=list(lv_list), config=ChanConfig(dict(conf)))
+        assert [chan[lv].klu_cnt for lv in lv_list] == [n_days, n_days * 8]
+        assert multi_summary(chan) == multi_summary(full)
+        assert chan.kl_misalign_cnt == full.kl_misalign_cnt == 0
+    assert len(built) == 1
@@ -0,0 +1,61 @@
+import threading
+
+import numpy as np
+
+from data_process.calculate.demark import DemarkEngine
+
+CONFIGS = [
+    {},
+    {"demark_len": 5, "setup_bias": 2, "countdown_bias": 1, "max_countdown": 8, "tiaokong_st": False},
+    {"setup_cmp2close": False, "countdown_cmp2close": False},
+]
+
+
+def make_bars(n=3000, seed=2):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    return list(zip(range(n), close.tolist(), (close + rng.uniform(0, 1, n)).tolist(), (close - rng.uniform(0, 1, n)).tolist()))
+
+
+def run(engine, bars):
+    return [[(x["type"], x["dir"], x["idx"]) for x in engine.update(*bar).data] for bar in bars]
+
+
+def test_configs_side_by_side():
+    bars = make_bars()
+    expected = [run(DemarkEngine(**conf), bars) for conf in CONFIGS]
+    assert expected[0] != expected[1]
+    assert any(x[0] == "countdown" and x[2] == 13 for items in expected[0] for x in items)
+
+    # 多个配置逐根交替计算，结果和单独计算一致
+    engines = [DemarkEngine(**conf) for conf in CONFIGS]
+    res = [[] for _ in CONFIGS]
+    for bar in bars:
+        for engine, lst in zip(engines, res):
+            lst.append([(x["type"], x["dir"], x["idx"]) for x in engine.update(*bar).data])
+    assert res == expected
+
+    # 多线程
+    res = [None] * len(CONFIGS)
+
+    def work(i):
+        res[i] = run(DemarkEngine(**CONFIGS[i]), bars)
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(len(CONFIGS))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert res == expected
+
+
+def test_series_share_bar_buffer():
+    bars = make_bars(500)
+    engine = DemarkEngine()
+    for bar in bars:
+        for item in engine.update(*bar).data:
+            series = item["series"]
+            assert series.kl_list[0] is engine.kl_lst[series.begin]
+            if not series.setup_finished:
+                assert series.kl_list[-1] is engine.kl_lst[-1]
+            if series.countdown is not None:
+                assert series.countdown.kl_list[-1] is engine.kl_lst[-1]
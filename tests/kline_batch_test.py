@@ -0,0 +1,83 @@
+import random
+
+import numpy as np
+import pytest
+
+from common.const import DataField, LvType
+from common.time import Time
+from data_fetch.manager import DataSrc
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.kline.kline import Kline
+from data_process.kline.kline_batch import combine_hl
+from data_process.kline.kline_store import dir_code
+from data_process.kline.kline_unit import Kline_Unit
+
+
+def full_summary(chan: Chan):
+    res = []
+    for kl_list in chan.kl_datas.values():
+        res.append((
+            [(klc.idx, klc.high, klc.low, klc.dir, klc.fx, [klu.idx for klu in klc], str(klc.time_end)) for klc in kl_list],
+            [(klc.pre.idx if klc.idx > 0 else None, klc.next.idx if klc.next else None) for klc in kl_list],
+            [(bi.begin_klc.idx, bi.end_klc.idx, bi.dir, bi.is_sure) for bi in kl_list.bi_list],
+            [(seg.begin_bi.idx, seg.end_bi.idx, seg.is_sure) for seg in kl_list.seg_list],
+            [(zs.begin_bi.idx, zs.end_bi.idx, zs.high, zs.low) for zs in kl_list.zs_list],
+            [(bsp.klu.idx, bsp.type2str()) for bsp in kl_list.bs_point_lst],
+            [(bsp.klu.idx, bsp.type2str()) for bsp in kl_list.seg_bs_point_lst],
+            {name: np.nan_to_num(col, nan=-1).tolist() for name, col in kl_list.store.as_numpy().items()},
+        ))
+    return res
+
+
+def load_generate(seed, conf):
+    random.seed(seed)
+    np.random.seed(seed)
+    return Chan(code="random", data_src=DataSrc.GENERATE, lv_list=[LvType.K_DAY], config=ChanConfig(conf))
+
+
+@pytest.mark.parametrize("seed,bi_conf", [
+    (1, {}),
+    (2, {"bi_fx_check": "half"}),
+    (3, {"bi_fx_check": "loss", "bi_strict": False}),
+    (4, {"bi_fx_check": "totally", "gap_as_kl": True}),
+    (5, {"bi_end_is_peak": False}),
+])
+def test_batch_same_as_per_bar(seed, bi_conf):
+    batch = load_generate(seed, {**bi_conf, "kl_batch": True})
+    per_bar = load_generate(seed, {**bi_conf, "kl_batch": False})
+    assert full_summary(batch) == full_summary(per_bar)
+
+
+def test_batch_price_ties_multi_level():
+    # 价格取整，制造大量等高/等低和落在合并K线高低点上的一字K线
+    minutes = np.arange(20 * 48)
+    times = np.datetime64("2023-09-11T09:35") + (minutes // 48 * 1440 + minutes % 48 * 5).astype("timedelta64[m]")
+    rng = np.random.default_rng(7)
+    close = np.round(100 + np.cumsum(rng.normal(0, 0.4, len(times))))
+    high = close + rng.integers(0, 2, len(times))
+    low = close - rng.integers(0, 2, len(times))
+    arrays = {DataField.FIELD_TIME: times, DataField.FIELD_OPEN: close, DataField.FIELD_HIGH: high, DataField.FIELD_LOW: low, DataField.FIELD_CLOSE: close}
+    summary = []
+    for kl_batch in [True, False]:
+        conf = ChanConfig({"print_warning": False, "resample_lv": True, "kl_batch": kl_batch})
+        summary.append(full_summary(Chan.from_arrays("ties", {LvType.K_5M: arrays}, lv_list=[LvType.K_30M, LvType.K_5M], config=conf)))
+    assert summary[0] == summary[1]
+
+
+def test_combine_hl_one_price_bar():
+    hl = [(10, 8), (12, 9), (12, 12), (11, 10), (9, 7), (7, 7), (8, 7), (9, 9)]
+    klu_lst = [
+        Kline_Unit({DataField.FIELD_TIME: Time(2023, 1, i+1, 0, 0), DataField.FIELD_OPEN: l, DataField.FIELD_HIGH: h, DataField.FIELD_LOW: l, DataField.FIELD_CLOSE: l})
+        for i, (h, l) in enumerate(hl)
+    ]
+    klc_lst = [Kline(klu_lst[0], idx=0)]
+    for klu in klu_lst[1:]:
+        _dir = klc_lst[-1].try_add(klu)
+        if _dir.name != "COMBINE":
+            klc_lst.append(Kline(klu, idx=len(klc_lst), _dir=_dir))
+    begin, dirs, klc_high, klc_low = combine_hl([h for h, _ in hl], [l for _, l in hl])
+    assert begin == [klc.lst[0].time.day - 1 for klc in klc_lst]
+    assert dirs == [dir_code(klc.dir) for klc in klc_lst]
+    assert klc_high == [klc.high for klc in klc_lst]
+    assert klc_low == [klc.low for klc in klc_lst]
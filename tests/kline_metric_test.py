@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+
+from common.const import LvType
+from common.time import Time
+from data_fetch.manager import DataSrc
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.kline.kline_list import Kline_List, collect_metric_array
+from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
+
+CONF = {"mean_metrics": [5], "trend_metrics": [10], "cal_rsi": True, "cal_kdj": True}
+
+
+def load(kl_batch):
+    random.seed(3)
+    np.random.seed(3)
+    return Chan(code="random", data_src=DataSrc.GENERATE, lv_list=[LvType.K_DAY], config=ChanConfig({**CONF, "kl_batch": kl_batch}))
+
+
+def test_metric_computed_on_first_read():
+    chan = load(True)
+    lazy = chan[0].lazy_metric
+    # 买卖点计算读了 macd，其余指标还没算
+    assert not lazy.is_pending("macd")
+    assert all(lazy.is_pending(name) for name in ["boll", "rsi", "kdj", "trend"])
+
+    expected = load(False)
+    klu_lst = list(chan[0].klu_iter())
+    expected_klu_lst = list(expected[0].klu_iter())
+    assert np.allclose([klu.boll.UP for klu in klu_lst], [klu.boll.UP for klu in expected_klu_lst])
+    assert not lazy.is_pending("boll") and lazy.is_pending("rsi")
+    for name in ["macd", "boll", "rsi", "kdj", "trend"]:
+        arrays = chan[0].metric_array(name)
+        expected_arrays = expected[0].metric_array(name)
+        assert arrays.keys() == expected_arrays.keys()
+        for field in arrays:
+            assert np.allclose(arrays[field], expected_arrays[field]), (name, field)
+
+
+def make_klu_lst(n):
+    rng = np.random.default_rng(1)
+    close = 10 + np.cumsum(rng.normal(0, 0.1, n))
+    klu_lst = []
+    for idx, c in enumerate(close.tolist()):
+        klu = Kline_Unit.from_fields(Time(2020 + idx // 300, idx % 300 // 25 + 1, idx % 25 + 1, 0, 0), c, c + 0.1, c - 0.1, c, TradeInfo({}))
+        klu.set_idx(idx)
+        klu_lst.append(klu)
+    return klu_lst
+
+
+def test_per_bar_after_batch():
+    conf = ChanConfig(CONF)
+    klu_lst = make_klu_lst(600)
+    per_bar = Kline_List(LvType.K_DAY, conf)
+    for klu in klu_lst:
+        per_bar.add_single_klu(klu)
+    expected = {name: collect_metric_array(klu_lst, name) for name in ["macd", "rsi", "kdj", "trend"]}
+
+    klu_lst = make_klu_lst(600)
+    kl_list = Kline_List(LvType.K_DAY, conf)
+    kl_list.begin_batch()
+    for klu in klu_lst[:400]:
+        kl_list.add_single_klu(klu)
+    kl_list.flush_batch()
+    assert kl_list.lazy_metric.is_pending("macd")
+    # 之后逐根加入，先把还没算的指标补齐
+    for klu in klu_lst[400:]:
+        kl_list.add_single_klu(klu)
+    assert kl_list.lazy_metric is None
+    for name, arrays in expected.items():
+        res = collect_metric_array(klu_lst, name)
+        for field in arrays:
+            assert np.allclose(res[field], arrays[field]), (name, field)
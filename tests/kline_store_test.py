@@ -0,0 +1,46 @@
+import numpy as np
+
+from common.const import DataField, LvType
+from common.func_util import time2epoch
+from data_fetch.fetchers.local_fetcher import LocalFetcher
+from data_fetch.manager import DataSrc
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.kline.kline_store import NO_LINK, dir_code, fx_code
+
+
+def check_store(kl_list):
+    store = kl_list.store
+    columns = store.as_numpy()
+    klu_lst = list(kl_list.klu_iter())
+    assert store.klu_cnt == len(klu_lst) and store.klc_cnt == len(kl_list)
+    assert columns["close"].tolist() == [klu.close for klu in klu_lst]
+    assert columns["time"].tolist() == [time2epoch(klu.time) for klu in klu_lst]
+    assert columns["klu_klc"].tolist() == [klu.klc.idx for klu in klu_lst]
+    assert columns["klc_high"].tolist() == [klc.high for klc in kl_list]
+    assert columns["klc_low"].tolist() == [klc.low for klc in kl_list]
+    assert columns["klc_fx"].tolist() == [fx_code(klc.fx) for klc in kl_list]
+    assert columns["klc_dir"].tolist() == [dir_code(klc.dir) for klc in kl_list]
+    assert [store.klc_klu_range(klc.idx) for klc in kl_list] == [(klc.lst[0].idx, klc.lst[-1].idx + 1) for klc in kl_list]
+    for klu in klu_lst:
+        children = list(klu.get_children())
+        assert store.child_range(klu.idx) == ((children[0].idx, children[-1].idx + 1) if children else (NO_LINK, NO_LINK))
+        assert store.klu_parent[klu.idx] == (klu.sup_kl.idx if klu.sup_kl else NO_LINK)
+
+
+def test_store_mirrors_objects(monkeypatch):
+    monkeypatch.setattr(LocalFetcher, "max_rows", 500)
+    chan = Chan(code="_local", data_src=DataSrc.LOCAL, lv_list=[LvType.K_DAY], config=ChanConfig({"print_warning": False}))
+    check_store(chan[0])
+    assert np.isnan(chan[0].store.volume).sum() == 0
+
+
+def test_store_multi_level():
+    minutes = np.arange(4 * 48)
+    times = np.datetime64("2023-09-11T09:35") + (minutes // 48 * 1440 + minutes % 48 * 5).astype("timedelta64[m]")
+    rng = np.random.default_rng(5)
+    close = 10 + np.cumsum(rng.normal(0, 0.1, len(times)))
+    arrays = {DataField.FIELD_TIME: times, DataField.FIELD_OPEN: close, DataField.FIELD_HIGH: close + 0.1, DataField.FIELD_LOW: close - 0.1, DataField.FIELD_CLOSE: close}
+    chan = Chan.from_arrays("multi", {LvType.K_5M: arrays}, lv_list=[LvType.K_30M, LvType.K_5M], config=ChanConfig({"print_warning": False, "resample_lv": True}))
+    check_store(chan[0])
+    check_store(chan[1])
@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+import pytest
+
+from common.const import LvType
+from common.time import Time
+from data_process.chan_config import ChanConfig
+from data_process.common.range_index import RangeExtreme
+from data_process.kline.kline_list import Kline_List
+from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
+from data_process.seg.seg_list_comm import find_peak_bi, find_peak_bi_in
+
+
+def test_first_last_reach():
+    rng = random.Random(9)
+    for is_max in [True, False]:
+        index = RangeExtreme(is_max=is_max)
+        values = [rng.randint(0, 50) for _ in range(2000)]
+        index.extend(values[:1000])
+        for value in values[1000:]:
+            index.append(value)
+        for _ in range(500):
+            b = rng.randrange(len(values))
+            e = rng.randint(b, len(values))
+            x = rng.randint(0, 50)
+            hit = [pos for pos in range(b, e) if (values[pos] >= x if is_max else values[pos] <= x)]
+            assert index.first_reach(b, e, x) == (hit[0] if hit else -1)
+            assert index.last_reach(b, e, x) == (hit[-1] if hit else -1)
+
+
+def make_kl_list(conf, n=3000, with_store=True):
+    rng = np.random.default_rng(11)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    spread = rng.uniform(0.1, 2, (n, 2))
+    kl_list = Kline_List(LvType.K_DAY, ChanConfig(dict(conf)))  # ChanConfig 会消耗传入的字典
+    if not with_store:
+        kl_list.bi_list.store = None
+    kl_list.begin_batch()
+    for idx, (c, (up, down)) in enumerate(zip(close.tolist(), spread.tolist())):
+        klu = Kline_Unit.from_fields(Time(2000 + idx // 300, idx % 300 // 25 + 1, idx % 25 + 1, 0, 0), c, c + up, c - down, c, TradeInfo({}))
+        klu.set_idx(idx)
+        kl_list.add_single_klu(klu)
+    kl_list.cal_seg_and_zs()
+    return kl_list
+
+
+def test_find_peak_bi_in_matches_scan():
+    kl_list = make_kl_list({})
+    for bi_lst in [kl_list.bi_list, kl_list.seg_list]:
+        rng = random.Random(len(bi_lst))
+        for _ in range(300):
+            b = rng.randrange(len(bi_lst))
+            e = rng.randint(b, len(bi_lst))
+            for is_high in [True, False]:
+                assert find_peak_bi_in(bi_lst, b, e, is_high) is find_peak_bi(bi_lst[b:e], is_high)
+                assert find_peak_bi_in(bi_lst, b, e, is_high, reverse=True) is find_peak_bi(bi_lst[b:e][::-1], is_high)
+
+
+@pytest.mark.parametrize("conf", [{"triger_step": True}, {"bi_strict": False, "gap_as_kl": True, "seg_algo": "1+1"}, {"bi_strict": False, "triger_step": True, "seg_algo": "break"}])
+def test_range_query_matches_scan(conf):
+    with_index = make_kl_list(conf, n=1500)
+    without_index = make_kl_list(conf, n=1500, with_store=False)
+    for attr in ["bi_list", "seg_list", "segseg_list"]:
+        assert [str(line) for line in getattr(with_index, attr)] == [str(line) for line in getattr(without_index, attr)]
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from common.const import DataField, LvType
+from common.func_util import parse_normal_date_str, str2float
+from data_fetch.fetchers.local_fetcher import LocalFetcher
+from data_fetch.manager import DataSrc
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.common.chan_exception import ChanException, ErrCode
+
+
+def test_same_as_row_parse():
+    df = pd.read_csv(LocalFetcher.data_path)
+    expected = [
+        (str(parse_normal_date_str(row["Date"])), str2float(row["Open"]), str2float(row["Close"]), str2float(row["Volume"]))
+        for _, row in df.iterrows()
+    ]
+    res = [
+        (str(kl[DataField.FIELD_TIME]), kl[DataField.FIELD_OPEN], kl[DataField.FIELD_CLOSE], kl[DataField.FIELD_VOLUME])
+        for kl, _ in LocalFetcher("_local").get_kl_data()
+    ]
+    assert res == expected
+
+
+def test_dir_and_options(tmp_path, monkeypatch):
+    pd.DataFrame({
+        "time_key": ["2021-09-02 10:00:00", "2021-09-02 10:30:00", "2021-09-03 10:00:00"],
+        "open": [1.0, 2.0, 3.0],
+        "high": [1.5, 2.5, 3.5],
+        "low": [0.5, 1.5, 2.5],
+        "close": [1.2, "bad", 3.2],
+    }).to_csv(tmp_path / "600000_K_30M.csv", index=False)
+    monkeypatch.setattr(LocalFetcher, "data_path", str(tmp_path))
+
+    kl_columns = LocalFetcher("600000", LvType.K_30M).get_kl_columns()
+    assert len(kl_columns) == 3
+    assert kl_columns.columns[DataField.FIELD_CLOSE].tolist() == [1.2, 0.0, 3.2]
+    assert DataField.FIELD_VOLUME not in kl_columns.columns
+    assert [str(t) for t in kl_columns.iter_time()] == ["2021/09/02 10:00", "2021/09/02 10:30", "2021/09/03 10:00"]
+
+    assert len(LocalFetcher("600000", LvType.K_30M, end_date="2021-09-02").get_kl_columns()) == 2
+    monkeypatch.setattr(LocalFetcher, "max_rows", 1)
+    assert len(LocalFetcher("600000", LvType.K_30M).get_kl_columns()) == 1
+
+
+def test_missing_file(tmp_path, monkeypatch):
+    pd.DataFrame({"time_key": ["2021-09-02"], "open": [1.0], "high": [1.5], "low": [0.5], "close": [1.2]}).to_csv(tmp_path / "600000_K_DAY.csv", index=False)
+    monkeypatch.setattr(LocalFetcher, "data_path", str(tmp_path))
+    with pytest.raises(ChanException) as e:
+        LocalFetcher("600000", LvType.K_30M)
+    assert e.value.errcode == ErrCode.SRC_DATA_NOT_FOUND
+
+    # 缺失的次级别可以自动跳过
+    chan = Chan("600000", data_src=DataSrc.LOCAL, lv_list=[LvType.K_DAY, LvType.K_30M], config=ChanConfig({"auto_skip_illegal_sub_lv": True, "print_warning": False}))
+    assert chan.lv_list == [LvType.K_DAY] and chan[LvType.K_DAY].klu_cnt == 1
@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+import pytest
+
+from common.const import LvType
+from data_fetch.manager import DataSrc
+from data_process.calculate.boll import BollModel
+from data_process.calculate.kdj import Kdj
+from data_process.calculate.macd import Macd
+from data_process.calculate.rsi import Rsi
+from data_process.calculate.trend_model import TrendModel
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.common.cenum import TrendType
+
+
+def metric_values(item):
+    if isinstance(item, float):
+        return [item]
+    return [getattr(item, name) for name in ("fast_ema", "slow_ema", "DIF", "DEA", "MID", "theta", "UP", "DOWN", "k", "d", "j") if hasattr(item, name)]
+
+
+@pytest.mark.parametrize("make_model,n_input", [
+    (lambda: Macd(12, 26, 9), 1),
+    (lambda: BollModel(20), 1),
+    (lambda: TrendModel(TrendType.MEAN, 5), 1),
+    (lambda: TrendModel(TrendType.MAX, 7), 1),
+    (lambda: TrendModel(TrendType.MIN, 7), 1),
+    (lambda: Rsi(14), 1),
+    (lambda: Kdj(9), 3),
+])
+def test_add_batch_same_as_add(make_model, n_input):
+    rng = np.random.default_rng(3)
+    close = (100 + np.cumsum(rng.normal(0, 1, 300))).tolist()
+    close[50:60] = [close[50]] * 10  # 横盘，标准差为0、hn==ln
+    high = [c + 1 for c in close]
+    low = [c - 1 for c in close]
+    inputs = [high, low, close] if n_input == 3 else [close]
+
+    model = make_model()
+    expected = [model.add(*item) for item in zip(*inputs)]
+
+    model = make_model()
+    res = []
+    # 分段交替批量和逐根，验证批量计算后模型状态可以继续使用
+    for begin, end in [(0, 1), (1, 5), (5, 8), (8, 100), (100, 101), (101, 300)]:
+        seg = [x[begin:end] for x in inputs]
+        if end - begin == 1:
+            res.append(model.add(*[x[0] for x in seg]))
+        else:
+            res.extend(model.add_batch(*seg))
+    assert len(res) == len(expected)
+    for a, b in zip(res, expected):
+        assert np.allclose(metric_values(a), metric_values(b), rtol=1e-9, atol=1e-9)
+
+
+def test_chan_metric_batch_same_as_per_bar():
+    conf = {"mean_metrics": [5, 20], "trend_metrics": [10], "cal_rsi": True, "cal_kdj": True, "cal_demark": True}
+    klu_lst = []
+    for kl_batch in [True, False]:
+        random.seed(11)
+        np.random.seed(11)
+        chan = Chan(code="random", data_src=DataSrc.GENERATE, lv_list=[LvType.K_DAY], config=ChanConfig({**conf, "kl_batch": kl_batch}))
+        klu_lst.append(list(chan[0].klu_iter()))
+    for a, b in zip(*klu_lst):
+        for name in ("macd", "boll", "rsi", "kdj"):
+            assert np.allclose(metric_values(getattr(a, name)), metric_values(getattr(b, name)), rtol=1e-9, atol=1e-9)
+        assert a.trend.keys() == b.trend.keys()
+        for trend_type in a.trend:
+            assert np.allclose(list(a.trend[trend_type].values()), list(b.trend[trend_type].values()), rtol=1e-9, atol=1e-9)
+        assert [(x["type"], x["dir"], x["idx"]) for x in a.demark.data] == [(x["type"], x["dir"], x["idx"]) for x in b.demark.data]
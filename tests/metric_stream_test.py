@@ -0,0 +1,54 @@
+import numpy as np
+
+from data_process.calculate.boll import BollModel
+from data_process.calculate.kdj import Kdj
+from data_process.calculate.rsi import Rsi
+from data_process.calculate.trend_model import TrendModel
+from data_process.calculate.window import MeanVarWindow, MonotonicWindow
+from data_process.common.cenum import TrendType
+
+
+def make_close(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = (1000 + np.cumsum(rng.normal(0, 1, n))).round(1).tolist()  # 取整制造相等的值
+    close[100:130] = [close[100]] * 30
+    return close
+
+
+def test_windows_match_naive():
+    close = make_close(3 * MeanVarWindow.RESYNC_CNT)
+    for window in [1, 2, 20]:
+        mv = MeanVarWindow(window)
+        hi = MonotonicWindow(window, is_max=True)
+        lo = MonotonicWindow(window, is_max=False)
+        for i, value in enumerate(close):
+            arr = close[max(0, i+1-window):i+1]
+            mv.add(value)
+            mean = sum(arr) / len(arr)
+            assert abs(mv.mean - mean) < 1e-9
+            assert abs(mv.var - sum((x - mean) ** 2 for x in arr) / len(arr)) < 1e-6
+            assert hi.add(value) == max(arr) and lo.add(value) == min(arr)
+            assert len(mv.values) == len(hi.values) == len(arr)
+
+
+def test_stream_models_bounded_state():
+    close = make_close(2000)
+    boll, rsi, kdj, trend = BollModel(20), Rsi(14), Kdj(9), TrendModel(TrendType.MAX, 10)
+    ups = []
+    downs = []
+    for i, value in enumerate(close):
+        boll.add(value)
+        kdj.add(value + 1, value - 1, value)
+        assert trend.add(value) == max(close[max(0, i-9):i+1])
+        rsi.add(value)
+        if i > 0:
+            diff = value - close[i-1]
+            ups.append(max(diff, 0.0))
+            downs.append(max(-diff, 0.0))
+    # rsi 的 Wilder 平滑只保留最后一个值
+    up = sum(ups[:13]) / 14
+    for x in ups[13:]:
+        up = (up * 13 + x) / 14
+    assert abs(rsi.up - up) < 1e-9
+    assert len(boll.window.values) == 20 and len(kdj.high_window.values) == 9 and len(trend.window.values) == 10
+    assert not any(isinstance(v, list) for v in vars(rsi).values())
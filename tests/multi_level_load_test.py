@@ -0,0 +1,61 @@
+import numpy as np
+
+from common.const import LvType
+from data_fetch.kl_columns import KlColumns
+from data_fetch.resampler import resample
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+
+LV_LIST = [LvType.K_DAY, LvType.K_60M, LvType.K_5M]
+
+
+def a_share_5m(n_days, seed=5):
+    """n_days 个交易日的5分钟线：9:35-11:30, 13:05-15:00"""
+    days = [day for day in np.datetime64("2023-01-02") + np.arange(n_days * 2) if day.astype(object).weekday() < 5][:n_days]
+    times = []
+    for day in days:
+        for begin in ["T09:30", "T13:00"]:
+            session_begin = np.datetime64(f"{day}{begin}")
+            times.extend(session_begin + np.timedelta64(5 * (i + 1), "m") for i in range(24))
+    n = len(times)
+    close = 100 + np.cumsum(np.random.default_rng(seed).normal(0, 0.3, n))
+    return KlColumns.from_arrays(np.array(times, dtype="datetime64[s]"), close, close + 0.2, close - 0.2, close)
+
+
+def lv_columns(n_days):
+    base = a_share_5m(n_days)
+    return {lv: resample(base, LvType.K_5M, lv) for lv in LV_LIST}
+
+
+def check_links(chan: Chan):
+    for lv_idx in range(1, len(chan.lv_list)):
+        parents = list(chan[lv_idx - 1].klu_iter())
+        for klu in chan[lv_idx].klu_iter():
+            # 挂在时间不早于它的第一根父级别K线上
+            expect = next(parent for parent in parents if not klu.time > parent.time)
+            assert klu.sup_kl is expect
+            assert klu in expect.sub_kl_list
+
+
+def test_multi_level_links():
+    kl_columns = lv_columns(30)
+    chan = Chan.from_kl_columns("600000", kl_columns, lv_list=list(LV_LIST), config=ChanConfig({"print_warning": False}))
+    assert [chan[lv].klu_cnt for lv in LV_LIST] == [30, 120, 1440]
+    check_links(chan)
+    assert chan.kl_misalign_cnt == 0
+
+
+def test_multi_level_step_yields_per_top_klu():
+    chan = Chan.from_kl_columns("600000", lv_columns(10), lv_list=list(LV_LIST), config=ChanConfig({"triger_step": True, "print_warning": False}))
+    assert [snapshot[0].klu_cnt for snapshot in chan.step_load()] == list(range(1, 11))
+    check_links(chan)
+
+
+def test_sub_level_exhausted_first():
+    kl_columns = lv_columns(10)
+    five_min = kl_columns[LvType.K_5M]
+    kl_columns[LvType.K_5M] = five_min.slice(0, len(five_min) - 48)  # 最后一天没有5分钟线
+    chan = Chan.from_kl_columns("600000", kl_columns, lv_list=list(LV_LIST), config=ChanConfig({"print_warning": False, "max_kl_misalgin_cnt": 10}))
+    assert [chan[lv].klu_cnt for lv in LV_LIST] == [10, 40, 432]
+    check_links(chan)
+    assert chan.kl_misalign_cnt == 4  # 最后一天的4根60分钟线
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import data_fetch.manager as fetchManager
+from common.const import LvType
+from data_fetch.abs_stock_api import AbsStockApi
+from data_fetch.kl_columns import KlColumns
+from data_fetch.resampler import resample
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.common.chan_exception import ChanException, ErrCode
+
+
+def a_share_5m(n_days, seed=3):
+    days = [day for day in np.datetime64("2023-01-02") + np.arange(n_days * 2) if day.astype(object).weekday() < 5][:n_days]
+    times = []
+    for day in days:
+        for begin in ["T09:30", "T13:00"]:
+            session_begin = np.datetime64(f"{day}{begin}")
+            times.extend(session_begin + np.timedelta64(5 * (i + 1), "m") for i in range(24))
+    close = 100 + np.cumsum(np.random.default_rng(seed).normal(0, 0.3, len(times)))
+    return KlColumns.from_arrays(np.array(times, dtype="datetime64[s]"), close, close + 0.2, close - 0.2, close)
+
+
+BASE = a_share_5m(60)
+
+
+class FakeFetcher(AbsStockApi):
+    """各级别由5分钟线合成；K_5M 没有数据（同真实数据源一样在构造时报错），K_DAY 最慢返回"""
+    thread_safe = True
+    threads = set()
+
+    def __init__(self, code, k_type, begin_date, end_date, autype):
+        if k_type == LvType.K_5M:
+            raise ChanException(f"{code}没有{k_type}数据", ErrCode.SRC_DATA_NOT_FOUND)
+        super().__init__(code, k_type, begin_date, end_date, autype)
+
+    def get_kl_columns(self):
+        FakeFetcher.threads.add(threading.get_ident())
+        if self.k_type == LvType.K_DAY:
+            time.sleep(0.05)
+        return resample(BASE, LvType.K_5M, self.k_type)
+
+
+@pytest.fixture(autouse=True)
+def fake_src(monkeypatch):
+    monkeypatch.setattr(fetchManager, "get_stock_api", lambda src: FakeFetcher)
+    FakeFetcher.threads = set()
+
+
+def load(parallel, lv_list, **conf):
+    return Chan("600000", data_src="fake", lv_list=list(lv_list), config=ChanConfig(dict(conf, parallel_fetch=parallel, print_warning=False)))
+
+
+def summary(chan: Chan):
+    return [
+        (
+            lv,
+            [(klu.time.ts, klu.close, len(klu.sub_kl_list)) for klu in chan[lv].klu_iter()],
+            [(bi.idx, bi.is_sure, bi.get_end_klu().idx) for bi in chan[lv].bi_list],
+            [(bsp.klu.idx, bsp.type2str()) for bsp in chan[lv].bs_point_lst],
+        )
+        for lv in chan.lv_list
+    ]
+
+
+def test_parallel_same_as_sequential():
+    lv_list = [LvType.K_DAY, LvType.K_60M, LvType.K_30M]
+    parallel = load(True, lv_list)
+    assert len(FakeFetcher.threads) > 1
+    assert parallel.lv_list == lv_list
+    assert summary(parallel) == summary(load(False, lv_list))
+
+
+def test_parallel_skip_illegal_sub_lv():
+    lv_list = [LvType.K_DAY, LvType.K_60M, LvType.K_5M]
+    parallel = load(True, lv_list, auto_skip_illegal_sub_lv=True)
+    assert parallel.lv_list == [LvType.K_DAY, LvType.K_60M]
+    assert LvType.K_5M not in parallel.kl_datas
+    assert summary(parallel) == summary(load(False, lv_list, auto_skip_illegal_sub_lv=True))
+
+    for parallel_fetch in (True, False):
+        with pytest.raises(ChanException) as e:
+            load(parallel_fetch, lv_list)
+        assert e.value.errcode == ErrCode.SRC_DATA_NOT_FOUND
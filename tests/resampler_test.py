@@ -0,0 +1,69 @@
+import numpy as np
+
+from common.const import DataField, LvType
+from data_fetch.kl_columns import KlColumns
+from data_fetch.resampler import resample
+
+
+def a_share_5m(days):
+    """A股交易时段的5分钟线：9:35-11:30, 13:05-15:00"""
+    times = []
+    for day in days:
+        for begin in ["09:30", "13:00"]:
+            session_begin = np.datetime64(f"{day}T{begin}")
+            times.extend(session_begin + np.timedelta64(5 * (i + 1), "m") for i in range(24))
+    n = len(times)
+    price = np.arange(n, dtype=np.float64) + 10
+    return KlColumns.from_arrays(np.array(times, dtype="datetime64[s]"), price, price + 1, price - 1, price + 0.5, volume=np.ones(n))
+
+
+def times_of(kl_columns):
+    return [str(t) for t in kl_columns.iter_time()]
+
+
+def test_minute_resample():
+    base = a_share_5m(["2023-09-11", "2023-09-12"])
+    res = resample(base, LvType.K_5M, LvType.K_60M)
+    assert times_of(res)[:4] == ["2023/09/11 10:30", "2023/09/11 11:30", "2023/09/11 14:00", "2023/09/11 15:00"]
+    assert len(res) == 8
+    assert res.columns[DataField.FIELD_OPEN][0] == 10
+    assert res.columns[DataField.FIELD_HIGH][0] == 22
+    assert res.columns[DataField.FIELD_LOW][0] == 9
+    assert res.columns[DataField.FIELD_CLOSE][0] == 21.5
+    assert res.columns[DataField.FIELD_VOLUME].tolist() == [12.0] * 8
+    assert times_of(resample(base, LvType.K_5M, LvType.K_30M))[:2] == ["2023/09/11 10:00", "2023/09/11 10:30"]
+
+
+def test_day_week_month_resample():
+    days = [str(np.datetime64("2023-09-25") + i) for i in range(14) if (np.datetime64("2023-09-25") + i).astype(object).weekday() < 5]
+    base = a_share_5m(days)
+    day = resample(base, LvType.K_5M, LvType.K_DAY)
+    assert times_of(day)[:2] == ["2023/09/25", "2023/09/26"]
+    assert day.columns[DataField.FIELD_VOLUME].tolist() == [48.0] * 10
+    assert times_of(resample(base, LvType.K_5M, LvType.K_WEEK)) == ["2023/09/29", "2023/10/06"]
+    assert times_of(resample(day, LvType.K_DAY, LvType.K_MON)) == ["2023/09/29", "2023/10/06"]
+
+
+def test_minute_resample_missing_open_bar():
+    """开盘第一根、时段中间一段缺失时仍按时钟切分"""
+    base = a_share_5m(["2023-09-11"])
+    keep = np.ones(len(base), dtype=bool)
+    keep[0] = False  # 09:35
+    keep[13:20] = False  # 10:40-11:10
+    base = KlColumns(base.time[keep], {field: arr[keep] for field, arr in base.columns.items()}, base.autofix[keep])
+    res = resample(base, LvType.K_5M, LvType.K_60M)
+    assert times_of(res) == ["2023/09/11 10:30", "2023/09/11 11:30", "2023/09/11 14:00", "2023/09/11 15:00"]
+    assert res.columns[DataField.FIELD_VOLUME].tolist() == [11.0, 5.0, 12.0, 12.0]
+
+
+def test_minute_resample_sessions():
+    # 24 小时交易、第一根不在整点
+    times = np.datetime64("2023-09-11T00:20") + np.arange(12) * np.timedelta64(5, "m")
+    price = np.arange(12, dtype=np.float64)
+    base = KlColumns.from_arrays(times.astype("datetime64[s]"), price, price, price, price)
+    assert times_of(resample(base, LvType.K_5M, LvType.K_30M, ["00:00"])) == ["2023/09/11 00:30", "2023/09/11 01:00", "2023/09/11 01:15"]
+    # 夜盘跨午夜，开盘前的K线归入前一天 21:00 的时段
+    times = np.array(["2023-09-11T23:45", "2023-09-12T00:00", "2023-09-12T00:15", "2023-09-12T00:30"], dtype="datetime64[s]")
+    base = KlColumns.from_arrays(times, price[:4], price[:4], price[:4], price[:4])
+    res = resample(base, LvType.K_15M, LvType.K_60M, ["09:00", "13:30", "21:00"])
+    assert times_of(res) == ["2023/09/12", "2023/09/12 00:30"]  # 00:00 的K线只显示日期
@@ -0,0 +1,42 @@
+import copy
+import pickle
+
+import pytest
+
+from common.const import DataField, LvType
+from data_fetch.fetchers.local_fetcher import LocalFetcher
+from data_fetch.manager import DataSrc
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+
+
+def make_chan(monkeypatch):
+    # 笔、线段之间互相引用，deepcopy/pickle 的递归深度随K线数增长，这里只取一小段
+    monkeypatch.setattr(LocalFetcher, "max_rows", 100)
+    return Chan(code="_local", data_src=DataSrc.LOCAL, lv_list=[LvType.K_DAY], config=ChanConfig({"print_warning": False}))
+
+
+def test_no_instance_dict(monkeypatch):
+    kl_list = make_chan(monkeypatch)[0]
+    klu = kl_list[0][0]
+    for obj in [klu, klu.time, klu.trade_info, klu.macd, klu.boll, kl_list[0], kl_list.bi_list[0], kl_list.seg_list[0]]:
+        assert not hasattr(obj, "__dict__"), type(obj)
+    # 未开启 demark/trend 时不分配
+    assert klu._demark is None and klu._trend is None
+    assert klu.demark.data == [] and klu.trend == {}
+
+
+def test_copy_and_pickle(monkeypatch):
+    chan = make_chan(monkeypatch)
+    for other in [copy.deepcopy(chan), pickle.loads(pickle.dumps(chan))]:
+        assert [bsp.klu.idx for bsp in other.get_bsp()] == [bsp.klu.idx for bsp in chan.get_bsp()]
+        klu, other_klu = chan[0][-1][-1], other[0][-1][-1]
+        assert (other_klu.time.ts, other_klu.macd.macd, other_klu.boll.UP) == (klu.time.ts, klu.macd.macd, klu.boll.UP)
+
+
+def test_trade_info_metric_read_only(monkeypatch):
+    trade_info = make_chan(monkeypatch)[0][0][0].trade_info
+    with pytest.raises(TypeError):
+        trade_info.metric[DataField.FIELD_VOLUME] = 1.0
+    trade_info.volume = 1.0
+    assert trade_info.metric[DataField.FIELD_VOLUME] == 1.0
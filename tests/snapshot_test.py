@@ -0,0 +1,139 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from common.const import DataField, LvType
+from common.time import Time
+from data_process.chan import Chan
+from data_process.chan_config import ChanConfig
+from data_process.common import snapshot
+from data_process.common.chan_exception import ChanException, ErrCode
+from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
+
+
+def make_bars(n, seed=7):
+    """(time, open, high, low, close)，每天 4 根 60 分钟K线"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    spread = rng.uniform(0.1, 2, (n, 2))
+    bars = []
+    for idx, (c, (up, down)) in enumerate(zip(close.tolist(), spread.tolist())):
+        day, pos = divmod(idx, 4)
+        bars.append((Time(2000 + day // 300, day % 300 // 25 + 1, day % 25 + 1, [10, 11, 14, 15][pos], 30 if pos < 2 else 0), c, c + up, c - down, c))
+    return bars
+
+
+def new_klu(bar):
+    t, _open, high, low, close = bar
+    return Kline_Unit.from_fields(t, _open, high, low, close, TradeInfo({"volume": 100.0}))
+
+
+def summary(chan: Chan):
+    res = []
+    for kl_list in chan.kl_datas.values():
+        res.append((
+            [(klc.idx, klc.high, klc.low, klc.fx) for klc in kl_list],
+            [(bi.idx, bi.seg_idx, bi.is_sure, bi.get_end_klu().idx) for bi in kl_list.bi_list],
+            [(seg.end_bi.idx, seg.is_sure, [(zs.begin_bi.idx, zs.end_bi.idx) for zs in seg.zs_lst]) for seg in kl_list.seg_list],
+            [(bsp.klu.idx, bsp.type2str()) for bsp in kl_list.bs_point_lst],
+            [(klu.macd.macd, klu.rsi, klu.trade_info.volume, len(klu.sub_kl_list)) for klu in kl_list.klu_iter()],
+        ))
+    return res
+
+
+CONF = {"kl_data_check": False, "cal_rsi": True, "cal_demark": True, "mean_metrics": [5]}
+
+
+@pytest.mark.parametrize("compress", [None, "zlib", "lzma"])
+def test_snapshot_round_trip(tmp_path, compress):
+    bars = make_bars(1200)
+    arrays = {
+        DataField.FIELD_TIME: [bar[0] for bar in bars],
+        DataField.FIELD_OPEN: np.array([bar[1] for bar in bars]),
+        DataField.FIELD_HIGH: np.array([bar[2] for bar in bars]),
+        DataField.FIELD_LOW: np.array([bar[3] for bar in bars]),
+        DataField.FIELD_CLOSE: np.array([bar[4] for bar in bars]),
+    }
+    chan = Chan.from_arrays("test", {LvType.K_60M: arrays}, config=ChanConfig(dict(CONF)))
+    path = tmp_path / "chan.snap"
+    chan.save_snapshot(path, compress)
+    restored = Chan.load_snapshot(path)
+    assert summary(restored) == summary(chan)
+    assert restored.kl_columns is None and restored.conf.cal_rsi
+
+
+def test_snapshot_resume_step(tmp_path):
+    """逐步模式下恢复之后继续加入K线，与没有保存过的结果一致"""
+    bars = make_bars(1600)
+    lv_list = [LvType.K_DAY, LvType.K_60M]
+    chan = Chan("test", data_src=None, lv_list=lv_list, config=ChanConfig(dict(CONF, triger_step=True)))
+
+    def feed(chan, begin, end):
+        for idx in range(begin, end, 4):
+            day = bars[idx:idx+4]
+            t = day[0][0]
+            day_klu = new_klu((Time(t.year, t.month, t.day, 0, 0), day[0][1], max(bar[2] for bar in day), min(bar[3] for bar in day), day[-1][4]))
+            chan.trigger_load({LvType.K_DAY: [day_klu], LvType.K_60M: [new_klu(bar) for bar in day]})
+
+    feed(chan, 0, 1000)
+    chan.save_snapshot(tmp_path / "chan.snap")
+    restored = Chan.load_snapshot(tmp_path / "chan.snap")
+    assert summary(restored) == summary(chan)
+    assert all(klu.sup_kl is parent for parent in restored[0].klu_iter() for klu in parent.sub_kl_list)
+    feed(chan, 1000, 1600)
+    feed(restored, 1000, 1600)
+    assert summary(restored) == summary(chan)
+
+
+def test_snapshot_errors(tmp_path):
+    chan = Chan("test", data_src=None, lv_list=[LvType.K_60M], config=ChanConfig(dict(CONF, triger_step=True)))
+    for bar in make_bars(100):
+        chan.trigger_load({LvType.K_60M: [new_klu(bar)]})
+    path = tmp_path / "chan.snap"
+    with chan.provisional():
+        with pytest.raises(ChanException):
+            chan.save_snapshot(path)
+
+    chan.save_snapshot(path)
+    data = path.read_bytes()
+    path.write_bytes(data[:len(snapshot.MAGIC)] + (snapshot.FORMAT_VERSION + 1).to_bytes(2, "little") + data[len(snapshot.MAGIC) + 2:])
+    with pytest.raises(ChanException) as e:
+        Chan.load_snapshot(path)
+    assert e.value.errcode == ErrCode.SNAPSHOT_ERR
+
+    # 数据里不允许出现 pickle 的类引用
+    path.write_bytes(data[:len(snapshot.MAGIC) + 3] + pickle.dumps(Time(2000, 1, 1, 0, 0)))
+    with pytest.raises(ChanException):
+        Chan.load_snapshot(path)
+
+
+def test_snapshot_schema_mismatch(tmp_path, monkeypatch):
+    """当前代码的类比保存时多了 slots（或者 __dict__ 类的 SNAPSHOT_VERSION 变了）时不能加载"""
+    from data_process.common import journal
+
+    chan = Chan("test", data_src=None, lv_list=[LvType.K_60M], config=ChanConfig(dict(CONF, triger_step=True)))
+    for bar in make_bars(100):
+        chan.trigger_load({LvType.K_60M: [new_klu(bar)]})
+    path = tmp_path / "chan.snap"
+    chan.save_snapshot(path)
+
+    monkeypatch.setattr(snapshot, "_class_schemas", {})
+    monkeypatch.setitem(journal._slot_names, Kline_Unit, journal.slot_names(Kline_Unit) + ("new_attr",))
+    with pytest.raises(ChanException) as e:
+        Chan.load_snapshot(path)
+    assert e.value.errcode == ErrCode.SNAPSHOT_ERR and "Kline_Unit" in str(e.value)
+
+    monkeypatch.setattr(snapshot, "_class_schemas", {})
+    monkeypatch.delitem(journal._slot_names, Kline_Unit)
+    monkeypatch.setattr(Chan, "SNAPSHOT_VERSION", Chan.SNAPSHOT_VERSION + 1)
+    with pytest.raises(ChanException) as e:
+        Chan.load_snapshot(path)
+    assert e.value.errcode == ErrCode.SNAPSHOT_ERR and "Chan" in str(e.value)
+
+    # 只改方法不影响旧快照
+    monkeypatch.undo()
+    monkeypatch.setattr(snapshot, "_class_schemas", {})
+    monkeypatch.setattr(Chan, "new_method", lambda self: None, raising=False)
+    assert summary(Chan.load_snapshot(path)) == summary(chan)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from common.const import LvType
+from common.time import Time
+from data_process.chan_config import ChanConfig
+from data_process.common.line_index import TailTracker
+from data_process.kline.kline_list import Kline_List
+from data_process.kline.kline_unit import Kline_Unit
+from data_process.kline.trade_info import TradeInfo
+
+
+def make_klu_lst(n):
+    rng = np.random.default_rng(3)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    spread = rng.uniform(0.1, 2, (n, 2))
+    return [
+        Kline_Unit.from_fields(Time(2000 + idx // 300, idx % 300 // 25 + 1, idx % 25 + 1, 0, 0), c, c + up, c - down, c, TradeInfo({}))
+        for idx, (c, (up, down)) in enumerate(zip(close.tolist(), spread.tolist()))
+    ]
+
+
+def ident(line):
+    return None if line is None else (line.idx, line.get_end_klu().idx)
+
+
+def snapshot(kl_list):
+    res = [[(bi.seg_idx, bi.klc_lst[0].idx, bi.klc_lst[-1].idx) for bi in kl_list.bi_list], [seg.seg_idx for seg in kl_list.seg_list]]
+    for seg_list, zs_list in [(kl_list.seg_list, kl_list.zs_list), (kl_list.segseg_list, kl_list.segzs_list)]:
+        res.append([[(zs.begin_bi.idx, zs.end_bi.idx) for zs in seg.zs_lst] for seg in seg_list])
+        res.append([(ident(zs.bi_in), ident(zs.bi_out), [bi.idx for bi in zs.bi_lst or []]) for zs in zs_list])
+    for bsp_list in [kl_list.bs_point_lst, kl_list.seg_bs_point_lst]:
+        res.append([(bsp.klu.idx, bsp.type2str()) for bsp in bsp_list])
+    return res
+
+
+def replay(conf, n):
+    kl_list = Kline_List(LvType.K_DAY, ChanConfig(dict(conf)))  # ChanConfig 会消耗传入的字典
+    res = []
+    for idx, klu in enumerate(make_klu_lst(n)):
+        klu.set_idx(idx)
+        kl_list.add_single_klu(klu)
+        if kl_list.bi_list:
+            res.append(snapshot(kl_list))
+    return res
+
+
+@pytest.mark.parametrize("conf", [
+    {"triger_step": True},
+    {"triger_step": True, "zs_algo": "over_seg", "bi_strict": False},
+    {"triger_step": True, "one_bi_zs": True, "zs_combine_mode": "peak", "bsp2_follow_1": False, "bsp3_follow_1": False},
+])
+def test_step_incremental_matches_full(conf, monkeypatch):
+    incremental = replay(conf, 1500)
+    update = TailTracker.update
+
+    def full_update(self, lst):
+        update(self, lst)
+        return 0  # 每一步都当作整个列表都变了
+
+    monkeypatch.setattr(TailTracker, "update", full_update)
+    full = replay(conf, 1500)
+    assert len(incremental) == len(full)
+    for step, (a, b) in enumerate(zip(incremental, full)):
+        assert a == b, step